@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+异步结构化日志
+调用线程只做过滤（级别、采样、限速）和一次入队，格式化（%-参数拼接、JSON 序列化、异常堆栈）
+和写 stderr 都在后台线程完成，回调延迟不再受日志影响。
+
+热路径日志用 %-风格参数（logger.info("📊 持仓更新: %s", data)）才能把格式化推迟到后台线程；
+参数对象在入队后才被格式化，不要传之后会被原地修改的对象。
+
+采样和限速按 key 计：调用时传 extra={"event": "positions_update"} 则按事件名，否则按调用位置（文件:行号）；
+限速的 key 还包含日志级别，同一事件的 INFO 刷屏不会占用 WARNING 的额度。
+WARNING 及以上不采样，WARNING 受限速约束，ERROR 及以上既不采样也不限速；
+被限速丢弃的条数记在该 key 下一条输出的 suppressed 字段。
+
+环境变量（<PREFIX> 为 EDGEX / PARADEX）:
+    <PREFIX>_LOG_LEVEL       日志级别，默认 INFO
+    <PREFIX>_LOG_FORMAT      json（默认）或 text
+    <PREFIX>_LOG_SAMPLE      按事件采样比例，如 "positions_update=0.1,orders_update=0.5"
+    <PREFIX>_LOG_RATE_LIMIT  每个 key 每秒最多输出的条数，默认 20（0 表示不限速）
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """"positions_update=0.1,orders_update=0.5" → {"positions_update": 0.1, "orders_update": 0.5}"""
+    rates = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            rates[name.strip()] = min(1.0, max(0.0, float(value)))
+    return rates
+
+
+class SamplingRateLimitFilter(logging.Filter):
+    """按 key 采样（确定性，每 1/rate 条保留一条）和按 (key, 级别) 令牌桶限速，在调用线程中执行"""
+
+    def __init__(self, sample_rates: dict = None, rate_limit: float = 20.0):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limit = rate_limit
+        self._seen = {}  # key → 已见条数（采样用）
+        self._buckets = {}  # (key, 级别) → [令牌数, 上次补充时间, 被丢弃条数]
+        self._lock = threading.Lock()  # 日志可能来自 WebSocket 线程
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        key = event or (record.pathname, record.lineno)
+
+        with self._lock:
+            rate = self.sample_rates.get(event) if event else None
+            if rate is not None and record.levelno < logging.WARNING:
+                seen = self._seen.get(key, 0) + 1
+                self._seen[key] = seen
+                if int(seen * rate) == int((seen - 1) * rate):
+                    return False
+
+            if not self.rate_limit or record.levelno >= logging.ERROR:
+                return True
+            now = time.monotonic()
+            bucket_key = (key, record.levelno)
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                bucket = self._buckets[bucket_key] = [self.rate_limit, now, 0]
+            else:
+                bucket[0] = min(self.rate_limit, bucket[0] + (now - bucket[1]) * self.rate_limit)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+            return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """原样入队，不在调用线程中格式化（标准 QueueHandler.prepare 会先拼好消息），队列满时丢弃并计数"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """一条日志一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName
+        }
+        event = getattr(record, "event", None)
+        if event:
+            entry["event"] = event
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """原有的文本格式，附加事件名和限速丢弃数"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", None)
+        return f"{text} (限速丢弃 {suppressed} 条)" if suppressed else text
+
+
+def setup_logging(prefix: str) -> logging.Logger:
+    """按 <PREFIX>_LOG_* 环境变量配置根日志器（替代 logging.basicConfig），重复调用只配置一次"""
+    global _listener
+    if _listener is None:
+        env = prefix.upper()
+        log_queue = queue.Queue(maxsize=100000)
+        handler = LazyQueueHandler(log_queue)
+        handler.addFilter(SamplingRateLimitFilter(
+            parse_sample_rates(os.getenv(f"{env}_LOG_SAMPLE", "")),
+            float(os.getenv(f"{env}_LOG_RATE_LIMIT", "20"))
+        ))
+
+        stream = logging.StreamHandler(sys.stderr)  # 日志输出到 stderr，避免干扰数据流
+        if os.getenv(f"{env}_LOG_FORMAT", "json").lower() == "text":
+            stream.setFormatter(TextFormatter(TEXT_FORMAT))
+        else:
+            stream.setFormatter(JsonFormatter())
+
+        root = logging.getLogger()
+        root.setLevel(os.getenv(f"{env}_LOG_LEVEL", "INFO").upper())
+        root.addHandler(handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream)
+        _listener.start()
+        atexit.register(_listener.stop)  # 退出前写完队列中剩余的日志
+    return logging.getLogger(prefix)
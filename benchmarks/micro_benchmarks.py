@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+热点函数微基准
+覆盖行情回调（handle_ticker / on_bbo_update / on_orderbook_update）、output() 序列化、normalize_order_id、
+两个 create_order 的成交汇总（_apply_fills）和 get_position 解析，使用与交易所真实返回结构一致的数据。
+
+每个基准自动校准迭代次数，重复多轮取最小值和中位数（ns/op）；结果保存到 benchmarks/results/，
+--compare 与之前的结果对比，单次耗时变慢超过 --threshold 时以非零状态退出（可用于提交前检查）。
+
+用法:
+    python3 benchmarks/micro_benchmarks.py
+    python3 benchmarks/micro_benchmarks.py -k paradex --compare benchmarks/results/micro-xxx.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from market_replay import build_service
+from quote_arbiter import QuoteArbiter
+
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+BASE_TS = 1_700_000_000_000
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """注册基准：被装饰的工厂返回 run(n)，执行 n 次被测操作"""
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+def run_sync(coro):
+    """执行不会挂起的协程（回调内部没有 await 真正的 IO）"""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("协程意外挂起")
+
+
+class InlineLoop:
+    """代替事件循环：call_soon_threadsafe 直接执行，handle_ticker 的投递和处理在同一次调用中完成"""
+
+    def call_soon_threadsafe(self, callback, *args):
+        callback(*args)
+
+
+# ==================== 数据 ====================
+
+def edgex_ticker_frame(i: int) -> str:
+    """EdgeX quote-event（ticker.10000001 Changed 事件的完整字段）"""
+    bid = 100000 + (i % 200) * 0.1
+    return json.dumps({
+        "type": "quote-event",
+        "channel": "ticker.10000001",
+        "content": {"dataType": "Changed", "channel": "ticker.10000001", "data": [{
+            "contractId": "10000001", "contractName": "BTCUSD", "priceChange": "-152.3",
+            "priceChangePercent": "-0.001521", "trades": "58213", "size": "8123.441", "value": "812344102.33",
+            "high": "101234.5", "low": "99321.0", "open": "100152.3",
+            "close": f"{bid + 0.2:.1f}", "highTime": "1699999000000", "lowTime": "1699990000000",
+            "startTime": "1699913600000", "endTime": str(BASE_TS + i),
+            "lastPrice": f"{bid + 0.2:.1f}", "indexPrice": f"{bid + 0.1:.1f}", "oraclePrice": f"{bid + 0.1:.1f}",
+            "markPrice": f"{bid + 0.3:.1f}", "openInterest": "1523.221", "fundingRate": "0.00001234",
+            "fundingTime": "1700006400000", "nextFundingTime": "1700020800000",
+            "bestBidPrice": f"{bid:.1f}", "bestAskPrice": f"{bid + 0.5:.1f}"
+        }]}
+    })
+
+
+def paradex_bbo_frame(i: int) -> dict:
+    bid = 100000 + (i % 200) * 0.1
+    return {"jsonrpc": "2.0", "method": "subscription", "params": {
+        "channel": "bbo.BTC-USD-PERP",
+        "data": {"market": "BTC-USD-PERP", "bid": f"{bid:.1f}", "bid_size": "0.512", "ask": f"{bid + 0.5:.1f}",
+                 "ask_size": "0.734", "last_updated_at": BASE_TS + i, "seq_no": 9120000 + i}
+    }}
+
+
+def paradex_orderbook_frame(i: int) -> dict:
+    bid = 100000 + (i % 200) * 0.1
+    return {"jsonrpc": "2.0", "method": "subscription", "params": {
+        "channel": "order_book.BTC-USD-PERP.snapshot@15@100ms",
+        "data": {
+            "market": "BTC-USD-PERP", "update_type": "s", "seq_no": 9120000 + i, "last_updated_at": BASE_TS + i,
+            "bids": [[f"{bid - k * 0.1:.1f}", f"{0.1 + k * 0.137:.3f}"] for k in range(15)],
+            "asks": [[f"{bid + 0.5 + k * 0.1:.1f}", f"{0.2 + k * 0.121:.3f}"] for k in range(15)]
+        }
+    }}
+
+
+def price_update_payload() -> dict:
+    """一条带 5 档订单簿和可成交报价的 price_update"""
+    bids = [[100000.0 - k * 0.1, 0.5 + k * 0.1] for k in range(5)]
+    asks = [[100000.5 + k * 0.1, 0.7 + k * 0.1] for k in range(5)]
+    quote = {"size": 0.03, "vwap": 100000.5, "worst": 100000.5, "slippage_bps": 0.0, "fillable": True}
+    return {
+        "market": "BTC-USD-PERP", "bid": 100000.0, "ask": 100000.5, "mid": 100000.25, "last_price": 100000.25,
+        "orderbook": {"bids": bids, "asks": asks},
+        "quotes": {"buy": [quote] * 3, "sell": [quote] * 3},
+        "timestamp": BASE_TS, "source": "orderbook", "exchange_ts": BASE_TS, "recv_ts": BASE_TS + 3
+    }
+
+
+def edgex_fills(order_id: str, matching: int = 4, others: int = 16) -> list:
+    """getOrderFillTransactionPage 的 dataList：当前订单的拆分成交 + 其他订单的成交"""
+    fills = []
+    for k in range(matching + others):
+        fills.append({
+            "id": str(700000000000000000 + k), "userId": "1", "accountId": "661402380167807119",
+            "coinId": "1000", "contractId": "10000001",
+            "orderId": order_id if k < matching else str(600000000000000000 + k),
+            "clientOrderId": f"c{k}", "orderSide": "BUY", "fillSize": "0.005", "fillValue": f"{500.01 + k:.2f}",
+            "fillFee": "0.190004", "fillPrice": f"{100002 + k * 0.1:.1f}", "liquidateFee": "0",
+            "realizePnl": "0", "direction": "TAKER", "isPositionTpsl": False, "isLiquidate": False,
+            "isDeleverage": False, "isWithoutMatch": False, "matchSequenceId": str(88000000 + k),
+            "matchIndex": 0, "matchTime": str(BASE_TS + k), "createdTime": str(BASE_TS + k), "updatedTime": str(BASE_TS + k)
+        })
+    return fills
+
+
+def paradex_fills(order_id: str, matching: int = 4, others: int = 16) -> list:
+    """/v1/fills 的 results：当前订单的拆分成交 + 其他订单的成交"""
+    fills = []
+    for k in range(matching + others):
+        fills.append({
+            "id": f"1700000000{k:06d}", "side": "SELL", "liquidity": "TAKER", "market": "BTC-USD-PERP",
+            "order_id": order_id if k < matching else f"1699999999{k:06d}", "price": f"{100001.5 - k * 0.1:.1f}",
+            "size": "0.005", "fee": "0.150002", "fee_currency": "USDC", "created_at": BASE_TS + k,
+            "remaining_size": "0", "client_id": f"c{k}", "fill_type": "FILL", "realized_pnl": "0.0123",
+            "realized_funding": "0", "account": "0x703de2fb6e449e6776903686da648caa07972a8bb5c76abbc95a2002f479172"
+        })
+    return fills
+
+
+def edgex_positions(contracts: int = 8) -> dict:
+    """getAccountAsset 返回：多个合约的持仓，目标合约在末尾"""
+    ids = [str(10000002 + k) for k in range(contracts - 1)] + ["10000001"]
+    return {"code": "SUCCESS", "msg": None, "data": {
+        "account": {"id": "661402380167807119"},
+        "collateralList": [{"coinId": "1000", "amount": "10234.22"}],
+        "positionList": [
+            {"contractId": cid, "openSize": "-0.015" if cid == "10000001" else "1.2", "openValue": "-1500.12",
+             "fundingFee": "-0.12", "accountId": "661402380167807119", "coinId": "1000"}
+            for cid in ids
+        ],
+        "positionAssetList": [
+            {"contractId": cid, "avgEntryPrice": "100008.1", "unrealizePnl": "0.312", "liquidatePrice": "140000.2",
+             "positionValue": "1500.01", "maxLeverage": "100", "initialMarginRequirement": "15.0"}
+            for cid in ids
+        ]
+    }}
+
+
+def paradex_positions(markets: int = 8) -> dict:
+    names = [f"ALT{k}-USD-PERP" for k in range(markets - 1)] + ["BTC-USD-PERP"]
+    return {"results": [
+        {"id": f"pos-{m}", "account": "0x703de2", "market": m, "status": "OPEN", "side": "LONG", "size": "0.015",
+         "average_entry_price": "100002.3", "avg_entry_price": "100002.3", "unrealized_pnl": "0.213",
+         "unrealized_funding_pnl": "0.0012", "cost": "1500.03", "cost_usd": "1500.03", "leverage": "3.1",
+         "liquidation_price": "65000.1", "last_updated_at": BASE_TS, "seq_no": 1}
+        for m in names
+    ]}
+
+
+# ==================== 基准 ====================
+
+@benchmark("edgex.handle_ticker")
+def bench_edgex_handle_ticker(max_n: int):
+    _, service = build_service("edgex")
+    service.loop = InlineLoop()
+    service.output = lambda message_type, data: None
+    frames = [edgex_ticker_frame(i) for i in range(max_n)]
+
+    def run(n):
+        service.quote_arbiter = QuoteArbiter()
+        handle = service.handle_ticker
+        for i in range(n):
+            handle(frames[i])
+    return run
+
+
+@benchmark("paradex.on_bbo_update")
+def bench_paradex_bbo(max_n: int):
+    _, service = build_service("paradex")
+    service.output = lambda message_type, data: None
+    frames = [paradex_bbo_frame(i) for i in range(max_n)]
+
+    def run(n):
+        service.quote_arbiter = QuoteArbiter()
+        handler = service.on_bbo_update
+        for i in range(n):
+            run_sync(handler("bbo", frames[i]))
+    return run
+
+
+@benchmark("paradex.on_orderbook_update")
+def bench_paradex_orderbook(max_n: int):
+    _, service = build_service("paradex")
+    service.output = lambda message_type, data: None
+    frames = [paradex_orderbook_frame(i) for i in range(max_n)]
+
+    def run(n):
+        service.quote_arbiter = QuoteArbiter()
+        handler = service.on_orderbook_update
+        for i in range(n):
+            run_sync(handler("orderbook", frames[i]))
+    return run
+
+
+@benchmark("edgex.output")
+def bench_edgex_output(max_n: int):
+    _, service = build_service("edgex")
+    payload = price_update_payload()
+    del payload["market"]
+    payload["contract_id"] = service.contract_id  # EdgeX 的 price_update 按 contract_id 分发
+
+    def run(n):
+        output = service.output
+        for _ in range(n):
+            output("price_update", payload)
+    return run
+
+
+@benchmark("paradex.output")
+def bench_paradex_output(max_n: int):
+    _, service = build_service("paradex")
+    payload = price_update_payload()
+
+    def run(n):
+        output = service.output
+        for _ in range(n):
+            output("price_update", payload)
+    return run
+
+
+@benchmark("paradex.normalize_order_id")
+def bench_normalize_order_id(max_n: int):
+    _, service = build_service("paradex")
+    ids = ["1700000000123456", "{A1B2C3D4-E5F6-7788-99AA-BBCCDDEEFF00}", 1700000000123456, "a1b2c3d4e5f6"]
+
+    def run(n):
+        normalize = service.normalize_order_id
+        for i in range(n):
+            normalize(ids[i & 3])
+    return run
+
+
+@benchmark("edgex._apply_fills")
+def bench_edgex_apply_fills(max_n: int):
+    _, service = build_service("edgex")
+    fills = edgex_fills("600000000000001234")
+
+    def run(n):
+        for _ in range(n):
+            order = {"order_id": "600000000000001234", "api_error": None, "result": {}}
+            service._apply_fills(order, fills)
+    return run
+
+
+@benchmark("paradex._apply_fills")
+def bench_paradex_apply_fills(max_n: int):
+    _, service = build_service("paradex")
+    fills = paradex_fills("1700000000999999")
+
+    def run(n):
+        for _ in range(n):
+            service._apply_fills({}, "1700000000999999", fills)
+    return run
+
+
+@benchmark("edgex.get_position")
+def bench_edgex_get_position(max_n: int):
+    _, service = build_service("edgex")
+    response = edgex_positions()
+
+    async def get_account_positions():
+        return response
+
+    service.client = SimpleNamespace(get_account_positions=get_account_positions)
+    service.min_request_interval = 0
+
+    def run(n):
+        loop = asyncio.new_event_loop()
+        try:
+            async def batch():
+                for _ in range(n):
+                    await service.get_position({"contract_id": "10000001"})
+            loop.run_until_complete(batch())
+        finally:
+            loop.close()
+    return run
+
+
+@benchmark("paradex.get_position")
+def bench_paradex_get_position(max_n: int):
+    _, service = build_service("paradex")
+    response = paradex_positions()
+    service.paradex = SimpleNamespace(api_client=SimpleNamespace(fetch_positions=lambda: response))
+
+    def run(n):
+        for _ in range(n):
+            run_sync(service.get_position("BTC-USD-PERP"))
+    return run
+
+
+# ==================== 运行 ====================
+
+def measure(factory, repeats: int, min_time: float, max_n: int) -> dict:
+    """校准迭代次数使每轮至少 min_time 秒，再重复 repeats 轮"""
+    n = 1
+    run = factory(max_n)
+    while True:
+        start = time.perf_counter_ns()
+        run(n)
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9 or n >= max_n:
+            break
+        n = min(max_n, max(n * 2, int(n * min_time * 1e9 / max(elapsed, 1) * 1.2)))
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        run(n)
+        samples.append((time.perf_counter_ns() - start) / n)
+
+    return {
+        "iterations": n,
+        "repeats": repeats,
+        "min_ns": round(min(samples), 1),
+        "median_ns": round(statistics.median(samples), 1),
+        "stdev_ns": round(statistics.stdev(samples), 1) if len(samples) > 1 else 0.0,
+        "ops_per_second": round(1e9 / min(samples), 1)
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点函数微基准")
+    parser.add_argument("-k", "--filter", default="", help="只运行名称包含该字符串的基准")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮最少耗时（秒）")
+    parser.add_argument("--max-iterations", type=int, default=200000)
+    parser.add_argument("--output", help="结果文件（默认 benchmarks/results/micro-<git>-<时间>.json）")
+    parser.add_argument("--compare", help="与之前保存的结果文件对比")
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定为退化的最小值变慢比例")
+    args = parser.parse_args()
+
+    os.environ["EDGEX_WS_CONNECTIONS"] = "1"
+    os.environ["PARADEX_WS_CONNECTIONS"] = "1"
+
+    # 服务日志走 stderr，不计入被测函数的耗时；服务 output() 写入 /dev/null
+    logging.disable(logging.INFO)
+    real_stdout = sys.stdout
+    devnull = open(os.devnull, "w")
+    sys.stdout = devnull
+
+    results = {}
+    try:
+        for name, factory in BENCHMARKS.items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = measure(factory, args.repeats, args.min_time, args.max_iterations)
+            r = results[name]
+            print(f"📊 {name:<32} {r['min_ns']:>12,.0f} ns/op  (中位 {r['median_ns']:,.0f}, ±{r['stdev_ns']:,.0f})", file=sys.stderr)
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+        logging.disable(logging.NOTSET)
+
+    report = {
+        "benchmark": "micro",
+        "git": git_revision(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+    path = args.output
+    if not path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"micro-{report['git']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 结果已保存: {path}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\n对比基线 {baseline.get('git')} ({baseline.get('timestamp')}):", file=sys.stderr)
+        regressions = []
+        for name, r in results.items():
+            base = baseline.get("results", {}).get(name)
+            if not base:
+                continue
+            change = (r["min_ns"] - base["min_ns"]) / base["min_ns"]
+            flag = "⚠️ " if change > args.threshold else "   "
+            print(f"{flag}{name:<32} {base['min_ns']:>10,.0f} → {r['min_ns']:>10,.0f} ns/op ({change * 100:+.1f}%)", file=sys.stderr)
+            if change > args.threshold:
+                regressions.append(name)
+        if regressions:
+            print(f"❌ {len(regressions)} 项退化超过 {args.threshold * 100:.0f}%: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Tick → 输出 延迟基准
+用合成行情帧按固定速率驱动真实的服务回调（EdgeX handle_ticker 走 WebSocket 线程 → 事件循环的真实路径，
+Paradex on_bbo_update / on_orderbook_update 在事件循环中 await），
+记录每一帧进入回调的时间和对应 price_update 写出 stdout 的时间，统计 p50/p99/p99.9 延迟和最大可持续吞吐。
+
+stdout 替换为写入 /dev/null 的计时器，print + json.dumps + flush 都计入延迟。
+结果保存到 benchmarks/results/，带 git 提交号，可用 --compare 与之前的结果对比。
+
+用法:
+    python3 benchmarks/tick_to_output.py edgex --rates 1000,5000,20000,50000 --duration 3
+    python3 benchmarks/tick_to_output.py paradex --channel orderbook --compare benchmarks/results/xxx.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from market_replay import build_service
+
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+BASE_TS = 1_700_000_000_000  # 合成帧的交易所时间戳起点（毫秒），每帧 +1 作为匹配键
+
+# 可持续的判定：实际输出速率达到目标的 95%，且 p99.9 不超过 --max-p999-ms
+SUSTAINED_RATIO = 0.95
+
+
+class TimedStdout:
+    """替换 sys.stdout：写入 /dev/null，并记录每行写完的时间"""
+
+    def __init__(self):
+        self._file = open(os.devnull, "w")
+        self.lines = []
+
+    def write(self, s):
+        self._file.write(s)
+        if s != "\n":
+            self.lines.append((time.perf_counter_ns(), s))
+        return len(s)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def edgex_frame(i: int) -> str:
+    bid = 100000 + (i % 200) * 0.1
+    return json.dumps({
+        "type": "quote-event",
+        "channel": "ticker.10000001",
+        "content": {"dataType": "Changed", "data": [{
+            "contractId": "10000001",
+            "bestBidPrice": f"{bid:.1f}",
+            "bestAskPrice": f"{bid + 0.5:.1f}",
+            "lastPrice": f"{bid + 0.2:.1f}",
+            "endTime": str(BASE_TS + i)
+        }]}
+    })
+
+
+def paradex_frame(i: int, channel: str) -> dict:
+    bid = 100000 + (i % 200) * 0.1
+    if channel == "bbo":
+        data = {"market": "BTC-USD-PERP", "bid": f"{bid:.1f}", "ask": f"{bid + 0.5:.1f}",
+                "bid_size": "0.5", "ask_size": "0.7", "last_updated_at": BASE_TS + i}
+    else:
+        data = {
+            "market": "BTC-USD-PERP",
+            "bids": [[f"{bid - k * 0.1:.1f}", "0.5"] for k in range(5)],
+            "asks": [[f"{bid + 0.5 + k * 0.1:.1f}", "0.7"] for k in range(5)],
+            "last_updated_at": BASE_TS + i
+        }
+    return {"jsonrpc": "2.0", "method": "subscription", "params": {"channel": f"{channel}.BTC-USD-PERP", "data": data}}
+
+
+def percentile(sorted_values: list, p: float):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(p * len(sorted_values)) - 1))]
+
+
+async def run_edgex(service, frames: list, rate: float, entry_ns: list):
+    """WebSocket 线程按速率调用 handle_ticker（与 SDK 的同步回调线程一致）"""
+    service.loop = asyncio.get_running_loop()
+
+    def produce():
+        start = time.perf_counter_ns()
+        interval = 1e9 / rate if rate else 0
+        for i, frame in enumerate(frames):
+            if interval:
+                target = start + i * interval
+                while time.perf_counter_ns() < target:
+                    time.sleep(0)
+            entry_ns[i] = time.perf_counter_ns()
+            service.handle_ticker(frame)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    while thread.is_alive() or service.ws_inbox or service._drain_scheduled:
+        await asyncio.sleep(0.001)
+
+
+async def run_paradex(service, frames: list, rate: float, entry_ns: list, channel: str):
+    """事件循环中按速率 await 回调（与 SDK 的 WebSocket 读循环一致）"""
+    handler = service.on_bbo_update if channel == "bbo" else service.on_orderbook_update
+    start = time.perf_counter_ns()
+    interval = 1e9 / rate if rate else 0
+    for i, frame in enumerate(frames):
+        if interval:
+            target = start + i * interval
+            now = time.perf_counter_ns()
+            if now < target:
+                # 领先时让出事件循环（亚毫秒级间隔靠批量追赶，不逐帧 sleep）
+                await asyncio.sleep((target - now) / 1e9 if target - now > 1_000_000 else 0)
+        entry_ns[i] = time.perf_counter_ns()
+        await handler(channel, frame)
+
+
+def measure(exchange: str, channel: str, rate: float, duration: float) -> dict:
+    """单个速率下的一次测量（rate=0 表示不限速，测最大吞吐）"""
+    count = int(rate * duration) if rate else int(50000 * duration)
+    _, service = build_service(exchange)
+    frames = [edgex_frame(i) for i in range(count)] if exchange == "edgex" else [paradex_frame(i, channel) for i in range(count)]
+    entry_ns = [0] * count
+
+    sink = TimedStdout()
+    real_stdout = sys.stdout
+    sys.stdout = sink
+    wall_start = time.perf_counter_ns()
+    try:
+        if exchange == "edgex":
+            asyncio.run(run_edgex(service, frames, rate, entry_ns))
+        else:
+            asyncio.run(run_paradex(service, frames, rate, entry_ns, channel))
+    finally:
+        sys.stdout = real_stdout
+        sink.close()
+    wall = (time.perf_counter_ns() - wall_start) / 1e9
+
+    latencies = []
+    for out_ns, line in sink.lines:
+        message = json.loads(line)
+        if message.get("type") != "price_update":
+            continue
+        index = int(message["data"]["exchange_ts"]) - BASE_TS
+        if 0 <= index < count and entry_ns[index]:
+            latencies.append(round((out_ns - entry_ns[index]) / 1000, 1))  # 微秒
+    latencies.sort()
+
+    return {
+        "target_rate": rate,
+        "frames": count,
+        "outputs": len(latencies),
+        "wall_seconds": round(wall, 3),
+        "achieved_rate": round(len(latencies) / wall, 1) if wall else 0,
+        "latency_us": {
+            "p50": percentile(latencies, 0.5),
+            "p99": percentile(latencies, 0.99),
+            "p99.9": percentile(latencies, 0.999),
+            "max": latencies[-1] if latencies else None,
+            "mean": round(sum(latencies) / len(latencies), 1) if latencies else None
+        }
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: dict, baseline: dict):
+    """按目标速率对比 p50/p99/p99.9"""
+    base_by_rate = {r["target_rate"]: r for r in baseline["runs"]}
+    print(f"\n对比基线 {baseline.get('git')} ({baseline.get('timestamp')}):", file=sys.stderr)
+    for run in current["runs"]:
+        base = base_by_rate.get(run["target_rate"])
+        if not base:
+            continue
+        parts = []
+        for key in ("p50", "p99", "p99.9"):
+            now, before = run["latency_us"][key], base["latency_us"][key]
+            if now is None or not before:
+                continue
+            parts.append(f"{key} {before:.0f}→{now:.0f}us ({(now - before) / before * 100:+.1f}%)")
+        print(f"   {run['target_rate'] or 'max':>8}: " + ", ".join(parts), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tick → 输出 延迟基准")
+    parser.add_argument("exchange", choices=["edgex", "paradex"])
+    parser.add_argument("--channel", choices=["bbo", "orderbook"], default="bbo", help="Paradex 驱动的频道")
+    parser.add_argument("--rates", default="1000,2000,5000,10000,20000,50000", help="逗号分隔的目标速率（msg/s）")
+    parser.add_argument("--duration", type=float, default=3.0, help="每个速率的测量秒数")
+    parser.add_argument("--max-p999-ms", type=float, default=50.0, help="可持续吞吐的 p99.9 上限")
+    parser.add_argument("--output", help="结果文件（默认 benchmarks/results/<exchange>-<git>-<时间>.json）")
+    parser.add_argument("--compare", help="与之前保存的结果文件对比")
+    args = parser.parse_args()
+
+    os.environ.setdefault("EDGEX_WS_CONNECTIONS", "1")
+    os.environ.setdefault("PARADEX_WS_CONNECTIONS", "1")
+
+    runs = []
+    for rate in [float(r) for r in args.rates.split(",") if r.strip()] + [0]:
+        run = measure(args.exchange, args.channel, rate, args.duration)
+        runs.append(run)
+        lat = run["latency_us"]
+        print(
+            f"📊 {args.exchange} {('%d msg/s' % rate) if rate else '不限速'}: "
+            f"{run['achieved_rate']:.0f} msg/s, p50={lat['p50']}us p99={lat['p99']}us p99.9={lat['p99.9']}us",
+            file=sys.stderr
+        )
+
+    sustained = [
+        r["target_rate"] for r in runs
+        if r["target_rate"] and r["achieved_rate"] >= r["target_rate"] * SUSTAINED_RATIO
+        and r["latency_us"]["p99.9"] is not None and r["latency_us"]["p99.9"] <= args.max_p999_ms * 1000
+    ]
+    result = {
+        "benchmark": "tick_to_output",
+        "exchange": args.exchange,
+        "channel": args.channel if args.exchange == "paradex" else "ticker",
+        "git": git_revision(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "duration": args.duration,
+        "max_sustained_rate": max(sustained) if sustained else 0,
+        "max_throughput": runs[-1]["achieved_rate"],
+        "runs": runs
+    }
+
+    path = args.output
+    if not path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"tick_to_output-{args.exchange}-{result['git']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"✅ 最大可持续速率: {result['max_sustained_rate']:.0f} msg/s, 不限速吞吐: {result['max_throughput']:.0f} msg/s", file=sys.stderr)
+    print(f"💾 结果已保存: {path}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
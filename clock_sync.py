@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+交易所时钟偏差与网络延迟估计
+服务器时间样本：本地单调时钟记录请求往返时间 RTT，假设去程和回程各占一半，
+    偏差 offset = 服务器时间 - (发送时本地时间 + RTT / 2)，误差不超过 ±RTT / 2；
+    窗口内 RTT 最小的样本误差界最小，取它的偏差再做指数平滑，排队/重传造成的慢样本不会拉偏估计
+WebSocket ping/pong 样本：只有往返时间，用于 RTT 估计
+
+offset 为正表示交易所时钟比本地快；消息年龄 = 接收时本地时间 + offset - 交易所时间戳
+"""
+
+import collections
+
+
+class ClockEstimator:
+    """单个交易所的时钟偏差和 RTT 估计"""
+
+    def __init__(self, window: int = 32, alpha: float = 0.2):
+        self.alpha = alpha  # 指数平滑系数
+        self.samples = collections.deque(maxlen=window)  # 服务器时间样本 (rtt_ms, offset_ms)
+        self.offset_ms = None  # 平滑后的时钟偏差（交易所 - 本地）
+        self.uncertainty_ms = None  # 当前采用样本的误差界（RTT / 2）
+        self.rtt_ms = {}  # 来源 → 平滑 RTT
+        self.min_rtt_ms = {}  # 来源 → 窗口外也保留的历史最小 RTT
+        self.sample_count = 0
+        self.last_sample_ts = 0
+
+    def _add_rtt(self, source: str, rtt_ms: float):
+        previous = self.rtt_ms.get(source)
+        self.rtt_ms[source] = rtt_ms if previous is None else previous + self.alpha * (rtt_ms - previous)
+        self.min_rtt_ms[source] = min(self.min_rtt_ms.get(source, rtt_ms), rtt_ms)
+
+    def add_server_time(self, server_ts: float, sent_ts: float, rtt_ms: float):
+        """加入一个服务器时间样本：sent_ts 为发送请求时的本地毫秒时间，rtt_ms 由单调时钟测得"""
+        offset = server_ts - (sent_ts + rtt_ms / 2)
+        self.samples.append((rtt_ms, offset))
+        self._add_rtt("server_time", rtt_ms)
+        self.sample_count += 1
+        self.last_sample_ts = sent_ts + rtt_ms
+
+        best_rtt, best_offset = min(self.samples)
+        if self.offset_ms is None:
+            self.offset_ms = best_offset
+        else:
+            self.offset_ms += self.alpha * (best_offset - self.offset_ms)
+        self.uncertainty_ms = best_rtt / 2
+
+    def add_ping(self, rtt_ms: float):
+        """加入一个 WebSocket ping/pong 往返时间样本"""
+        self._add_rtt("ws_ping", rtt_ms)
+
+    def message_age_ms(self, exchange_ts: int, recv_ts: int) -> float:
+        """按时钟偏差修正后的消息年龄（尚无样本时不修正）"""
+        return recv_ts + (self.offset_ms or 0.0) - exchange_ts
+
+    def one_way_ms(self):
+        """单程延迟估计：优先用 WebSocket RTT（与行情走同一条连接）"""
+        rtt = self.rtt_ms.get("ws_ping", self.rtt_ms.get("server_time"))
+        return rtt / 2 if rtt is not None else None
+
+    def snapshot(self, now_ms: int) -> dict:
+        rnd = lambda v: round(v, 3) if v is not None else None
+        one_way = self.one_way_ms()
+        return {
+            "offset_ms": rnd(self.offset_ms),
+            "uncertainty_ms": rnd(self.uncertainty_ms),
+            "rtt_ms": {source: rnd(v) for source, v in self.rtt_ms.items()},
+            "min_rtt_ms": {source: rnd(v) for source, v in self.min_rtt_ms.items()},
+            "one_way_ms": rnd(one_way),
+            "samples": self.sample_count,
+            "last_sample_age_ms": int(now_ms - self.last_sample_ts) if self.last_sample_ts else None
+        }
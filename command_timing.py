@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+命令耗时分解
+handle_command 开始时创建 CommandTiming 并放入 ContextVar，下单链路上的限速、签名、交易所确认、等待成交
+各自调用 record()/measure() 记账，无需层层传参；output() 输出 command_result 时附带 trace_id 和分解结果。
+
+同一命令内并发的子任务（批量下单、撤单+新单）共享同一个 CommandTiming，各阶段耗时为累加值，可能大于总耗时。
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("command_timing", default=None)
+
+# 输出字段 ← 阶段名
+PHASES = (
+    ("queue_wait_ms", "queue_wait"),
+    ("rate_limit_wait_ms", "rate_limit_wait"),
+    ("signing_ms", "signing"),
+    ("ack_rtt_ms", "ack"),
+    ("fill_wait_ms", "fill_wait"),
+)
+
+
+class CommandTiming:
+    """一条命令的各阶段耗时（秒）"""
+
+    def __init__(self, trace_id=None, received_at: float = None):
+        self.trace_id = trace_id
+        self.started_at = time.perf_counter()
+        self.received_at = received_at if received_at is not None else self.started_at
+        self.phases = {"queue_wait": self.started_at - self.received_at}
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def breakdown(self) -> dict:
+        """毫秒分解；签名发生在交易所请求内部时，从确认耗时中扣除"""
+        phases = dict(self.phases)
+        if "ack" in phases and "signing" in phases:
+            phases["ack"] = max(0.0, phases["ack"] - phases["signing"])
+        result = {field: round(phases[phase] * 1000, 3) for field, phase in PHASES if phase in phases}
+        result["total_ms"] = round((time.perf_counter() - self.received_at) * 1000, 3)
+        return result
+
+
+def begin(trace_id=None, received_at: float = None):
+    """在当前上下文中开始计时，返回用于 end() 的令牌"""
+    return _current.set(CommandTiming(trace_id, received_at))
+
+
+def end(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record(phase: str, seconds: float):
+    timing = _current.get()
+    if timing is not None:
+        timing.add(phase, seconds)
+
+
+@contextmanager
+def measure(phase: str):
+    """计时一个代码块并记入当前命令（没有当前命令时只多一次 ContextVar 读取）"""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(phase, time.perf_counter() - start)
+
+
+def instrument_signing(obj, method_name: str) -> bool:
+    """把 SDK 对象的签名方法包一层计时（签名耗时记为 signing 阶段），方法不存在时返回 False"""
+    method = getattr(obj, method_name, None) if obj is not None else None
+    if method is None or getattr(method, "_timed", False):
+        return method is not None
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            record("signing", time.perf_counter() - start)
+
+    timed._timed = True
+    setattr(obj, method_name, timed)
+    return True
@@ -6,67 +6,275 @@ EdgeX 交易服务
 """
 
 import asyncio
+import collections
 import json
 import sys
 import os
-import logging
+import math
+import random
 import time
-from datetime import datetime
 
 # 添加 EdgeX SDK 路径
 sys.path.insert(0, '/root/edgex-python-sdk')
 
 from edgex_sdk import Client, CreateOrderParams, OrderSide, OrderType, CancelOrderParams, WebSocketManager
 
+from orderbook_math import executable_quotes, visible_depth
+from quote_arbiter import LOCAL_CLOCK, QuoteArbiter
+from feed_monitor import FeedMonitor, parse_stale_thresholds
+from ws_dedup import FirstArrivalDeduplicator
+from market_recorder import MarketRecorder
+from service_metrics import ServiceMetrics, serve_metrics
+import command_timing
+from async_logging import setup_logging
+from loop_monitor import LoopLagMonitor
+from live_profiler import LiveProfiler
+from clock_sync import ClockEstimator
+from replay_buffer import ReplayBuffer
+from service_broker import BrokerServer, current_client_id
+from market_subscriptions import STDOUT, SubscriptionRegistry, profile_depth, profile_name, shape
+
+# 输出编码器：紧凑分隔符，跳过循环引用检查（输出内容不含循环引用）
+_encode = json.JSONEncoder(separators=(",", ":"), check_circular=False).encode
+
 
 class EdgeXTradingService:
     """EdgeX 交易服务类"""
 
+    TAKER_FEE_RATE = float(os.getenv("EDGEX_TAKER_FEE_RATE", "0.00038"))  # 吃单费率，用于估算 maker 节省的手续费
+    MAX_LOGICAL_ORDERS = 1000  # 改单链记录上限
+
     def __init__(self, account_id: str, stark_private_key: str, base_url: str = "https://pro.edgex.exchange", ws_url: str = "wss://quote.edgex.exchange"):
         self.account_id = int(account_id)
         self.stark_private_key = stark_private_key
         self.base_url = base_url
         self.ws_url = ws_url
+        self.contract_id = "10000001"  # 交易的合约 BTC-USD-PERP
+        # REST 深度来源（压测时可指向 mock_exchange.py）
+        self.depth_url = os.getenv("EDGEX_DEPTH_URL", "https://fapi.asterdex.com/fapi/v1/depth")
+        # 交易所时钟偏差/RTT 估计：每 EDGEX_CLOCK_SYNC_INTERVAL 秒请求一次服务器时间
+        self.server_time_url = os.getenv("EDGEX_SERVER_TIME_URL", f"{base_url}/api/v1/public/meta/getServerTime")
+        self.clock_sync_interval = float(os.getenv("EDGEX_CLOCK_SYNC_INTERVAL", "30"))
+        self.clock = ClockEstimator()
         self.client = None
         self.ws_manager = None
         self.last_price = 0
         self.orderbook = None  # 存储最新的订单簿数据
 
+        # 可成交价格预计算：每次订单簿更新时计算这些数量在买卖两侧的成交均价/最差价
+        self.quote_sizes = [float(x) for x in os.getenv("EDGEX_QUOTE_SIZES", "0.01,0.03,0.1").split(",") if x.strip()]
+        self.executable_quotes = None
+        self.loop = None  # asyncio 事件循环（WebSocket 线程回调通过它切回主循环）
+
+        # WebSocket 线程 → 事件循环的消息队列：WS 线程只解析和入队，行情状态只在事件循环中修改
+        self.ws_inbox = collections.deque()
+        self._drain_scheduled = False
+
+        # 盘口最优价（maker 执行据此报价），变化时唤醒等待 book_event 的执行任务
+        self.best_bid = 0
+        self.best_ask = 0
+        self.book_event = asyncio.Event()
+
+        # 行情来源仲裁：Ticker / REST 两个来源只接受交易所时间戳更新的数据
+        self.quote_arbiter = QuoteArbiter()
+
+        # 行情源新鲜度监控：Ticker 正常时不轮询 REST 行情，过期时自动切换到 REST（rest_ticker）
+        # 订单簿只有 REST 来源（rest），始终轮询
+        self.feed_monitor = FeedMonitor(parse_stale_thresholds(
+            os.getenv("EDGEX_FEED_STALE_MS", ""), ["ticker", "rest_ticker", "rest"], 5000
+        ), fallbacks={"rest_ticker": "ticker"})
+
+        # WebSocket 连接守护：Ticker 超过阈值无消息时重连
+        self.ws_reconnect_stale_ms = int(os.getenv("EDGEX_WS_RECONNECT_STALE_MS", "15000"))
+        self.ws_connected_at = 0
+        self.reconnects = 0
+
+        # 冗余公共连接：同时开 N 条连接订阅 Ticker，只处理最先到达的消息
+        self.ws_connections = max(1, int(os.getenv("EDGEX_WS_CONNECTIONS", "1")))
+        self.ws_dedup = FirstArrivalDeduplicator(self.ws_connections) if self.ws_connections > 1 else None
+        self.redundant_ws_managers = []
+
         # ✅ 请求限速器（防止 Cloudflare 429）
         # EdgeX API: 2 ops per 2 seconds = 每次请求至少间隔 1 秒
         # 安全起见，设置为 2.5 秒（更保守，避免 Cloudflare 滑动窗口）
         self.last_request_time = 0
         self.min_request_interval = 2.5  # 最小请求间隔 2.5 秒
+        # 公共行情接口（quote summary、服务器时间）单独限速，行情兜底轮询不占用下单/撤单的时间槽
+        self.last_public_request_time = 0
+        self.min_public_request_interval = float(os.getenv("EDGEX_PUBLIC_MIN_INTERVAL_MS", "1000")) / 1000
         self.rate_limit_failures = 0  # 记录连续失败次数（用于指数退避）
 
-        # 配置日志
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            stream=sys.stderr  # 日志输出到 stderr，避免干扰数据流
+        # 改单链：逻辑订单ID → {原始订单ID, 当前订单ID, 改单次数}，以及 当前订单ID → 逻辑订单ID
+        self.logical_orders = {}
+        self.order_logical_ids = {}
+
+        # 配置日志（队列 + 后台线程写 stderr，见 async_logging.py）
+        self.logger = setup_logging("edgex")
+
+        # 原始行情录制（设置 EDGEX_RECORD_DIR 时启用）
+        record_dir = os.getenv("EDGEX_RECORD_DIR")
+        self.recorder = MarketRecorder(
+            record_dir, "edgex",
+            rotate_bytes=int(os.getenv("EDGEX_RECORD_ROTATE_MB", "64")) * 1024 * 1024,
+            logger=self.logger
+        ) if record_dir else None
+
+        # 输出序号：seq 全局递增，stream_seq 按消息类型（price_update 按市场）各自递增
+        self.output_seq = 0
+        self.stream_seq = {}
+        # 最近的非行情事件，供消费端重启后用 replay_since 补齐
+        self.replay_buffer = ReplayBuffer(int(os.getenv("EDGEX_REPLAY_BUFFER", "5000")))
+        self.stdout_closed = False
+
+        # broker 模式：设置 EDGEX_BROKER_SOCKET 时在该 Unix socket 上服务多个客户端（见 service_broker.py）
+        self.broker_socket = os.getenv("EDGEX_BROKER_SOCKET")
+        self.broker = None
+
+        # 运行时行情订阅：各消费端订阅的合约和档位（subscribe / unsubscribe 命令，见 market_subscriptions.py）
+        self.subscriptions = SubscriptionRegistry(self.contract_id)
+        self.ticker_contracts = set()  # 主连接上额外订阅了 Ticker 的合约
+
+        # 指标（Prometheus 文本格式）：始终采集，设置 EDGEX_METRICS_PORT 时在本机开放 /metrics
+        self.metrics = ServiceMetrics("edgex")
+        self.metrics_port = int(os.getenv("EDGEX_METRICS_PORT", "0"))
+        self.metrics_server = None
+
+        # 事件循环延迟/阻塞检测：阻塞超过阈值时抓取调用栈并推送 loop_blocked
+        self.loop_monitor = LoopLagMonitor(
+            interval=float(os.getenv("EDGEX_LOOP_LAG_INTERVAL_MS", "50")) / 1000,
+            block_threshold=float(os.getenv("EDGEX_LOOP_BLOCK_MS", "100")) / 1000,
+            on_lag=self.metrics.loop_lag.observe,
+            on_block=self._on_loop_blocked
         )
-        self.logger = logging.getLogger(__name__)
+        self.loop_monitor_task = None
+
+        # 按需性能剖析（profile 命令），结果写到 EDGEX_PROFILE_DIR（默认系统临时目录）
+        self.profiler = LiveProfiler(os.getenv("EDGEX_PROFILE_DIR"), "edgex")
 
     def output(self, message_type: str, data: dict):
-        """输出 JSON 消息到 stdout 供 TypeScript 读取"""
-        message = {
+        """输出 JSON 消息到 stdout 供 TypeScript 读取
+
+        信封字段：seq 为全局序号（所有消息统一从 1 递增），stream_seq 按消息类型从 1 递增（消费端据此发现缺口），
+        timestamp 为毫秒时间戳，
+        emit_mono_ns 为写出时的单调时钟纳秒；来自交易所的消息在 data 中另带
+        exchange_ts（交易所毫秒时间戳）、recv_ts 和 recv_mono_ns（本地接收时间），
+        emit_mono_ns - recv_mono_ns 即服务内处理耗时；
+        price_update 只发给订阅了该市场的消费端，按各自的档位裁剪，stream_seq 按市场递增
+        """
+        self.metrics.messages_out.inc(message_type)
+        if message_type == "command_result":
+            # 命令耗时分解（当前上下文中有正在处理的命令时）
+            timing = command_timing.current()
+            if timing is not None:
+                if timing.trace_id is not None:
+                    data["trace_id"] = timing.trace_id
+                data["timing"] = timing.breakdown()
+        self.output_seq += 1
+        seq = self.output_seq
+        if message_type == "price_update":
+            self._route_price_update(seq, data)
+            return
+        stream_seq = self.stream_seq.get(message_type, 0) + 1
+        self.stream_seq[message_type] = stream_seq
+        line = _encode({
             "type": message_type,
-            "timestamp": datetime.now().isoformat(),
+            "seq": seq,
+            "stream_seq": stream_seq,
+            "timestamp": time.time_ns() // 1_000_000,
+            "emit_mono_ns": time.monotonic_ns(),
             "data": data
-        }
-        print(json.dumps(message), flush=True)
+        })
+        self.replay_buffer.add(seq, message_type, line)
+        self._publish(message_type, line, broadcast=message_type != "command_result")
+
+    def _route_price_update(self, seq: int, data: dict):
+        """price_update 按订阅分发：同一档位的消费端共用一次编码，stream_seq 按合约递增（交易合约沿用 price_update）"""
+        contract_id = data.get("contract_id")
+        routes = self.subscriptions.routes(contract_id)
+        if not routes:
+            return
+        stream_key = "price_update" if contract_id == self.contract_id else f"price_update:{contract_id}"
+        stream_seq = self.stream_seq.get(stream_key, 0) + 1
+        self.stream_seq[stream_key] = stream_seq
+        timestamp = time.time_ns() // 1_000_000
+        emit_mono_ns = time.monotonic_ns()
+        for depth, subscribers in routes.items():
+            line = _encode({
+                "type": "price_update",
+                "seq": seq,
+                "stream_seq": stream_seq,
+                "timestamp": timestamp,
+                "emit_mono_ns": emit_mono_ns,
+                "data": shape(data, depth)
+            })
+            clients = [subscriber for subscriber in subscribers if subscriber is not STDOUT]
+            if clients and self.broker is not None:
+                self.broker.send_to(clients, "price_update", line)
+            if len(clients) != len(subscribers):
+                self._emit(line)
+
+    def _publish(self, message_type: str, line: str, broadcast: bool = True):
+        """分发一行输出：broker 客户端 + stdout；broadcast=False 的消息只回给发出命令的一方"""
+        if self.broker is None or self.broker.publish(message_type, line, broadcast):
+            self._emit(line)
+
+    def _emit(self, line: str):
+        """写一行到 stdout（回放时替换为收集）；stdout 已关闭（启动本服务的进程退出）后不再写入"""
+        if self.stdout_closed:
+            return
+        stdout = sys.stdout
+        try:
+            stdout.write(line + "\n")
+            stdout.flush()
+        except (BrokenPipeError, ValueError):
+            self.stdout_closed = True
+            self.logger.warning("⚠️ stdout 已关闭，之后只向 broker 客户端输出")
+
+    def replay_since(self, seq: int) -> dict:
+        """把缓冲中序号大于 seq 的事件按原样重新输出（保留原序号，消费端按 seq 去重），返回补发摘要
+
+        complete 为 False 表示 seq 之后的部分事件已被挤出缓冲，消费端仍需通过 REST 对账
+        """
+        lines, complete = self.replay_buffer.since(seq)
+        for line in lines:
+            self._publish(None, line, broadcast=False)
+        if lines:
+            self.logger.info(f"🔁 重放 seq>{seq} 的事件 {len(lines)} 条" + ("" if complete else "（缓冲不完整）"))
+        return dict(self.replay_buffer.snapshot(), since=seq, replayed=len(lines), complete=complete, latest_seq=self.output_seq)
+
+    def _update_top_of_book(self, bid: float, ask: float):
+        """更新盘口最优价，变化时唤醒所有等待 book_event 的任务（在事件循环中调用）"""
+        if bid == self.best_bid and ask == self.best_ask:
+            return
+        self.best_bid = bid
+        self.best_ask = ask
+        event, self.book_event = self.book_event, asyncio.Event()
+        event.set()
 
     async def _rate_limit(self):
-        """请求限速：确保两次请求间隔至少 min_request_interval 秒"""
+        """请求限速：确保两次请求间隔至少 min_request_interval 秒
+
+        先预约时间槽再等待，并发调用会依次排到后续时间槽（批量命令据此流水线提交）
+        只用于账户相关的私有接口，公共行情接口走 _public_rate_limit
+        """
         now = time.time()
-        time_since_last = now - self.last_request_time
+        slot = max(now, self.last_request_time + self.min_request_interval)
+        self.last_request_time = slot
 
-        if time_since_last < self.min_request_interval:
-            wait_time = self.min_request_interval - time_since_last
+        wait_time = slot - now
+        self.metrics.rate_limit_wait.observe(wait_time)
+        command_timing.record("rate_limit_wait", wait_time)
+        if wait_time > 0:
             self.logger.debug(f"⏱️ 限速：等待 {wait_time:.2f}s")
             await asyncio.sleep(wait_time)
 
-        self.last_request_time = time.time()
+    async def _public_rate_limit(self):
+        """公共行情接口限速：独立的时间槽（间隔 min_public_request_interval），不与下单、撤单排队"""
+        now = time.time()
+        slot = max(now, self.last_public_request_time + self.min_public_request_interval)
+        self.last_public_request_time = slot
+        if slot > now:
+            await asyncio.sleep(slot - now)
 
     def get_backoff_delay(self):
         """获取指数退避延迟（Fibonacci 序列）"""
@@ -75,8 +283,13 @@ class EdgeXTradingService:
         index = min(self.rate_limit_failures, len(fib) - 1)
         return fib[index]
 
-    async def handle_command(self, command: dict):
-        """处理来自 TypeScript 的命令"""
+    async def handle_command(self, command: dict, received_at: float = None):
+        """处理来自 TypeScript 的命令
+
+        received_at: stdin 读到命令时的 perf_counter()，用于计算排队等待；command 可带 trace_id，原样返回在 command_result 中
+        """
+        started = time.perf_counter()
+        timing_token = command_timing.begin(command.get("trace_id"), received_at)
         try:
             action = command.get("action")
             params = command.get("params", {})
@@ -92,6 +305,34 @@ class EdgeXTradingService:
                 })
             elif action == "cancel_order":
                 result = await self.cancel_order(params)
+                self._forget_order(params.get("order_id"))
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "create_orders":
+                result = await self.create_orders(params)
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "cancel_orders":
+                result = await self.cancel_orders(params)
+                for item in result["results"]:
+                    if item["success"]:
+                        self._forget_order(item["order_id"])
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "replace_order":
+                result = await self.replace_order(params)
                 self.output("command_result", {
                     "id": request_id,
                     "action": action,
@@ -122,6 +363,85 @@ class EdgeXTradingService:
                     "success": True,
                     "data": result
                 })
+            elif action == "quote_size":
+                result = await self.quote_size(params)
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "get_feed_status":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.feed_status()
+                })
+            elif action == "replay_since":
+                result = self.replay_since(int(params.get("seq", 0)))
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "get_broker_status":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.broker.snapshot() if self.broker else {"socket": None, "clients": []}
+                })
+            elif action == "subscribe":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.subscribe_market(params)
+                })
+            elif action == "unsubscribe":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.unsubscribe_market(params)
+                })
+            elif action == "get_subscriptions":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.subscriptions.snapshot()
+                })
+            elif action == "get_clock":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.clock_status()
+                })
+            elif action == "get_loop_stats":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.loop_monitor.snapshot()
+                })
+            elif action == "profile":
+                result = await self.profiler.run(
+                    duration=float(params.get("duration", 10)),
+                    mode=params.get("mode", "cprofile"),
+                    interval_ms=float(params.get("interval_ms", 5)),
+                    top=int(params.get("top", 20))
+                )
+                self.logger.info(f"🔬 剖析完成: {result['path']}")
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
             elif action == "get_price":
                 result = await self.get_price(params)
                 self.output("command_result", {
@@ -140,16 +460,49 @@ class EdgeXTradingService:
 
         except Exception as e:
             self.logger.error(f"❌ 命令处理错误: {e}", exc_info=True)
+            if "429" in str(e):
+                self.metrics.rate_limited.inc()
             self.output("command_result", {
                 "id": request_id,
                 "action": action,
                 "success": False,
                 "error": str(e)
             })
+        finally:
+            command_timing.end(timing_token)
+            self.metrics.command_duration.observe(time.perf_counter() - started, command.get("action"))
 
     async def create_order(self, params: dict):
         """创建订单（市价单或限价单）"""
-        contract_id = params.get("contract_id", "10000001")  # BTC-USD-PERP
+        if params.get("execution") == "maker":
+            return await self.execute_maker(params)
+        if params.get("execution") == "sliced":
+            return await self.execute_sliced(params)
+
+        order = await self._submit_order(params)
+
+        # 市价单：等待5秒后查询成交记录（简化逻辑，避免频繁请求）
+        if order["order_type"] == "MARKET":
+            self.logger.info(f"⏳ 等待 5 秒后查询成交...")
+            fill_wait_start = time.perf_counter()
+
+            # ✅ 固定等待 5 秒（给订单足够时间成交）
+            await asyncio.sleep(5)
+
+            order_ids = [order["order_id"]] if order["order_id"] else []
+            fill_list = await self._query_fills(order_ids, order["contract_id"], order["submit_time"])
+            self._apply_fills(order, fill_list)
+            command_timing.record("fill_wait", time.perf_counter() - fill_wait_start)
+            self._observe_fill_confirm(order["result"], order["submit_time"])
+
+        return order["result"]
+
+    async def _submit_order(self, params: dict):
+        """提交单个订单，返回下单状态（不等待成交）
+
+        SDK 异常不会抛出，而是记录在 api_error 中，由调用方结合成交记录判断订单是否成功
+        """
+        contract_id = params.get("contract_id", self.contract_id)
         side = params.get("side", "BUY").upper()
         size = str(params.get("size", "0.001"))
         order_type = params.get("type", "MARKET").upper()
@@ -164,6 +517,7 @@ class EdgeXTradingService:
         result = {}
         api_error = None
         submit_time = int(time.time() * 1000)  # 记录提交时间（毫秒）
+        ack_start = None
 
         # ⚠️ 关键修复：捕获 SDK 异常，但继续查询成交记录
         try:
@@ -171,6 +525,7 @@ class EdgeXTradingService:
             await self._rate_limit()
 
             # 使用 EdgeX SDK 下单
+            ack_start = time.perf_counter()
             if order_type == "MARKET":
                 # 市价单使用便捷方法（自动计算价格）
                 result = await self.client.create_market_order(
@@ -183,14 +538,27 @@ class EdgeXTradingService:
                 if not price:
                     raise ValueError("限价单必须提供价格")
 
-                result = await self.client.create_limit_order(
-                    contract_id=contract_id,
-                    size=size,
-                    price=str(price),
-                    side=order_side
-                )
+                if params.get("post_only"):
+                    # post-only 限价单（会吃单时被交易所拒绝）
+                    result = await self.client.create_order(CreateOrderParams(
+                        contract_id=contract_id,
+                        size=size,
+                        price=str(price),
+                        type=OrderType.LIMIT,
+                        side=order_side,
+                        post_only=True
+                    ))
+                else:
+                    result = await self.client.create_limit_order(
+                        contract_id=contract_id,
+                        size=size,
+                        price=str(price),
+                        side=order_side
+                    )
 
             order_id = result.get('data', {}).get('orderId')
+            self.metrics.order_ack.observe(time.perf_counter() - ack_start)
+            command_timing.record("ack", time.perf_counter() - ack_start)
             self.logger.info(f"✅ 订单已提交: {order_id}")
 
             # ✅ 成功后重置失败计数
@@ -199,9 +567,12 @@ class EdgeXTradingService:
         except Exception as e:
             api_error = str(e)
             self.logger.warning(f"⚠️ API 返回异常: {api_error}")
+            if ack_start is not None:
+                command_timing.record("ack", time.perf_counter() - ack_start)
 
             # ✅ 检测是否为 Cloudflare 429 限流错误
             if "429" in api_error or "rate limit" in api_error.lower():
+                self.metrics.rate_limited.inc()
                 self.rate_limit_failures += 1
                 backoff = self.get_backoff_delay()
                 self.logger.error(f"🚫 Cloudflare 限流！连续失败 {self.rate_limit_failures} 次，退避 {backoff}s")
@@ -215,132 +586,511 @@ class EdgeXTradingService:
             # ⚠️ 即使没有 order_id，也尝试查询最近的成交记录
             # 不再抛出异常，让后续逻辑处理
 
-        # 市价单：等待5秒后查询成交记录（简化逻辑，避免频繁请求）
-        if order_type == "MARKET":
-            self.logger.info(f"⏳ 等待 5 秒后查询成交...")
+        return {
+            "contract_id": contract_id,
+            "order_type": order_type,
+            "order_id": order_id,
+            "result": result,
+            "api_error": api_error,
+            "submit_time": submit_time
+        }
 
-            # ✅ 固定等待 5 秒（给订单足够时间成交）
-            await asyncio.sleep(5)
+    async def _query_fills(self, order_ids: list, contract_id: str, submit_time: int):
+        """查询成交记录（只查询一次）
 
-            # ✅ 限速：防止 Cloudflare 429
-            await self._rate_limit()
+        有订单ID时按订单ID列表查询（可一次查询多个订单），否则按提交时间范围查询
+        """
+        from edgex_sdk import OrderFillTransactionParams
 
-            from edgex_sdk import OrderFillTransactionParams
+        # ✅ 限速：防止 Cloudflare 429
+        await self._rate_limit()
 
-            # ✅ 查询成交记录（只查询一次）
+        if order_ids:
+            # 有订单ID，使用订单ID查询（更精确）
+            fill_params = OrderFillTransactionParams(
+                size=str(max(20, 20 * len(order_ids))),
+                filter_order_id_list=order_ids
+            )
+            self.logger.info(f"🔍 查询订单 {', '.join(str(o) for o in order_ids)} 的成交...")
+        else:
+            # ⚠️ 无订单ID（API报错情况），使用时间范围查询
+            time_start = submit_time - 5000  # 提交前5秒
+            time_end = int(time.time() * 1000)  # 当前时间
+            fill_params = OrderFillTransactionParams(
+                size="20",
+                filter_contract_id_list=[contract_id],
+                filter_start_created_time_inclusive=time_start,
+                filter_end_created_time_exclusive=time_end
+            )
+            self.logger.info(f"🔍 时间范围查询: {time_start} ~ {time_end}")
+
+        fill_result = await self.client.get_order_fill_transactions(fill_params)
+        fill_list = []
+
+        if fill_result.get("code") == "SUCCESS":
+            fill_list = fill_result.get("data", {}).get("dataList", [])
+            if fill_list:
+                self.logger.info(f"✅ 查询到成交记录")
+            else:
+                self.logger.warning(f"⚠️ 未找到成交记录")
+        else:
+            # ⚠️ 查询失败（如429），只记录警告，不影响运行
+            error_msg = fill_result.get('msg', '未知错误')
+            if "429" in str(error_msg):
+                self.metrics.rate_limited.inc()
+            self.logger.warning(f"⚠️ 查询成交记录失败: {error_msg}，不影响运行")
+
+        return fill_list
+
+    def _observe_fill_confirm(self, result: dict, submit_time: int):
+        """记录下单到确认成交的耗时（只统计查到成交记录的订单）"""
+        fill = result.get("fill") if isinstance(result, dict) else None
+        if fill and fill.get("filled") and not fill.get("reason"):
+            self.metrics.fill_confirm.observe((time.time() * 1000 - submit_time) / 1000)
+
+    def _apply_fills(self, order: dict, fill_list: list):
+        """从成交记录中汇总属于该订单的成交，写入 result['fill']"""
+        order_id = order["order_id"]
+        api_error = order["api_error"]
+        result = order["result"]
+
+        if fill_list:
+            self.logger.info(f"📋 API返回 {len(fill_list)} 条成交记录")
+
+            # ✅ 过滤：只累加当前订单的成交记录（防止累加其他订单）
             if order_id:
-                # 有订单ID，使用订单ID查询（更精确）
-                fill_params = OrderFillTransactionParams(
-                    size="20",
-                    filter_order_id_list=[order_id]
-                )
-                self.logger.info(f"🔍 查询订单 {order_id} 的成交...")
+                # 有订单ID，过滤出匹配的成交记录
+                current_order_fills = [f for f in fill_list if str(f.get('orderId')) == str(order_id)]
+                self.logger.info(f"🔍 过滤后属于订单 {order_id} 的成交: {len(current_order_fills)} 条")
             else:
-                # ⚠️ 无订单ID（API报错情况），使用时间范围查询
-                time_start = submit_time - 5000  # 提交前5秒
-                time_end = int(time.time() * 1000)  # 当前时间
-                fill_params = OrderFillTransactionParams(
-                    size="20",
-                    filter_contract_id_list=[contract_id],
-                    filter_start_created_time_inclusive=time_start,
-                    filter_end_created_time_exclusive=time_end
-                )
-                self.logger.info(f"🔍 时间范围查询: {time_start} ~ {time_end}")
+                # ⚠️ 无订单ID（时间范围查询），取最新的成交记录（按时间倒序，取第一组相同orderId的）
+                # 按创建时间排序（最新的在前）
+                sorted_fills = sorted(fill_list, key=lambda x: x.get('createdTime', 0), reverse=True)
+                if sorted_fills:
+                    latest_order_id = sorted_fills[0].get('orderId')
+                    current_order_fills = [f for f in sorted_fills if f.get('orderId') == latest_order_id]
+                    self.logger.info(f"🔍 时间范围查询，取最新订单 {latest_order_id} 的成交: {len(current_order_fills)} 条")
+                else:
+                    current_order_fills = []
 
-            fill_result = await self.client.get_order_fill_transactions(fill_params)
-            fill_list = []
+            if not current_order_fills:
+                self.logger.error(f"❌ 过滤后无匹配的成交记录")
+                result['fill'] = {'filled': False, 'reason': 'no_matching_fills'}
+                if api_error:
+                    raise Exception(f"订单失败: {api_error}")
+                return
 
-            if fill_result.get("code") == "SUCCESS":
-                fill_list = fill_result.get("data", {}).get("dataList", [])
-                if fill_list:
-                    self.logger.info(f"✅ 查询到成交记录")
-                else:
-                    self.logger.warning(f"⚠️ 未找到成交记录")
+            # 累加所有成交记录（处理拆分成交）
+            total_size = 0.0
+            total_value = 0.0
+            total_fee = 0.0
+            total_pnl = 0.0
+            avg_price = 0.0
+            direction = current_order_fills[0].get('direction')
+
+            for fill in current_order_fills:
+                total_size += float(fill.get('fillSize', 0))
+                total_value += float(fill.get('fillValue', 0))
+                total_fee += float(fill.get('fillFee', 0))
+                total_pnl += float(fill.get('realizePnl', 0))
+
+            # 加权平均价格 = 总金额 / 总数量
+            if total_size > 0:
+                avg_price = total_value / total_size
+
+            self.logger.info(f"✅ 订单已成交! (拆分{len(current_order_fills)}笔)")
+            self.logger.info(f"   成交价格: ${avg_price:.2f} (加权平均)")
+            self.logger.info(f"   成交数量: {total_size}")
+            self.logger.info(f"   成交金额: ${total_value:.2f}")
+            self.logger.info(f"   手续费: ${total_fee:.6f} ({direction})")
+            self.logger.info(f"   已实现盈亏: ${total_pnl:.6f}")
+
+            # ✅ 关键修复：查询到成交记录，说明订单成功，即使之前 API 报错
+            if api_error:
+                self.logger.info(f"✅ 虽然 API 报错，但订单已成交，返回成功")
+
+            # 返回包含成交信息的结果
+            result['fill'] = {
+                'filled': True,
+                'fillPrice': str(avg_price),
+                'fillSize': str(total_size),
+                'fillValue': str(total_value),
+                'fillFee': str(total_fee),
+                'direction': direction,
+                'realizePnl': str(total_pnl),
+                'fillId': current_order_fills[0].get('id')
+            }
+        else:
+            # ⚠️ 未找到成交记录
+            if order_id:
+                # 有 order_id，说明下单成功，即使查不到成交也返回成功
+                self.logger.warning(f"⚠️ 订单未找到成交记录，但订单已提交 {order_id}，假定成功")
+                result['fill'] = {'filled': True, 'reason': 'order_submitted', 'fillPrice': '0'}
             else:
-                # ⚠️ 查询失败（如429），只记录警告，不影响运行
-                error_msg = fill_result.get('msg', '未知错误')
-                self.logger.warning(f"⚠️ 查询成交记录失败: {error_msg}，不影响运行")
+                # 没有 order_id 且查不到成交，真的失败了
+                self.logger.error(f"❌ 下单失败且无成交记录")
+                if api_error:
+                    raise Exception(f"订单失败: {api_error}")
+                result['fill'] = {'filled': False, 'reason': 'no_order_id_no_fill'}
+
+    def _maker_price(self, side: str, offset_ticks: int, tick_size: float):
+        """计算 post-only 报价：在己方最优价基础上向内让 offset_ticks 档，但不越过对手价"""
+        bid, ask = self.best_bid, self.best_ask
+        if bid <= 0 or ask <= 0:
+            return None
+
+        if side == "BUY":
+            price = min(bid + offset_ticks * tick_size, ask - tick_size)
+            price = math.floor(price / tick_size + 1e-9) * tick_size
+        else:
+            price = max(ask - offset_ticks * tick_size, bid + tick_size)
+            price = math.ceil(price / tick_size - 1e-9) * tick_size
+
+        return round(price, 10)
+
+    async def _maker_filled(self, order_ids: list, contract_id: str):
+        """查询 maker 订单链的累计成交（数量、金额、手续费）"""
+        size = value = fee = 0.0
+        fill_list = await self._query_fills(order_ids, contract_id, 0)
+        wanted = {str(o) for o in order_ids}
+        for fill in fill_list:
+            if str(fill.get('orderId')) in wanted:
+                size += float(fill.get('fillSize', 0))
+                value += float(fill.get('fillValue', 0))
+                fee += float(fill.get('fillFee', 0))
+        return size, value, fee
+
+    async def execute_maker(self, params: dict):
+        """Maker 执行：挂 post-only 限价单并随盘口变化改价，截止时间后撤单并用市价单吃掉剩余数量
+
+        EdgeX 没有私有成交推送，剩余数量在每次改价前通过 REST 成交记录确认；
+        改价（撤单+新单）和查询都占用限速器时间槽，实际改价频率受 min_request_interval 约束
+
+        可选参数: deadline_ms（默认 15000）、max_reprices（改价次数预算，默认 5）、
+        min_reprice_interval_ms（默认 0）、offset_ticks（默认 0）、tick_size（默认 0.1）、
+        min_size（默认 0.001）、taker_fallback（默认 true）
+        """
+        contract_id = params.get("contract_id", self.contract_id)
+        side = params.get("side", "BUY").upper()
+        size = float(params.get("size", "0.001"))
+        deadline = time.monotonic() + float(params.get("deadline_ms", 15000)) / 1000
+        max_reprices = int(params.get("max_reprices", 5))
+        min_reprice_interval = float(params.get("min_reprice_interval_ms", 0)) / 1000
+        offset_ticks = int(params.get("offset_ticks", 0))
+        tick_size = float(params.get("tick_size", 0.1))
+        min_size = float(params.get("min_size", 0.001))
+        taker_fallback = params.get("taker_fallback", True)
+
+        price = self._maker_price(side, offset_ticks, tick_size)
+        if price is None:
+            raise ValueError("盘口数据未就绪，无法 maker 报价")
+
+        self.logger.info(f"🎯 Maker 执行: {side} {size} {contract_id} @ {price} (截止 {params.get('deadline_ms', 15000)}ms, 改价预算 {max_reprices})")
+
+        order_params = {"contract_id": contract_id, "side": side, "size": str(size), "type": "LIMIT", "price": str(price), "post_only": True}
+        placed = await self._submit_order(order_params)
+        if not placed["order_id"]:
+            raise Exception(f"Maker 挂单失败: {placed['api_error']}")
+
+        order_ids = [placed["order_id"]]
+        logical_id = str(placed["order_id"])
+        reprices = 0
+        last_reprice = time.monotonic()
+        maker_size = 0.0
+
+        while size - maker_size >= min_size:
+            remaining_time = deadline - time.monotonic()
+            if remaining_time <= 0:
+                break
+
+            # 等待盘口变化（或截止）
+            event = self.book_event
+            try:
+                await asyncio.wait_for(event.wait(), timeout=remaining_time)
+            except asyncio.TimeoutError:
+                break
+
+            new_price = self._maker_price(side, offset_ticks, tick_size)
+            if new_price is None or new_price == price or reprices >= max_reprices:
+                continue
+
+            # 改价节流：距上次改价不足 min_reprice_interval 时等待
+            wait_time = last_reprice + min_reprice_interval - time.monotonic()
+            if wait_time > 0:
+                await asyncio.sleep(min(wait_time, max(0.0, deadline - time.monotonic())))
+
+            # 改价前确认已成交数量
+            maker_size, _, _ = await self._maker_filled(order_ids, contract_id)
+            remaining = size - maker_size
+            new_price = self._maker_price(side, offset_ticks, tick_size)
+            if remaining < min_size or time.monotonic() >= deadline:
+                break
+            if new_price is None or new_price == price:
+                continue
+
+            try:
+                replaced = await self.replace_order(dict(
+                    order_params, order_id=order_ids[-1], logical_id=logical_id,
+                    size=str(round(remaining, 8)), price=str(new_price)
+                ))
+            except Exception as e:
+                self.logger.warning(f"⚠️ Maker 改价失败: {e}")
+                reprices += 1
+                last_reprice = time.monotonic()
+                continue
+
+            reprices += 1
+            last_reprice = time.monotonic()
+            price = new_price
+            order_ids.append(replaced["order_id"])
+
+        # 截止：撤掉仍在簿上的订单；撤单失败时确认订单已不在活跃订单中，才允许市价吃单，避免同一数量成交两次
+        closed = True
+        if size - maker_size >= min_size:
+            try:
+                await self._rate_limit()
+                result = await self.cancel_order({"order_id": order_ids[-1]})
+                if isinstance(result, dict) and result.get("code") not in (None, "SUCCESS"):
+                    raise Exception(result.get("msg", str(result)))
+            except Exception as e:
+                self.logger.warning(f"⚠️ Maker 撤单失败（可能已成交）: {e}")
+                closed = not await self._order_still_active(order_ids[-1])
+
+        # 以 REST 成交记录为准核对 maker 成交
+        maker_size, maker_value, maker_fee = await self._maker_filled(order_ids, contract_id)
+
+        taker_size = taker_value = taker_fee = 0.0
+        remaining = size - maker_size
+        if remaining >= min_size and not closed:
+            self.logger.error(f"❌ Maker 订单 {order_ids[-1]} 撤单未确认，跳过市价吃单")
+            raise Exception(
+                f"Maker 订单 {order_ids[-1]} 撤单未确认（可能仍在簿上），已跳过市价吃单；"
+                f"maker 已成交 {maker_size}，剩余 {remaining:.6f}"
+            )
+        self._forget_order(order_ids[-1])  # maker 订单已撤销或已成交，改单链结束
+        if remaining >= min_size and taker_fallback:
+            self.logger.info(f"⏰ Maker 截止，剩余 {remaining:.6f} 市价吃单")
+            taker = await self.create_order({"contract_id": contract_id, "side": side, "size": str(round(remaining, 8)), "type": "MARKET"})
+            fill = taker.get('fill', {})
+            if fill.get('filled') and float(fill.get('fillSize', 0) or 0) > 0:
+                taker_size = float(fill['fillSize'])
+                taker_value = float(fill.get('fillValue', taker_size * float(fill['fillPrice'])))
+                taker_fee = float(fill.get('fillFee', 0))
+
+        total_size = maker_size + taker_size
+        fees_saved = maker_value * float(params.get("taker_fee_rate", self.TAKER_FEE_RATE)) - maker_fee
+        self.logger.info(f"✅ Maker 执行完成: maker {maker_size} / taker {taker_size}，改价 {reprices} 次，节省手续费 ${fees_saved:.6f}")
 
-            if fill_list:
-                self.logger.info(f"📋 API返回 {len(fill_list)} 条成交记录")
+        return {
+            "execution": "maker",
+            "logical_id": logical_id,
+            "order_ids": order_ids,
+            "reprices": reprices,
+            "maker_size": str(maker_size),
+            "maker_avg_price": str(maker_value / maker_size if maker_size > 0 else 0),
+            "maker_fee": str(maker_fee),
+            "taker_size": str(taker_size),
+            "taker_avg_price": str(taker_value / taker_size if taker_size > 0 else 0),
+            "taker_fee": str(taker_fee),
+            "fees_saved": str(fees_saved),
+            "fill": {
+                "filled": total_size > 0,
+                "fillPrice": str((maker_value + taker_value) / total_size if total_size > 0 else 0),
+                "fillSize": str(total_size),
+                "fillValue": str(maker_value + taker_value),
+                "fillFee": str(maker_fee + taker_fee),
+                "direction": "MAKER" if taker_size == 0 else "MIXED"
+            }
+        }
 
-                # ✅ 过滤：只累加当前订单的成交记录（防止累加其他订单）
-                if order_id:
-                    # 有订单ID，过滤出匹配的成交记录
-                    current_order_fills = [f for f in fill_list if str(f.get('orderId')) == str(order_id)]
-                    self.logger.info(f"🔍 过滤后属于订单 {order_id} 的成交: {len(current_order_fills)} 条")
-                else:
-                    # ⚠️ 无订单ID（时间范围查询），取最新的成交记录（按时间倒序，取第一组相同orderId的）
-                    # 按创建时间排序（最新的在前）
-                    sorted_fills = sorted(fill_list, key=lambda x: x.get('createdTime', 0), reverse=True)
-                    if sorted_fills:
-                        latest_order_id = sorted_fills[0].get('orderId')
-                        current_order_fills = [f for f in sorted_fills if f.get('orderId') == latest_order_id]
-                        self.logger.info(f"🔍 时间范围查询，取最新订单 {latest_order_id} 的成交: {len(current_order_fills)} 条")
-                    else:
-                        current_order_fills = []
-
-                if not current_order_fills:
-                    self.logger.error(f"❌ 过滤后无匹配的成交记录")
-                    result['fill'] = {'filled': False, 'reason': 'no_matching_fills'}
-                    if api_error:
-                        raise Exception(f"订单失败: {api_error}")
-                    return result
-
-                # 累加所有成交记录（处理拆分成交）
-                total_size = 0.0
-                total_value = 0.0
-                total_fee = 0.0
-                total_pnl = 0.0
-                avg_price = 0.0
-                direction = current_order_fills[0].get('direction')
-
-                for fill in current_order_fills:
-                    total_size += float(fill.get('fillSize', 0))
-                    total_value += float(fill.get('fillValue', 0))
-                    total_fee += float(fill.get('fillFee', 0))
-                    total_pnl += float(fill.get('realizePnl', 0))
-
-                # 加权平均价格 = 总金额 / 总数量
-                if total_size > 0:
-                    avg_price = total_value / total_size
-
-                self.logger.info(f"✅ 订单已成交! (拆分{len(current_order_fills)}笔)")
-                self.logger.info(f"   成交价格: ${avg_price:.2f} (加权平均)")
-                self.logger.info(f"   成交数量: {total_size}")
-                self.logger.info(f"   成交金额: ${total_value:.2f}")
-                self.logger.info(f"   手续费: ${total_fee:.6f} ({direction})")
-                self.logger.info(f"   已实现盈亏: ${total_pnl:.6f}")
-
-                # ✅ 关键修复：查询到成交记录，说明订单成功，即使之前 API 报错
-                if api_error:
-                    self.logger.info(f"✅ 虽然 API 报错，但订单已成交，返回成功")
-
-                # 返回包含成交信息的结果
-                result['fill'] = {
-                    'filled': True,
-                    'fillPrice': str(avg_price),
-                    'fillSize': str(total_size),
-                    'fillValue': str(total_value),
-                    'fillFee': str(total_fee),
-                    'direction': direction,
-                    'realizePnl': str(total_pnl),
-                    'fillId': fill_list[0].get('id')
-                }
+    async def execute_sliced(self, params: dict):
+        """分片执行（TWAP/冰山）：子单数量按对手盘可见深度决定，按固定间隔逐笔市价成交
+
+        每个子单成交后推送 execution_progress 事件（累计成交量、均价、剩余数量）
+
+        可选参数: interval_ms（子单间隔，默认 1000）、participation（子单占可见深度比例，默认 0.5）、
+        max_slippage_bps（计入可见深度的价格范围，默认 5）、max_child_size、min_size（默认 0.001）、
+        size_step（默认 0.001）、max_slices（默认 50）、max_empty_books（默认 5）、execution_id
+
+        对手盘没有可见深度（空盘口或尚未收到订单簿）时不下单，等下一个间隔；
+        连续 max_empty_books 次都没有深度则以 status="no_depth" 结束。
+        已提交但查不到成交的子单记为 unconfirmed：不算作已成交（remaining 不扣减），也不再重复下单
+        """
+        contract_id = params.get("contract_id", self.contract_id)
+        side = params.get("side", "BUY").upper()
+        size = float(params.get("size", "0.001"))
+        interval = float(params.get("interval_ms", 1000)) / 1000
+        participation = float(params.get("participation", 0.5))
+        max_slippage_bps = float(params.get("max_slippage_bps", 5))
+        max_child_size = float(params.get("max_child_size", 0) or 0) or float("inf")
+        min_size = float(params.get("min_size", 0.001))
+        size_step = float(params.get("size_step", 0.001))
+        max_slices = int(params.get("max_slices", 50))
+        max_empty_books = int(params.get("max_empty_books", 5))
+        execution_id = params.get("execution_id") or f"slice-{int(time.time() * 1000)}"
+
+        # 买单吃卖盘，卖单吃买盘
+        book_side = "asks" if side == "BUY" else "bids"
+
+        self.logger.info(f"🧩 分片执行 {execution_id}: {side} {size} {contract_id} (间隔 {interval}s, 深度占比 {participation})")
+
+        filled = 0.0
+        priced_size = 0.0  # 有成交价的数量（用于计算均价）
+        value = 0.0
+        fee = 0.0
+        unconfirmed = 0.0  # 已提交但未确认成交的数量
+        slices = 0
+        empty_books = 0
+        status = "done"
+        error = None
+        next_time = time.monotonic()
+
+        while size - filled - unconfirmed >= min_size and slices < max_slices:
+            wait_time = next_time - time.monotonic()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+            next_time = time.monotonic() + interval
+
+            remaining = size - filled - unconfirmed
+            depth = visible_depth((self.orderbook or {}).get(book_side, []), max_slippage_bps)
+            if depth <= 0:
+                empty_books += 1
+                if empty_books >= max_empty_books:
+                    self.logger.error(f"❌ 分片执行 {execution_id}: 连续 {empty_books} 次对手盘无可见深度，停止")
+                    status = "no_depth"
+                    error = f"连续 {empty_books} 次对手盘无可见深度"
+                    break
+                self.logger.warning(f"⚠️ 分片执行 {execution_id}: 对手盘无可见深度，等待下一个间隔")
+                continue
+            empty_books = 0
+            child = depth * participation
+            child = math.floor(min(child, remaining, max_child_size) / size_step + 1e-9) * size_step
+            child = round(min(max(child, min_size), remaining), 8)
+
+            try:
+                child_result = await self.create_order({"contract_id": contract_id, "side": side, "size": str(child), "type": "MARKET"})
+            except Exception as e:
+                self.logger.error(f"❌ 分片 {slices + 1} 下单失败: {e}")
+                status = "aborted"
+                error = str(e)
+                break
+
+            slices += 1
+            fill = child_result.get('fill', {})
+            child_filled = float(fill.get('fillSize', 0) or 0)
+            if child_filled > 0:
+                filled += child_filled
+                priced_size += child_filled
+                value += float(fill.get('fillValue', child_filled * float(fill.get('fillPrice', 0))))
+                fee += float(fill.get('fillFee', 0))
+            elif fill.get('filled'):
+                # 订单已提交但未查到成交记录：记为未确认，不算作已成交，也不再为这部分数量下单
+                unconfirmed += child
+                self.logger.warning(f"⚠️ 分片 {slices} 已提交但未确认成交: {child}")
             else:
-                # ⚠️ 未找到成交记录
-                if order_id:
-                    # 有 order_id，说明下单成功，即使查不到成交也返回成功
-                    self.logger.warning(f"⚠️ 订单未找到成交记录，但订单已提交 {order_id}，假定成功")
-                    result['fill'] = {'filled': True, 'reason': 'order_submitted', 'fillPrice': '0'}
-                else:
-                    # 没有 order_id 且查不到成交，真的失败了
-                    self.logger.error(f"❌ 下单失败且无成交记录")
-                    if api_error:
-                        raise Exception(f"订单失败: {api_error}")
-                    result['fill'] = {'filled': False, 'reason': 'no_order_id_no_fill'}
+                self.logger.error(f"❌ 分片 {slices} 未成交: {fill.get('reason')}")
+                status = "aborted"
+                error = fill.get('reason', 'not_filled')
+                break
+
+            self.output("execution_progress", {
+                "execution_id": execution_id,
+                "execution": "sliced",
+                "contract_id": contract_id,
+                "side": side,
+                "slice": slices,
+                "child_size": child,
+                "visible_depth": depth,
+                "filled": filled,
+                "unconfirmed": unconfirmed,
+                "remaining": max(size - filled, 0.0),
+                "avg_price": value / priced_size if priced_size > 0 else 0,
+                "status": "running"
+            })
 
-        return result
+        if status == "done" and size - filled >= min_size:
+            status = "unconfirmed" if unconfirmed > 0 and size - filled - unconfirmed < min_size else "incomplete"
+
+        avg_price = value / priced_size if priced_size > 0 else 0
+        self.output("execution_progress", {
+            "execution_id": execution_id,
+            "execution": "sliced",
+            "contract_id": contract_id,
+            "side": side,
+            "slice": slices,
+            "filled": filled,
+            "unconfirmed": unconfirmed,
+            "remaining": max(size - filled, 0.0),
+            "avg_price": avg_price,
+            "status": status,
+            "error": error
+        })
+        self.logger.info(f"✅ 分片执行 {execution_id} 结束: {status}，{slices} 笔共成交 {filled} @ ${avg_price:.2f}")
+
+        return {
+            "execution": "sliced",
+            "execution_id": execution_id,
+            "status": status,
+            "error": error,
+            "slices": slices,
+            "unconfirmed": str(unconfirmed),
+            "fill": {
+                "filled": filled > 0,
+                "fillPrice": str(avg_price),
+                "fillSize": str(filled),
+                "fillFee": str(fee)
+            }
+        }
+
+    async def create_orders(self, params: dict):
+        """批量创建订单
+
+        EdgeX 没有批量下单端点：所有订单按限速器时间槽流水线并发提交，
+        市价单的成交记录在统一等待后用一次订单ID列表查询取回
+        """
+        items = params.get("orders") or []
+        if not items:
+            raise ValueError("orders 不能为空")
+
+        self.logger.info(f"📦 批量创建订单: {len(items)} 笔")
+
+        outcomes = await asyncio.gather(*[self._submit_order(item) for item in items], return_exceptions=True)
+
+        # 市价单统一等待后一次性查询成交
+        market_orders = [o for o in outcomes if isinstance(o, dict) and o["order_type"] == "MARKET"]
+        fill_list = []
+        if market_orders:
+            self.logger.info(f"⏳ 等待 5 秒后查询成交...")
+            fill_wait_start = time.perf_counter()
+            await asyncio.sleep(5)
+
+            order_ids = [o["order_id"] for o in market_orders if o["order_id"]]
+            if order_ids:
+                try:
+                    fill_list = await self._query_fills(order_ids, market_orders[0]["contract_id"], market_orders[0]["submit_time"])
+                except Exception as e:
+                    self.logger.warning(f"⚠️ 批量查询成交记录失败: {e}，不影响运行")
+            command_timing.record("fill_wait", time.perf_counter() - fill_wait_start)
+
+        results = []
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, Exception):
+                results.append({"index": index, "success": False, "error": str(outcome)})
+                continue
+            try:
+                if outcome["order_type"] == "MARKET":
+                    if not outcome["order_id"]:
+                        # 批量模式下无订单ID无法可靠归属成交记录，直接判定失败
+                        raise Exception(f"订单失败: {outcome['api_error'] or 'no_order_id'}")
+                    self._apply_fills(outcome, fill_list)
+                    self._observe_fill_confirm(outcome["result"], outcome["submit_time"])
+                elif outcome["api_error"]:
+                    raise Exception(f"订单失败: {outcome['api_error']}")
+                results.append({"index": index, "success": True, "data": outcome["result"]})
+            except Exception as e:
+                results.append({"index": index, "success": False, "error": str(e)})
+
+        return self._batch_summary(results)
 
     async def cancel_order(self, params: dict):
         """撤销订单"""
@@ -349,11 +1099,139 @@ class EdgeXTradingService:
         self.logger.info(f"🗑️ 撤销订单: {order_id}")
 
         cancel_params = CancelOrderParams(order_id=order_id)
-        result = await self.client.cancel_order(cancel_params)
+        with command_timing.measure("ack"):
+            result = await self.client.cancel_order(cancel_params)
 
         self.logger.info(f"✅ 订单撤销成功")
         return result
 
+    async def cancel_orders(self, params: dict):
+        """批量撤单：按限速器时间槽流水线并发撤销，返回逐单状态"""
+        order_ids = params.get("order_ids") or []
+        if not order_ids:
+            raise ValueError("order_ids 不能为空")
+
+        self.logger.info(f"🗑️ 批量撤单: {len(order_ids)} 笔")
+
+        async def cancel_one(order_id):
+            await self._rate_limit()
+            return await self.cancel_order({"order_id": order_id})
+
+        outcomes = await asyncio.gather(*[cancel_one(order_id) for order_id in order_ids], return_exceptions=True)
+
+        results = []
+        for index, (order_id, outcome) in enumerate(zip(order_ids, outcomes)):
+            if isinstance(outcome, Exception):
+                results.append({"index": index, "order_id": order_id, "success": False, "error": str(outcome)})
+            elif isinstance(outcome, dict) and outcome.get("code") not in (None, "SUCCESS"):
+                results.append({"index": index, "order_id": order_id, "success": False, "error": outcome.get("msg", str(outcome))})
+            else:
+                results.append({"index": index, "order_id": order_id, "success": True, "data": outcome})
+
+        return self._batch_summary(results)
+
+    def _batch_summary(self, results: list):
+        """汇总批量命令的逐单结果"""
+        succeeded = sum(1 for r in results if r["success"])
+        self.logger.info(f"📦 批量结果: 成功 {succeeded} / 失败 {len(results) - succeeded}")
+        return {
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded
+        }
+
+    async def replace_order(self, params: dict):
+        """改单（限价单重新报价）
+
+        EdgeX 没有原生改单端点：撤单与新单并发流水线提交（各占一个限速时间槽），
+        新旧订单作为同一个逻辑订单跟踪；旧订单撤销失败时撤掉新订单并返回失败，不会同时挂着新旧两单。
+        side 和 size 必须提供（不沿用下单默认值）
+        """
+        order_id = params.get("order_id")
+        if not order_id:
+            raise ValueError("改单必须提供 order_id")
+        if not params.get("side") or not params.get("size"):
+            raise ValueError("改单必须提供 side 和 size")
+        if not params.get("price"):
+            raise ValueError("限价单必须提供价格")
+
+        self.logger.info(f"🔁 改单: {order_id} → {params['side']} {params['size']} @ {params.get('price')}")
+
+        async def cancel_old():
+            await self._rate_limit()
+            return await self.cancel_order({"order_id": order_id})
+
+        new_params = dict(params, type="LIMIT")
+        cancel_outcome, submit_outcome = await asyncio.gather(
+            cancel_old(), self._submit_order(new_params), return_exceptions=True
+        )
+
+        cancel_error = None
+        if isinstance(cancel_outcome, Exception):
+            cancel_error = str(cancel_outcome)
+        elif isinstance(cancel_outcome, dict) and cancel_outcome.get("code") not in (None, "SUCCESS"):
+            cancel_error = cancel_outcome.get("msg", str(cancel_outcome))
+
+        if isinstance(submit_outcome, Exception) or submit_outcome["api_error"] or not submit_outcome["order_id"]:
+            error = submit_outcome if isinstance(submit_outcome, Exception) else submit_outcome["api_error"] or "no_order_id"
+            if cancel_error:
+                # 旧订单仍在簿上（或已成交），保留改单链
+                raise Exception(f"改单失败，新订单提交失败: {error}；旧订单 {order_id} 撤销也失败: {cancel_error}")
+            self._forget_order(order_id)
+            raise Exception(f"改单失败，旧订单已撤销但新订单提交失败: {error}")
+
+        new_order_id = submit_outcome["order_id"]
+        if cancel_error:
+            # 旧订单可能仍在簿上：撤掉刚提交的新订单，避免双倍挂单
+            self.logger.warning(f"⚠️ 旧订单 {order_id} 撤销失败: {cancel_error}，撤销新订单 {new_order_id}")
+            try:
+                await self._rate_limit()
+                result = await self.cancel_order({"order_id": new_order_id})
+                if isinstance(result, dict) and result.get("code") not in (None, "SUCCESS"):
+                    raise Exception(result.get("msg", str(result)))
+            except Exception as e:
+                raise Exception(f"改单失败：旧订单 {order_id} 撤销失败（{cancel_error}），新订单 {new_order_id} 撤销也失败: {e}")
+            raise Exception(f"改单失败：旧订单 {order_id} 撤销失败，已撤销新订单 {new_order_id}: {cancel_error}")
+
+        logical_id, revision = self._track_replacement(params, order_id, new_order_id)
+        self.logger.info(f"✅ 改单完成: {order_id} → {new_order_id} (逻辑订单 {logical_id} 第 {revision} 次改单)")
+
+        return {
+            "logical_id": logical_id,
+            "order_id": new_order_id,
+            "replaced_order_id": order_id,
+            "revision": revision,
+            "method": "cancel_replace",
+            "cancel_error": cancel_error,
+            "data": submit_outcome["result"]
+        }
+
+    def _forget_order(self, order_id):
+        """订单进入终态（已撤销/已全部成交）后清理改单链"""
+        logical_id = self.order_logical_ids.pop(str(order_id), None)
+        if logical_id is not None and self.logical_orders.get(logical_id, {}).get("order_id") == str(order_id):
+            del self.logical_orders[logical_id]
+
+    def _track_replacement(self, params: dict, old_order_id, new_order_id):
+        """记录改单链：多次改单的订单对外始终对应同一个逻辑订单ID"""
+        old_key = str(old_order_id)
+        new_key = str(new_order_id)
+        logical_id = params.get("logical_id") or self.order_logical_ids.get(old_key) or old_key
+
+        entry = self.logical_orders.setdefault(logical_id, {"original_order_id": old_key, "order_id": old_key, "revisions": 0})
+        entry["revisions"] += 1
+        if new_key != old_key:
+            self.order_logical_ids.pop(old_key, None)
+        entry["order_id"] = new_key
+        self.order_logical_ids[new_key] = logical_id
+
+        # 没有收到终态的逻辑订单（如未经本服务确认的成交）按最早记录淘汰，防止无限增长
+        while len(self.logical_orders) > self.MAX_LOGICAL_ORDERS:
+            stale_id = next(iter(self.logical_orders))
+            self.order_logical_ids.pop(self.logical_orders.pop(stale_id)["order_id"], None)
+
+        return logical_id, entry["revisions"]
+
     async def get_active_orders(self, params: dict):
         """获取活跃订单"""
         from edgex_sdk import GetActiveOrderParams
@@ -365,6 +1243,17 @@ class EdgeXTradingService:
         result = await self.client.get_active_orders(query_params)
         return result
 
+    async def _order_still_active(self, order_id) -> bool:
+        """撤单结果不明时查询活跃订单，确认订单是否仍在簿上（查询失败按仍在簿上处理）"""
+        try:
+            await self._rate_limit()
+            result = await self.get_active_orders({"size": "200"})
+            orders = (result or {}).get("data", {}).get("dataList", [])
+            return any(str(order.get("id")) == str(order_id) for order in orders)
+        except Exception as e:
+            self.logger.warning(f"⚠️ 查询活跃订单失败: {e}")
+            return True
+
     async def get_positions(self, params: dict):
         """获取持仓"""
         result = await self.client.get_account_positions()
@@ -372,7 +1261,7 @@ class EdgeXTradingService:
 
     async def get_position(self, params: dict):
         """获取特定合约的持仓数量（净持仓）"""
-        contract_id = params.get("contract_id", "10000001")  # BTC-USD-PERP
+        contract_id = params.get("contract_id", self.contract_id)
 
         # ✅ 限速：防止 Cloudflare 429
         await self._rate_limit()
@@ -432,9 +1321,26 @@ class EdgeXTradingService:
             "unrealized_pnl": 0
         }
 
+    async def quote_size(self, params: dict):
+        """按本地订单簿计算指定数量的可成交价格（成交均价、最差价、滑点）
+
+        参数: size 或 sizes（默认使用预计算的 quote_sizes）
+        """
+        if not self.orderbook:
+            raise ValueError("订单簿数据未就绪")
+
+        sizes = params.get("sizes") or ([params["size"]] if params.get("size") else None)
+        if not sizes:
+            return self.executable_quotes
+
+        return executable_quotes(self.orderbook, [float(x) for x in sizes])
+
     async def get_price(self, params: dict):
         """获取当前价格"""
-        contract_id = params.get("contract_id", "10000001")  # BTC-USD-PERP (默认我们交易的合约)
+        contract_id = params.get("contract_id", self.contract_id)
+
+        # ✅ 限速：公共行情接口单独限速（REST 行情兜底轮询也经过这里），不占用下单的时间槽
+        await self._public_rate_limit()
 
         # 使用 quote client 获取行情
         result = await self.client.get_quote_summary(contract_id)
@@ -452,91 +1358,363 @@ class EdgeXTradingService:
             "timestamp": data.get("timestamp", 0)
         }
 
-    def handle_ticker(self, message):
-        """处理 Ticker 更新 - 直接推送（订单簿由 REST API 提供）
+    def handle_ticker(self, message, conn_id: int = 0):
+        """Ticker WebSocket 回调 - 只解析并投递到事件循环
 
-        注意：此回调在 WebSocket 的同步线程中执行，不是 asyncio 事件循环
+        注意：此回调在 WebSocket 的同步线程中执行，不是 asyncio 事件循环。
+        消息追加到 ws_inbox（deque 的 append/popleft 线程安全，无需加锁），
+        同一批消息只调度一次 call_soon_threadsafe，由 _drain_ws_inbox 在事件循环中统一处理
         """
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        if self.recorder:
+            # 冗余连接的消息按连接编号分开录制（ticker/1, ticker/2 ...）
+            self.recorder.record(f"ticker/{conn_id}" if conn_id else "ticker", message)
         try:
             # 如果 message 是字符串，先解析成 JSON
             if isinstance(message, str):
-                import json
                 message = json.loads(message)
-
+        except Exception as e:
+            self.logger.error("❌ Ticker解析错误: %s", e, extra={"event": "ticker"})
+            return
+
+        loop = self.loop
+        if loop is None:
+            return
+
+        self.ws_inbox.append((recv_ts, recv_mono_ns, conn_id, message))
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+            loop.call_soon_threadsafe(self._drain_ws_inbox)
+
+    def _drain_ws_inbox(self):
+        """在事件循环中批量处理 WebSocket 线程投递的消息（行情状态的唯一写入方）"""
+        # 先清除调度标记再取消息：之后到达的消息会重新调度，不会遗漏
+        self._drain_scheduled = False
+        inbox = self.ws_inbox
+        dedup = self.ws_dedup
+        messages_in = self.metrics.messages_in
+        while inbox:
+            recv_ts, recv_mono_ns, conn_id, message = inbox.popleft()
+            messages_in.inc("ticker")
+            if dedup is not None and not dedup.accept(conn_id, self._ticker_key(message)):
+                continue
+            self._process_ticker(recv_ts, message, recv_mono_ns)
+
+    def _ticker_key(self, message: dict):
+        """冗余连接去重键：合约ID + 交易所时间戳；没有 endTime 时返回 None（不去重）"""
+        data_list = message.get("content", {}).get("data") or [{}]
+        end_time = data_list[0].get("endTime")
+        if end_time is None:
+            return None
+        return data_list[0].get("contractId"), end_time
+
+    def _process_ticker(self, recv_ts: int, message: dict, recv_mono_ns: int):
+        """处理 Ticker 更新 - 直接推送（订单簿由 REST API 提供），在事件循环中执行"""
+        try:
             # EdgeX WebSocket 数据结构: {"type":"quote-event","content":{"data":[{...}]}}
             content = message.get("content", {})
             data_list = content.get("data", [])
 
             if not data_list:
-                self.logger.debug(f"Ticker 数据为空")
+                self.logger.debug("Ticker 数据为空", extra={"event": "ticker"})
                 return
 
             data = data_list[0]  # 取第一条数据
             contract_id = data.get("contractId")
+            exchange_ts = int(data.get("endTime") or recv_ts)
+            if contract_id != self.contract_id:
+                # 运行时订阅的其他合约：只转发，不计入交易合约的行情新鲜度和盘口状态
+                self._process_extra_ticker(contract_id, data, exchange_ts, recv_ts, recv_mono_ns)
+                return
+            self.feed_monitor.record("ticker", exchange_ts, recv_ts)
+            self.metrics.ws_message_age.observe(self.clock.message_age_ms(exchange_ts, recv_ts) / 1000, "ticker")
 
             # 只输出一次确认消息
             if not hasattr(self, '_ticker_received'):
                 self.logger.info(f"✅ Ticker WebSocket 回调已触发! contract={contract_id}")
                 self._ticker_received = True
 
-            if contract_id == "10000001":  # BTC-USD-PERP (我们交易的合约)
-                # 优先使用 bestBidPrice/bestAskPrice (Snapshot时有)
-                # 如果没有，使用 lastPrice (changed事件时)
-                best_bid = data.get("bestBidPrice")
-                best_ask = data.get("bestAskPrice")
-                last_price = data.get("lastPrice")
-
-                if best_bid and best_ask:
-                    # 有买卖价，计算中间价
-                    mid = (float(best_bid) + float(best_ask)) / 2
-                elif last_price:
-                    # 只有最新价，使用最新价
-                    mid = float(last_price)
-                else:
-                    return
+            # 优先使用 bestBidPrice/bestAskPrice (Snapshot时有)
+            # 如果没有，使用 lastPrice (changed事件时)
+            best_bid = data.get("bestBidPrice")
+            best_ask = data.get("bestAskPrice")
+            last_price = data.get("lastPrice")
+
+            if best_bid and best_ask:
+                # 有买卖价，计算中间价
+                mid = (float(best_bid) + float(best_ask)) / 2
+            elif last_price:
+                # 只有最新价，使用最新价
+                mid = float(last_price)
+            else:
+                return
 
-                # 价格变化时才推送
-                if mid > 0 and mid != self.last_price:
-                    self.last_price = mid
+            # ✅ 来源仲裁：只接受交易所时间戳更新的行情
+            clock = "edgex" if data.get("endTime") else LOCAL_CLOCK
+            if not self.quote_arbiter.offer(contract_id, "ticker", exchange_ts, recv_ts, clock=clock):
+                return
 
-                    # ✅ 直接推送，订单簿由 REST API 轮询提供
-                    self.output("price_update", {
-                        "contract_id": contract_id,
-                        "bid": float(best_bid) if best_bid else mid,
-                        "ask": float(best_ask) if best_ask else mid,
-                        "mid": mid,
-                        "last_price": float(last_price) if last_price else mid,
-                        "orderbook": self.orderbook,  # REST API 提供
-                        "timestamp": data.get("endTime", 0)
-                    })
+            if best_bid and best_ask:
+                self._update_top_of_book(float(best_bid), float(best_ask))
 
-        except Exception as e:
-            self.logger.error(f"❌ Ticker处理错误: {e}", exc_info=True)
+            # 价格变化时才推送
+            if mid > 0 and mid != self.last_price:
+                self.last_price = mid
 
+                # ✅ 直接推送，订单簿由 REST API 轮询提供
+                self.output("price_update", {
+                    "contract_id": contract_id,
+                    "bid": float(best_bid) if best_bid else mid,
+                    "ask": float(best_ask) if best_ask else mid,
+                    "mid": mid,
+                    "last_price": float(last_price) if last_price else mid,
+                    "orderbook": self.orderbook,  # REST API 提供
+                    "quotes": self.executable_quotes,
+                    "timestamp": data.get("endTime", 0),
+                    "source": "ticker",
+                    "exchange_ts": exchange_ts,
+                    "recv_ts": recv_ts,
+                    "recv_mono_ns": recv_mono_ns
+                })
 
-    def init_websocket(self):
-        """初始化 WebSocket 连接 - 仅订阅 Ticker"""
+        except Exception as e:
+            self.logger.error("❌ Ticker处理错误: %s", e, exc_info=True, extra={"event": "ticker"})
+
+    def _process_extra_ticker(self, contract_id: str, data: dict, exchange_ts: int, recv_ts: int, recv_mono_ns: int):
+        """运行时订阅的其他合约的 Ticker：只有最优买卖价，按订阅转发"""
+        if not self.subscriptions.routes(contract_id):
+            return  # 已无人订阅（SDK 不支持退订时交易所仍会推送）
+        best_bid = data.get("bestBidPrice")
+        best_ask = data.get("bestAskPrice")
+        last_price = data.get("lastPrice")
+        if best_bid and best_ask:
+            mid = (float(best_bid) + float(best_ask)) / 2
+        elif last_price:
+            mid = float(last_price)
+        else:
+            return
+        clock = "edgex" if data.get("endTime") else LOCAL_CLOCK
+        if not self.quote_arbiter.offer(contract_id, "ticker", exchange_ts, recv_ts, clock=clock):
+            return
+        self.output("price_update", {
+            "contract_id": contract_id,
+            "bid": float(best_bid) if best_bid else mid,
+            "ask": float(best_ask) if best_ask else mid,
+            "mid": mid,
+            "last_price": float(last_price) if last_price else mid,
+            "timestamp": data.get("endTime", 0),
+            "source": "ticker",
+            "exchange_ts": exchange_ts,
+            "recv_ts": recv_ts,
+            "recv_mono_ns": recv_mono_ns
+        })
+
+    def subscribe_market(self, params: dict) -> dict:
+        """subscribe 命令：为发出命令的消费端订阅合约行情
+
+        params: contract_id（默认交易合约）、profile（bbo / top5 / top / full）、depth（profile=top 时的档数）
+        其他合约只有 Ticker 行情（订单簿只对交易合约轮询），只能订阅 bbo
+        """
+        contract_id = str(params.get("contract_id") or params.get("market") or self.contract_id)
+        primary = contract_id == self.contract_id
+        depth = profile_depth(params.get("profile") or ("full" if primary else "bbo"), params.get("depth"))
+        if not primary and depth != 0:
+            raise ValueError(f"合约 {contract_id} 只有 Ticker 行情，只支持 profile=bbo")
+
+        subscriber = current_client_id()
+        markets = self.subscriptions.subscribers.get(subscriber, {})
+        had, previous = contract_id in markets, markets.get(contract_id)
+        self.subscriptions.subscribe(subscriber, contract_id, depth)
         try:
-            self.logger.info(f"🔗 连接 EdgeX WebSocket: {self.ws_url}")
+            self._sync_ticker_subscriptions(raise_errors=True)
+        except Exception:
+            # 交易所订阅失败：恢复原来的订阅，命令返回失败
+            if had:
+                self.subscriptions.subscribe(subscriber, contract_id, previous)
+            else:
+                self.subscriptions.unsubscribe(subscriber, contract_id)
+            raise
+        return {"contract_id": contract_id, "profile": profile_name(depth), "subscriptions": self.subscriptions.of(subscriber)}
+
+    def unsubscribe_market(self, params: dict) -> dict:
+        """unsubscribe 命令：发出命令的消费端不再接收该合约的 price_update（交易合约在交易所侧保持订阅）"""
+        contract_id = str(params.get("contract_id") or params.get("market") or self.contract_id)
+        subscriber = current_client_id()
+        if not self.subscriptions.unsubscribe(subscriber, contract_id):
+            raise ValueError(f"未订阅合约 {contract_id}")
+        self._sync_ticker_subscriptions()
+        return {"contract_id": contract_id, "subscriptions": self.subscriptions.of(subscriber)}
+
+    def _release_subscriber(self, client_id: int):
+        """broker 客户端断开：释放它的订阅"""
+        if self.subscriptions.remove_subscriber(client_id):
+            self._sync_ticker_subscriptions()
+
+    def _sync_ticker_subscriptions(self, raise_errors: bool = False):
+        """让主连接上额外订阅的 Ticker 与消费端的订阅一致（同步 SDK 调用，在事件循环中执行）
+
+        raise_errors: 订阅失败时抛出（subscribe 命令据此回滚并返回失败），否则只记录日志（重连补订、客户端断开）
+        """
+        if self.ws_manager is None:
+            return  # 连接建立后 _adopt_websocket 按当前订阅补订
+        wanted = self.subscriptions.markets() - {self.contract_id}
+        for contract_id in wanted - self.ticker_contracts:
+            try:
+                self.ws_manager.subscribe_ticker(contract_id, self.handle_ticker)
+                self.ticker_contracts.add(contract_id)
+                self.logger.info(f"✅ 订阅 Ticker: contract={contract_id}")
+            except Exception as e:
+                self.logger.error(f"❌ 订阅 Ticker 失败: contract={contract_id}: {e}")
+                if raise_errors:
+                    raise
+        unsubscribe = getattr(self.ws_manager, "unsubscribe_ticker", None)
+        for contract_id in self.ticker_contracts - wanted:
+            if unsubscribe is None:
+                break  # SDK 不支持退订：保持交易所订阅，消息在 _process_extra_ticker 中丢弃
+            try:
+                unsubscribe(contract_id)
+                self.ticker_contracts.discard(contract_id)
+                self.logger.info(f"✅ 退订 Ticker: contract={contract_id}")
+            except Exception as e:
+                self.logger.warning(f"⚠️ 退订 Ticker 失败: contract={contract_id}: {e}")
 
-            # 创建 WebSocket Manager
-            self.ws_manager = WebSocketManager(
-                base_url=self.ws_url,
-                account_id=self.account_id,
-                stark_pri_key=self.stark_private_key
-            )
+    def init_websocket(self):
+        """初始化 WebSocket 连接 - 仅订阅 Ticker，返回是否成功（在事件循环中同步调用，启动时使用）"""
+        connection = self._connect_websocket()
+        if connection is None:
+            return False
+        self._adopt_websocket(*connection)
+        return True
+
+    def _new_ws_manager(self):
+        return WebSocketManager(
+            base_url=self.ws_url,
+            account_id=self.account_id,
+            stark_pri_key=self.stark_private_key
+        )
 
-            # 连接公开流
-            self.ws_manager.connect_public()
+    def _connect_websocket(self):
+        """建立主连接和冗余连接并订阅交易合约 Ticker，返回 (主连接, [冗余连接])，失败返回 None
+
+        可在线程池中执行：只操作局部变量，不修改服务状态（由 _adopt_websocket 在事件循环中接管）；
+        失败时断开本次建立的半成品连接，避免每次重试泄漏一个 socket 和 SDK 线程
+        """
+        self.logger.info(f"🔗 连接 EdgeX WebSocket: {self.ws_url}")
+        manager = None
+        try:
+            # 创建 WebSocket Manager 并连接公开流
+            manager = self._new_ws_manager()
+            manager.connect_public()
 
             # 订阅 BTC-USD-PERP ticker (contract_id: 10000001) - 我们交易的合约
-            self.ws_manager.subscribe_ticker("10000001", self.handle_ticker)
+            manager.subscribe_ticker(self.contract_id, self.handle_ticker)
 
             self.logger.info("✅ EdgeX WebSocket 订阅成功 (BTC-USD-PERP Ticker)")
             self.logger.info("📊 订单簿将通过 REST API 轮询获取")
-
         except Exception as e:
             self.logger.error(f"❌ WebSocket初始化失败: {e}", exc_info=True)
+            self._close_websocket([manager])
+            return None
+
+        # 冗余连接（失败不影响主连接）
+        redundant = []
+        for conn_id in range(1, self.ws_connections):
+            extra = None
+            try:
+                extra = self._new_ws_manager()
+                extra.connect_public()
+                extra.subscribe_ticker(self.contract_id, lambda message, conn_id=conn_id: self.handle_ticker(message, conn_id))
+                redundant.append(extra)
+                self.logger.info(f"✅ 冗余连接 #{conn_id} 已订阅 Ticker")
+            except Exception as e:
+                self.logger.warning(f"⚠️ 冗余连接 #{conn_id} 建立失败: {e}")
+                self._close_websocket([extra])
+
+        return manager, redundant
+
+    def _adopt_websocket(self, manager, redundant: list):
+        """在事件循环中启用新建立的连接，并补订消费端运行时订阅的其他合约"""
+        self.ws_manager = manager
+        self.redundant_ws_managers = redundant
+        self.ticker_contracts = set()
+        self.ws_connected_at = int(time.time() * 1000)
+        self._sync_ticker_subscriptions()
+
+    def _detach_websocket(self) -> list:
+        """在事件循环中摘下当前连接（之后的订阅命令等待重连后补订），返回待断开的连接"""
+        managers = [self.ws_manager] + self.redundant_ws_managers
+        self.ws_manager = None
+        self.redundant_ws_managers = []
+        self.ticker_contracts = set()
+        return managers
+
+    def _close_websocket(self, managers: list):
+        """断开 WebSocket 连接（同步 SDK 调用，可在线程池中执行）"""
+        for manager in managers:
+            if not manager:
+                continue
+            try:
+                manager.disconnect_all()
+            except Exception as e:
+                self.logger.debug(f"关闭旧连接失败: {e}")
+
+    def _reconnect_delay(self, attempt: int):
+        """重连等待时间：指数退避（最长 30 秒）加随机抖动，避免多个实例同时重连"""
+        return min(30.0, 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+    def _websocket_alive(self):
+        """WebSocket 连接是否正常：连接后 Ticker 超过阈值无消息（断线或静默断线）视为中断"""
+        if not self.ws_manager:
+            return False
+
+        last_recv = max(self.feed_monitor.feeds["ticker"]["last_recv_ts"], self.ws_connected_at)
+        return int(time.time() * 1000) - last_recv <= self.ws_reconnect_stale_ms
+
+    async def supervise_websocket(self):
+        """WebSocket 连接守护：断线后抖动退避重连并重新订阅 Ticker，随后用 REST 快照刷新价格
+
+        SDK 的连接和订阅是同步调用，放到线程池执行，避免阻塞事件循环；
+        服务状态（ws_manager、ticker_contracts）只在事件循环中修改，与 subscribe / unsubscribe 命令不并发
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await asyncio.sleep(1)
+            try:
+                if self._websocket_alive():
+                    continue
+
+                down_since = int(time.time() * 1000)
+                self.reconnects += 1
+                self.metrics.reconnects.inc()
+                self.logger.warning(f"⚠️ WebSocket 连接中断，开始重连 (第 {self.reconnects} 次)...")
+                self.output("ws_status", {"connected": False, "reconnects": self.reconnects})
+
+                await loop.run_in_executor(None, self._close_websocket, self._detach_websocket())
+
+                attempt = 0
+                connection = await loop.run_in_executor(None, self._connect_websocket)
+                while connection is None:
+                    attempt += 1
+                    delay = self._reconnect_delay(attempt)
+                    self.logger.warning(f"⚠️ 连接失败，{delay:.1f}秒后重试...")
+                    await asyncio.sleep(delay)
+                    connection = await loop.run_in_executor(None, self._connect_websocket)
+                self._adopt_websocket(*connection)
+
+                # 重连后立即用 REST 行情刷新价格（订单簿由 REST 轮询持续提供）
+                try:
+                    await self._fetch_rest_ticker()
+                except Exception as e:
+                    self.logger.warning(f"⚠️ REST 行情快照拉取失败: {e}")
+
+                downtime_ms = int(time.time() * 1000) - down_since
+                self.logger.info(f"✅ WebSocket 已恢复，中断 {downtime_ms}ms")
+                self.output("ws_status", {"connected": True, "reconnects": self.reconnects, "downtime_ms": downtime_ms})
+
+            except Exception as e:
+                self.logger.error(f"❌ WebSocket 重连失败: {e}", exc_info=True)
 
     async def listen_stdin(self):
         """监听 stdin 接收命令"""
@@ -547,7 +1725,7 @@ class EdgeXTradingService:
                 try:
                     command = json.loads(line.strip())
                     # 使用 call_soon_threadsafe 在事件循环中执行
-                    asyncio.run_coroutine_threadsafe(self.handle_command(command), loop)
+                    asyncio.run_coroutine_threadsafe(self.handle_command(command, time.perf_counter()), loop)
                 except json.JSONDecodeError as e:
                     self.logger.error(f"❌ JSON解析失败: {e}")
                 except Exception as e:
@@ -578,48 +1756,16 @@ class EdgeXTradingService:
                     # 使用 EdgeX 公开 REST API 获取订单簿（5档更快更精准）
                     import requests
                     response = requests.get(
-                        "https://fapi.asterdex.com/fapi/v1/depth",
+                        self.depth_url,
                         params={"symbol": "BTCUSDT", "limit": 5},
                         timeout=5
                     ).json()
+                    recv_ts = int(time.time() * 1000)
+                    recv_mono_ns = time.monotonic_ns()
+                    if self.recorder:
+                        self.recorder.record("rest_depth", response)
 
-                    if response and isinstance(response, dict):
-                        bids_raw = response.get("bids", [])
-                        asks_raw = response.get("asks", [])
-
-                        # 转换格式: AsterDex 格式 [["price", "size"], ...] → [[price, size], ...]
-                        bids = [[float(b[0]), float(b[1])] for b in bids_raw if len(b) >= 2]
-                        asks = [[float(a[0]), float(a[1])] for a in asks_raw if len(a) >= 2]
-
-                        if len(bids) >= 3 and len(asks) >= 3:  # 至少 3 档深度
-                            self.orderbook = {
-                                "bids": bids,
-                                "asks": asks
-                            }
-                            # 仅第一次或深度变化时输出日志
-                            if len(bids) != getattr(self, '_last_bid_count', 0):
-                                self.logger.info(f"✅ REST 订单簿: {len(bids)} 档买单, {len(asks)} 档卖单")
-                                self._last_bid_count = len(bids)
-
-                            # ✅ 计算价格并推送 price_update（替代 WebSocket ticker）
-                            bid_price = bids[0][0]
-                            ask_price = asks[0][0]
-                            mid_price = (bid_price + ask_price) / 2
-
-                            # 每次都推送，确保主程序知道数据是新鲜的
-                            if mid_price > 0:
-                                self.last_price = mid_price
-                                self.output("price_update", {
-                                    "contract_id": "10000001",
-                                    "bid": bid_price,
-                                    "ask": ask_price,
-                                    "mid": mid_price,
-                                    "last_price": mid_price,
-                                    "orderbook": self.orderbook,
-                                    "timestamp": int(time.time() * 1000)
-                                })
-                        else:
-                            self.logger.warning(f"⚠️  订单簿深度不足: {len(bids)} bids, {len(asks)} asks")
+                    self._apply_rest_depth(response, recv_ts, recv_mono_ns)
 
                     await asyncio.sleep(0.5)  # 每 500ms 拉取一次（更快响应）
 
@@ -630,6 +1776,206 @@ class EdgeXTradingService:
         except Exception as e:
             self.logger.error(f"❌ REST 轮询任务崩溃: {e}", exc_info=True)
 
+    def _apply_rest_depth(self, response, recv_ts: int, recv_mono_ns: int):
+        """处理一次 REST 深度快照并推送 price_update（回放时直接调用）"""
+        self.metrics.messages_in.inc("rest_depth")
+        if response and isinstance(response, dict):
+            exchange_ts = int(response.get("T") or response.get("E") or recv_ts)
+            self.feed_monitor.record("rest", exchange_ts, recv_ts)
+            bids_raw = response.get("bids", [])
+            asks_raw = response.get("asks", [])
+
+            # 转换格式: AsterDex 格式 [["price", "size"], ...] → [[price, size], ...]
+            bids = [[float(b[0]), float(b[1])] for b in bids_raw if len(b) >= 2]
+            asks = [[float(a[0]), float(a[1])] for a in asks_raw if len(a) >= 2]
+
+            if len(bids) >= 3 and len(asks) >= 3:  # 至少 3 档深度
+                # ✅ 来源仲裁：深度只和更早的深度快照比较（AsterDex 的 T/E 是另一家交易所的时钟）
+                clock = "aster" if response.get("T") or response.get("E") else LOCAL_CLOCK
+                if not self.quote_arbiter.offer(self.contract_id, "rest", exchange_ts, recv_ts, kind="depth", clock=clock):
+                    return
+
+                self.orderbook = {
+                    "bids": bids,
+                    "asks": asks
+                }
+                self.executable_quotes = executable_quotes(self.orderbook, self.quote_sizes)
+                # 仅第一次或深度变化时输出日志
+                if len(bids) != getattr(self, '_last_bid_count', 0):
+                    self.logger.info(f"✅ REST 订单簿: {len(bids)} 档买单, {len(asks)} 档卖单")
+                    self._last_bid_count = len(bids)
+
+                # ✅ 计算价格并推送 price_update（替代 WebSocket ticker）
+                # 最优价单独仲裁：Ticker 正常时不用 AsterDex 快照的最优价覆盖 EdgeX 的盘口
+                bid_price = bids[0][0]
+                ask_price = asks[0][0]
+                if self.quote_arbiter.offer(self.contract_id, "rest", exchange_ts, recv_ts, clock=clock):
+                    self._update_top_of_book(bid_price, ask_price)
+                    self.last_price = (bid_price + ask_price) / 2
+                elif self.best_bid > 0 and self.best_ask > 0:
+                    bid_price, ask_price = self.best_bid, self.best_ask
+                mid_price = (bid_price + ask_price) / 2
+
+                # 每次都推送，确保主程序知道数据是新鲜的
+                if mid_price > 0:
+                    self.output("price_update", {
+                        "contract_id": self.contract_id,
+                        "bid": bid_price,
+                        "ask": ask_price,
+                        "mid": mid_price,
+                        "last_price": mid_price,
+                        "orderbook": self.orderbook,
+                        "quotes": self.executable_quotes,
+                        "timestamp": int(time.time() * 1000),
+                        "source": "rest",
+                        "exchange_ts": exchange_ts,
+                        "recv_ts": recv_ts,
+                        "recv_mono_ns": recv_mono_ns
+                    })
+            else:
+                self.logger.warning(f"⚠️  订单簿深度不足: {len(bids)} bids, {len(asks)} asks")
+
+    async def poll_ticker_rest(self):
+        """Ticker 过期时用 REST 行情接口（quote summary）兜底推送价格，WebSocket 正常时不轮询"""
+        try:
+            # 初始延迟，等待 client 初始化
+            await asyncio.sleep(2)
+
+            while True:
+                try:
+                    if not self.client or self.feed_monitor.is_fresh("ticker", int(time.time() * 1000)):
+                        await asyncio.sleep(0.5)
+                        continue
+
+                    await self._fetch_rest_ticker()
+                    await asyncio.sleep(1)
+
+                except Exception as e:
+                    self.logger.error(f"❌ REST 行情拉取失败: {e}")
+                    await asyncio.sleep(5)  # 失败后等待 5 秒重试
+
+        except Exception as e:
+            self.logger.error(f"❌ REST 行情轮询任务崩溃: {e}", exc_info=True)
+
+    async def _fetch_rest_ticker(self):
+        """通过 REST 行情接口拉取一次最优买卖价并推送 price_update"""
+        quote = await self.get_price({"contract_id": self.contract_id})
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        exchange_ts = int(quote.get("timestamp") or recv_ts)
+        self.metrics.messages_in.inc("rest_ticker")
+        self.feed_monitor.record("rest_ticker", exchange_ts, recv_ts)
+
+        bid_price = quote["best_bid"]
+        ask_price = quote["best_ask"]
+        clock = "edgex" if quote.get("timestamp") else LOCAL_CLOCK
+        if bid_price > 0 and ask_price > 0 and self.quote_arbiter.offer(self.contract_id, "rest_ticker", exchange_ts, recv_ts, clock=clock):
+            mid_price = (bid_price + ask_price) / 2
+            self.last_price = mid_price
+            self._update_top_of_book(bid_price, ask_price)
+            self.output("price_update", {
+                "contract_id": self.contract_id,
+                "bid": bid_price,
+                "ask": ask_price,
+                "mid": mid_price,
+                "last_price": mid_price,
+                "orderbook": self.orderbook,
+                "quotes": self.executable_quotes,
+                "timestamp": exchange_ts,
+                "source": "rest_ticker",
+                "exchange_ts": exchange_ts,
+                "recv_ts": recv_ts,
+                "recv_mono_ns": recv_mono_ns
+            })
+
+    def _sample_server_time(self):
+        """请求一次服务器时间（在线程池中执行），返回 (服务器毫秒时间, 发送时本地毫秒时间, RTT 毫秒)
+
+        EdgeX 的行情 WebSocket 由 SDK 在独立线程中管理，没有暴露 ping，RTT 只来自这里
+        """
+        import requests
+        sent_ts = time.time() * 1000
+        start = time.monotonic_ns()
+        response = requests.get(self.server_time_url, timeout=5).json()
+        rtt_ms = (time.monotonic_ns() - start) / 1e6
+        return int(response["data"]["timeMillis"]), sent_ts, rtt_ms
+
+    def _record_clock_sample(self, server_ts: int, sent_ts: float, rtt_ms: float):
+        first = self.clock.offset_ms is None
+        self.clock.add_server_time(server_ts, sent_ts, rtt_ms)
+        self.metrics.exchange_rtt.observe(rtt_ms / 1000, "server_time")
+        self.metrics.clock_offset.set(self.clock.offset_ms / 1000)
+        if first:
+            self.logger.info(f"🕐 交易所时钟偏差 {self.clock.offset_ms:+.1f}ms (RTT {rtt_ms:.1f}ms)")
+
+    async def sync_clock(self):
+        """定期采样服务器时间，估计时钟偏差和 RTT（启动时连续采样几次以尽快收敛）
+
+        采样走公共接口限速器（不占用下单的时间槽）；限流退避期间（rate_limit_failures > 0）跳过采样
+        """
+        loop = asyncio.get_running_loop()
+        warmup = 5
+        while True:
+            if self.rate_limit_failures > 0:
+                self.logger.debug(f"⏸️ 限流退避中，跳过服务器时间采样")
+                await asyncio.sleep(self.clock_sync_interval)
+                continue
+            try:
+                await self._public_rate_limit()
+                server_ts, sent_ts, rtt_ms = await loop.run_in_executor(None, self._sample_server_time)
+                self._record_clock_sample(server_ts, sent_ts, rtt_ms)
+            except Exception as e:
+                self.logger.warning(f"⚠️ 服务器时间采样失败: {e}")
+            warmup = max(0, warmup - 1)
+            await asyncio.sleep(1 if warmup else self.clock_sync_interval)
+
+    def clock_status(self):
+        """时钟偏差/RTT 估计，以及按偏差换算的当前交易所时间"""
+        now_ms = int(time.time() * 1000)
+        status = self.clock.snapshot(now_ms)
+        status["local_ts"] = now_ms
+        status["exchange_now_ts"] = int(now_ms + self.clock.offset_ms) if self.clock.offset_ms is not None else None
+        return status
+
+    def feed_status(self):
+        """各行情源的新鲜度状态；tradable 为 False 时说明所有价格来源都已过期"""
+        now_ms = int(time.time() * 1000)
+        return {
+            "feeds": self.feed_monitor.snapshot(now_ms),
+            "tradable": any(self.feed_monitor.is_fresh(feed, now_ms) for feed in self.feed_monitor.feeds),
+            "rest_polling": not self.feed_monitor.is_fresh("ticker", now_ms),
+            "ws_connections": self.ws_dedup.snapshot() if self.ws_dedup else None,
+            "clock_offset_ms": self.clock.offset_ms
+        }
+
+    async def monitor_feeds(self):
+        """定期检查行情源新鲜度，健康状态变化时推送 feed_status"""
+        while True:
+            try:
+                changed = self.feed_monitor.check(int(time.time() * 1000))
+                if changed:
+                    status = self.feed_status()
+                    for feed in changed:
+                        if status["feeds"][feed]["healthy"]:
+                            self.logger.info(f"✅ 行情源恢复: {feed}")
+                        else:
+                            self.logger.warning(f"⚠️ 行情源过期: {feed} (超过 {status['feeds'][feed]['stale_after_ms']}ms 无消息)")
+                    self.output("feed_status", dict(status, changed=changed))
+            except Exception as e:
+                self.logger.error(f"❌ 行情源监控错误: {e}")
+
+            await asyncio.sleep(0.5)
+
+    def _on_loop_blocked(self, lag: float, stack: str):
+        """事件循环阻塞超过阈值（恢复后回调）"""
+        self.metrics.loop_blocked.inc()
+        self.logger.warning(f"🐢 事件循环阻塞 {lag * 1000:.0f}ms" + (f"，阻塞位置:\n{stack}" if stack else ""))
+        self.output("loop_blocked", {
+            "blocked_ms": round(lag * 1000, 1),
+            "stack": stack,
+            "timestamp": int(time.time() * 1000)
+        })
+
     async def start(self):
         """启动服务"""
         try:
@@ -638,6 +1984,24 @@ class EdgeXTradingService:
             self.logger.info(f"   Base URL: {self.base_url}")
 
             # 初始化 EdgeX 客户端
+            self.loop = asyncio.get_running_loop()
+
+            if self.metrics_port:
+                self.metrics_server = await serve_metrics(self.metrics, "127.0.0.1", self.metrics_port)
+                self.logger.info(f"📈 指标端点: http://127.0.0.1:{self.metrics_port}/metrics")
+
+            self.loop_monitor_task = asyncio.create_task(self.loop_monitor.run())
+
+            if self.broker_socket:
+                self.broker = BrokerServer(
+                    self.broker_socket, self.handle_command, self.logger,
+                    hello=lambda: {"latest_seq": self.output_seq, "replay_buffer": self.replay_buffer.snapshot()},
+                    on_connect=self.subscriptions.add_subscriber,
+                    on_disconnect=self._release_subscriber
+                )
+                await self.broker.start()
+                self.logger.info(f"📡 broker 模式: {self.broker_socket}")
+
             async with Client(
                 base_url=self.base_url,
                 account_id=self.account_id,
@@ -645,6 +2009,11 @@ class EdgeXTradingService:
             ) as client:
                 self.client = client
 
+                # 签名耗时单独计时（SDK 未暴露签名接口时计入交易所确认耗时）
+                signer = getattr(client, "signing_adapter", None) or getattr(getattr(client, "internal_client", None), "signing_adapter", None)
+                if not command_timing.instrument_signing(signer, "sign"):
+                    self.logger.info("ℹ️ SDK 未暴露签名接口，签名耗时计入交易所确认耗时")
+
                 self.logger.info(f"✅ EdgeX 客户端初始化成功")
 
                 # 输出初始化成功消息
@@ -659,13 +2028,23 @@ class EdgeXTradingService:
                 # ✅ 启动 REST API 轮询作为备份（WebSocket Depth 不可靠）
                 poll_task = asyncio.create_task(self.poll_orderbook_rest())
 
+                # Ticker 过期时的 REST 行情兜底 + 行情源新鲜度监控
+                ticker_poll_task = asyncio.create_task(self.poll_ticker_rest())
+                monitor_task = asyncio.create_task(self.monitor_feeds())
+
                 self.output("ready", {"message": "EdgeX交易服务就绪"})
 
                 # 启动 stdin 监听（接收交易命令）- 非阻塞
                 stdin_task = asyncio.create_task(self.listen_stdin())
 
                 # 等待任务完成
-                await asyncio.gather(poll_task, stdin_task)
+                # WebSocket 连接守护（断线自动重连）
+                supervise_task = asyncio.create_task(self.supervise_websocket())
+
+                # 交易所时钟偏差/RTT 估计
+                clock_task = asyncio.create_task(self.sync_clock())
+
+                await asyncio.gather(poll_task, stdin_task, ticker_poll_task, monitor_task, supervise_task, clock_task)
 
                 # 保持运行
                 while True:
@@ -677,6 +2056,15 @@ class EdgeXTradingService:
         except Exception as e:
             self.logger.error(f"❌ 服务错误: {e}", exc_info=True)
             self.output("error", {"message": str(e)})
+        finally:
+            if self.loop_monitor_task:
+                self.loop_monitor_task.cancel()
+            if self.broker:
+                self.broker.close()
+            if self.recorder:
+                self.recorder.close()
+            if self.metrics_server:
+                self.metrics_server.close()
 
 
 async def main():
@@ -702,5 +2090,5 @@ if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print(json.dumps({"type": "shutdown", "timestamp": datetime.now().isoformat()}), flush=True)
+        print(_encode({"type": "shutdown", "timestamp": time.time_ns() // 1_000_000}), flush=True)
         sys.exit(0)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+行情源新鲜度监控
+跟踪每个行情源的最后交易所时间戳、最后接收时间和消息速率，
+超过阈值未收到消息即判定为过期（stale），供服务在 WebSocket / REST 之间切换并通知主程序
+
+兜底行情源（如只在 WebSocket 过期时才轮询的 REST 行情）在主行情源正常时处于待命（standby）状态，
+不参与过期判定，否则它会在过期/恢复之间反复切换
+"""
+
+
+def parse_stale_thresholds(spec: str, feeds: list, default_ms: int) -> dict:
+    """解析过期阈值配置
+
+    格式: "3000"（所有行情源）或 "bbo=2000,rest=5000"（按行情源，未列出的使用 default_ms）
+    """
+    thresholds = {feed: default_ms for feed in feeds}
+    if not spec:
+        return thresholds
+
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" in item:
+            feed, value = item.split("=", 1)
+            thresholds[feed.strip()] = int(value)
+        else:
+            thresholds = {feed: int(item) for feed in feeds}
+
+    return thresholds
+
+
+class FeedMonitor:
+    """按行情源记录新鲜度，并在健康状态变化时报告"""
+
+    def __init__(self, stale_after_ms: dict, fallbacks: dict = None):
+        self.stale_after_ms = stale_after_ms
+        self.fallbacks = fallbacks or {}  # 兜底行情源 → 主行情源（主行情源新鲜时兜底源待命）
+        self.feeds = {
+            feed: {"last_exchange_ts": 0, "last_recv_ts": 0, "count": 0, "rate": 0.0, "healthy": False, "standby": False}
+            for feed in stale_after_ms
+        }
+        self._last_check_ts = 0
+        self._last_counts = {feed: 0 for feed in stale_after_ms}
+
+    def record(self, feed: str, exchange_ts: int, recv_ts: int):
+        """记录收到一条消息（在回调入口调用，不论该消息最终是否被采用）"""
+        state = self.feeds[feed]
+        if exchange_ts > state["last_exchange_ts"]:
+            state["last_exchange_ts"] = exchange_ts
+        state["last_recv_ts"] = recv_ts
+        state["count"] += 1
+
+    def is_fresh(self, feed: str, now_ms: int) -> bool:
+        """行情源在阈值时间内收到过消息"""
+        last = self.feeds[feed]["last_recv_ts"]
+        return last > 0 and now_ms - last <= self.stale_after_ms[feed]
+
+    def check(self, now_ms: int) -> list:
+        """更新消息速率和健康状态，返回健康状态发生变化的行情源"""
+        elapsed = (now_ms - self._last_check_ts) / 1000 if self._last_check_ts else 0
+        self._last_check_ts = now_ms
+
+        changed = []
+        for feed, state in self.feeds.items():
+            if elapsed > 0:
+                state["rate"] = (state["count"] - self._last_counts[feed]) / elapsed
+            self._last_counts[feed] = state["count"]
+
+            primary = self.fallbacks.get(feed)
+            state["standby"] = primary is not None and self.is_fresh(primary, now_ms)
+            if state["standby"]:
+                # 待命中的兜底源不报告过期；重新启用后收到第一条消息时再报告恢复
+                state["healthy"] = False
+                continue
+
+            healthy = self.is_fresh(feed, now_ms)
+            if healthy != state["healthy"]:
+                state["healthy"] = healthy
+                changed.append(feed)
+
+        return changed
+
+    def snapshot(self, now_ms: int) -> dict:
+        """各行情源的当前状态（含消息年龄 age_ms）"""
+        return {
+            feed: {
+                "healthy": state["healthy"],
+                "standby": state["standby"],
+                "last_exchange_ts": state["last_exchange_ts"],
+                "last_recv_ts": state["last_recv_ts"],
+                "age_ms": now_ms - state["last_recv_ts"] if state["last_recv_ts"] else None,
+                "rate": round(state["rate"], 2),
+                "stale_after_ms": self.stale_after_ms[feed]
+            }
+            for feed, state in self.feeds.items()
+        }
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+运行中进程的按需性能剖析
+profile 命令触发，持续 N 秒后把结果写到文件，不需要重启服务：
+    cprofile: cProfile 剖析事件循环线程（所有协程和回调），写 .pstats 和按 tottime 排序的 .txt 摘要
+    sample:   定时采样所有线程的调用栈（含 EdgeX WebSocket 线程），写 collapsed stacks，
+              可直接交给 flamegraph.pl / speedscope 生成火焰图
+
+sample 模式在主线程上用 SIGPROF（setitimer(ITIMER_PROF)，按进程 CPU 时间计时）触发采样，
+信号处理函数在主线程执行，能采到事件循环线程正在跑的代码。
+后台线程采样只在事件循环线程让出 GIL（即阻塞在 select() 里）时才拿得到 GIL，采到的几乎全是空闲等待，
+因此只在无法使用 SIGPROF 时（非主线程 / 非 POSIX 平台）退回后台线程，结果中 timer 为 "thread"，
+此时事件循环的 CPU 归属请改用 cprofile 模式。
+
+同一时间只允许一个剖析会话。
+"""
+
+import asyncio
+import collections
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+MODES = ("cprofile", "sample")
+MAX_DURATION = 300
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class LiveProfiler:
+    """在服务事件循环中运行的剖析会话"""
+
+    def __init__(self, directory: str, prefix: str):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), f"{prefix}-profiles")
+        self.prefix = prefix
+        self.active = False
+
+    def _path(self, mode: str, suffix: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{self.prefix}-{mode}-{datetime.now().strftime('%Y%m%d-%H%M%S')}{suffix}"
+        return os.path.join(self.directory, name)
+
+    async def run(self, duration: float = 10.0, mode: str = "cprofile", interval_ms: float = 5.0, top: int = 20) -> dict:
+        if mode not in MODES:
+            raise ValueError(f"不支持的剖析模式: {mode}（可选 {', '.join(MODES)}）")
+        if not 0 < duration <= MAX_DURATION:
+            raise ValueError(f"剖析时长必须在 (0, {MAX_DURATION}] 秒之间")
+        if self.active:
+            raise ValueError("已有剖析会话在运行")
+
+        self.active = True
+        try:
+            if mode == "cprofile":
+                return await self._run_cprofile(duration, top)
+            return await self._run_sampler(duration, interval_ms / 1000, top)
+        finally:
+            self.active = False
+
+    async def _run_cprofile(self, duration: float, top: int) -> dict:
+        # cProfile 只作用于调用 enable() 的线程，这里即事件循环线程
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.disable()
+        elapsed = time.perf_counter() - started
+
+        path = self._path("cprofile", ".pstats")
+        profiler.dump_stats(path)
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats("tottime").print_stats(top)
+        summary_path = path[:-len(".pstats")] + ".txt"
+        with open(summary_path, "w") as f:
+            f.write(summary.getvalue())
+
+        hottest = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        return {
+            "mode": "cprofile",
+            "path": path,
+            "summary_path": summary_path,
+            "duration": round(elapsed, 3),
+            "total_calls": stats.total_calls,
+            "top": [
+                {
+                    "function": f"{func} ({os.path.basename(filename)}:{line})",
+                    "calls": nc,
+                    "tottime_ms": round(tt * 1000, 3),
+                    "cumtime_ms": round(ct * 1000, 3)
+                }
+                for (filename, line, func), (cc, nc, tt, ct, callers) in hottest
+            ]
+        }
+
+    async def _run_sampler(self, duration: float, interval: float, top: int) -> dict:
+        raw = collections.Counter()  # (线程 ident, 调用栈) → 次数，线程名在采样结束后再填
+        samples = [0]
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        def record(current_frames):
+            # 可能在 SIGPROF 处理函数中执行：不能调用 threading.enumerate() 等会加锁的函数
+            # （信号可能恰好打断持有 threading 内部锁的主线程，例如 Thread.start()，再加锁即死锁）
+            for ident, frame in current_frames.items():
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                raw[ident, ";".join(reversed(labels))] += 1
+            samples[0] += 1
+
+        started = time.perf_counter()
+        use_itimer = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+        if use_itimer:
+            main = threading.get_ident()
+
+            def on_sigprof(signum, frame):
+                # 在主线程执行：frame 是被打断的事件循环代码，其他线程取当前栈
+                current_frames = sys._current_frames()
+                current_frames[main] = frame
+                record(current_frames)
+
+            previous = signal.signal(signal.SIGPROF, on_sigprof)
+            signal.setitimer(signal.ITIMER_PROF, interval, interval)
+            try:
+                await asyncio.sleep(duration)
+            finally:
+                signal.setitimer(signal.ITIMER_PROF, 0)
+                signal.signal(signal.SIGPROF, previous)
+        else:
+            stop = threading.Event()
+
+            def sample():
+                me = threading.get_ident()
+                while not stop.wait(interval):
+                    current_frames = sys._current_frames()
+                    current_frames.pop(me, None)
+                    record(current_frames)
+
+            sampler = threading.Thread(target=sample, name=f"{self.prefix}-sampler", daemon=True)
+            sampler.start()
+            try:
+                await asyncio.sleep(duration)
+            finally:
+                stop.set()
+                await asyncio.get_running_loop().run_in_executor(None, sampler.join)
+        elapsed = time.perf_counter() - started
+
+        # 定时器已停止，这里可以安全地取线程名（采样期间新建的线程也能取到）
+        names.update((thread.ident, thread.name) for thread in threading.enumerate())
+        stacks = collections.Counter()
+        for (ident, stack), count in raw.items():
+            stacks[f"{names.get(ident, str(ident))};{stack}"] += count
+
+        path = self._path("sample", ".collapsed")
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        # 叶子函数的自身采样数（其他线程在空闲等待中也会被采到，按线程名区分）
+        leaves = collections.Counter()
+        for stack, count in stacks.items():
+            parts = stack.split(";")
+            leaves[f"{parts[0]}: {parts[-1]}"] += count
+        return {
+            "mode": "sample",
+            "path": path,
+            "duration": round(elapsed, 3),
+            "interval_ms": interval * 1000,
+            "timer": "itimer_prof" if use_itimer else "thread",
+            "samples": samples[0],
+            "top": [{"function": name, "samples": count} for name, count in leaves.most_common(top)]
+        }
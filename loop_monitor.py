@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+事件循环延迟与阻塞检测
+心跳协程每隔 interval 秒醒来一次，实际醒来时间与预期之差即调度延迟；
+看门狗线程发现心跳超过 block_threshold 秒没有更新时，抓取事件循环线程当时的调用栈（即阻塞在哪一行），
+事件循环恢复后由心跳协程上报阻塞时长和调用栈（输出只在事件循环线程中进行）。
+"""
+
+import asyncio
+import collections
+import math
+import sys
+import threading
+import time
+import traceback
+
+
+def _percentile(sorted_values: list, p: float):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(p * len(sorted_values)) - 1))]
+
+
+class LoopLagMonitor:
+    """事件循环调度延迟监控"""
+
+    def __init__(self, interval: float = 0.05, block_threshold: float = 0.1, window: int = 2400,
+                 on_lag=None, on_block=None):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.on_lag = on_lag  # 每个心跳的延迟（秒）回调，用于导出直方图
+        self.on_block = on_block  # 阻塞结束时回调 (阻塞秒数, 调用栈文本)
+        self.lags = collections.deque(maxlen=window)  # 最近的延迟样本（秒），默认约 2 分钟
+        self.blocks = collections.deque(maxlen=10)  # 最近的阻塞记录
+        self.blocked_count = 0
+        self.max_lag = 0.0
+
+        self._beat = 0  # 心跳序号
+        self._last_beat_at = time.monotonic()
+        self._captured = None  # (心跳序号, 调用栈文本)：看门狗在阻塞期间抓到的栈
+        self._loop_thread_id = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+
+    async def run(self):
+        """心跳协程（在要监控的事件循环中运行）"""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat_at = time.monotonic()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+        try:
+            while True:
+                expected = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = max(0.0, now - expected)
+
+                self._beat += 1
+                self._last_beat_at = now
+                self.lags.append(lag)
+                if lag > self.max_lag:
+                    self.max_lag = lag
+                if self.on_lag:
+                    self.on_lag(lag)
+
+                if lag >= self.block_threshold:
+                    self._report_block(lag)
+        finally:
+            self._stopped.set()
+
+    def _report_block(self, lag: float):
+        captured, self._captured = self._captured, None
+        stack = captured[1] if captured and captured[0] == self._beat - 1 else None
+        self.blocked_count += 1
+        record = {
+            "blocked_ms": round(lag * 1000, 1),
+            "at": int(time.time() * 1000),
+            "stack": stack
+        }
+        self.blocks.append(record)
+        if self.on_block:
+            self.on_block(lag, stack)
+
+    def _watch(self):
+        """看门狗线程：心跳停滞超过阈值时抓取事件循环线程的调用栈（每次阻塞只抓一次）"""
+        poll = max(self.block_threshold / 4, 0.005)
+        while not self._stopped.wait(poll):
+            beat = self._beat
+            if time.monotonic() - self._last_beat_at - self.interval < self.block_threshold:
+                continue
+            if self._captured and self._captured[0] == beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._captured = (beat, "".join(traceback.format_stack(frame)))
+
+    def snapshot(self) -> dict:
+        lags = sorted(self.lags)
+        to_ms = lambda v: round(v * 1000, 3) if v is not None else None
+        return {
+            "interval_ms": self.interval * 1000,
+            "block_threshold_ms": self.block_threshold * 1000,
+            "samples": len(lags),
+            "lag_ms": {
+                "p50": to_ms(_percentile(lags, 0.5)),
+                "p99": to_ms(_percentile(lags, 0.99)),
+                "p99.9": to_ms(_percentile(lags, 0.999)),
+                "max_window": to_ms(lags[-1] if lags else None),
+                "max_total": to_ms(self.max_lag)
+            },
+            "blocked_count": self.blocked_count,
+            "recent_blocks": list(self.blocks)
+        }
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+原始行情录制
+把每条收到的原始消息连同本地纳秒接收时间追加到滚动的 gzip 压缩录制文件，
+写盘由后台线程完成，回调里只做一次入队，不增加回调延迟
+
+录制文件格式（gzip 压缩流）:
+    文件头 MAGIC
+    记录 = 头部 <IQH>（payload 长度, 接收时间 ns, 频道名长度） + 频道名 + payload（UTF-8 JSON）
+"""
+
+import glob
+import gzip
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import datetime
+
+MAGIC = b"MDCAP1\n"
+RECORD_HEADER = struct.Struct("<IQH")
+
+
+class MarketRecorder:
+    """后台线程写盘的行情录制器"""
+
+    def __init__(self, directory: str, prefix: str, rotate_bytes: int = 64 * 1024 * 1024,
+                 max_pending: int = 100000, logger=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.rotate_bytes = rotate_bytes  # 单个文件的未压缩字节上限，超过后滚动到新文件
+        self.max_pending = max_pending  # 待写队列上限，超过时丢弃（不阻塞回调）
+        self.logger = logger
+        self.recorded = 0
+        self.dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._file_bytes = 0
+        self._thread = threading.Thread(target=self._run, name=f"{prefix}-recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, channel: str, message):
+        """录制一条原始消息（dict 或 str），可在任意线程调用"""
+        if self._queue.qsize() >= self.max_pending:
+            self.dropped += 1
+            return
+        self._queue.put((time.time_ns(), channel, message))
+
+    def close(self):
+        """写完队列中剩余的消息并关闭文件"""
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _open_file(self):
+        if self._file:
+            self._file.close()
+        name = f"{self.prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.cap.gz"
+        self._file = gzip.open(os.path.join(self.directory, name), "wb", compresslevel=6)
+        self._file.write(MAGIC)
+        self._file_bytes = len(MAGIC)
+        if self.logger:
+            self.logger.info(f"📼 行情录制文件: {name}")
+
+    def _write(self, recv_ns: int, channel: str, message):
+        payload = message.encode() if isinstance(message, str) else json.dumps(message, separators=(",", ":")).encode()
+        channel_bytes = channel.encode()
+
+        if self._file is None or self._file_bytes >= self.rotate_bytes:
+            self._open_file()
+
+        self._file.write(RECORD_HEADER.pack(len(payload), recv_ns, len(channel_bytes)))
+        self._file.write(channel_bytes)
+        self._file.write(payload)
+        self._file_bytes += RECORD_HEADER.size + len(channel_bytes) + len(payload)
+        self.recorded += 1
+
+    def _run(self):
+        """写盘线程：空闲 1 秒时同步刷盘，进程异常退出也只丢失最后不到 1 秒的数据"""
+        while True:
+            try:
+                item = self._queue.get(timeout=1)
+            except queue.Empty:
+                if self._file:
+                    self._file.flush()
+                continue
+
+            if item is None:
+                break
+
+            try:
+                self._write(*item)
+            except Exception as e:
+                self.dropped += 1
+                if self.logger:
+                    self.logger.error(f"❌ 行情录制写入失败: {e}")
+
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def iter_capture(path: str):
+    """逐条读取录制文件，产出 (接收时间 ns, 频道名, payload bytes)；文件末尾不完整时在最后一条完整记录处结束"""
+    with gzip.open(path, "rb") as f:
+        try:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是行情录制文件: {path}")
+
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                length, recv_ns, channel_length = RECORD_HEADER.unpack(header)
+                channel = f.read(channel_length)
+                payload = f.read(length)
+                if len(channel) < channel_length or len(payload) < length:
+                    return
+                yield recv_ns, channel.decode(), payload
+        except (EOFError, gzip.BadGzipFile):
+            # 进程被杀时最后一个文件没有 gzip 结尾
+            return
+
+
+def capture_files(directory: str, prefix: str) -> list:
+    """按时间顺序列出某个服务的录制文件"""
+    return sorted(glob.glob(os.path.join(directory, f"{prefix}-*.cap.gz")))
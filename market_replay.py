@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+行情回放
+把 market_recorder 录制的原始消息按录制顺序送回真实的服务回调
+（EdgeXTradingService.handle_ticker / ParadexWSService.on_*），不连网络。
+
+服务模块里的 time 替换为虚拟时钟，时钟在每条消息前拨到录制时的接收时间，
+所以同一份录制在同一版本代码下产生逐字节相同的 output() 流，可以跨版本对比；
+同时统计整条行情处理链路的吞吐。
+
+用法:
+    python3 market_replay.py edgex  ./captures --speed 0 --output out.jsonl
+    python3 market_replay.py paradex ./captures --speed 10 --compare baseline.jsonl
+
+--speed: 0 = 尽可能快，1 = 按录制时的真实节奏，N = N 倍速
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+from market_recorder import capture_files, iter_capture
+from ws_dedup import FirstArrivalDeduplicator
+
+# Paradex 录制频道 → 服务回调
+PARADEX_HANDLERS = {
+    "bbo": "on_bbo_update",
+    "orderbook": "on_orderbook_update",
+    "trades": "on_trades_update",
+    "account": "on_account_update",
+    "positions": "on_positions_update",
+    "orders": "on_orders_update",
+    "fills": "on_fills_update",
+}
+
+
+class VirtualClock:
+    """回放用虚拟时钟（纳秒），由回放循环推进"""
+
+    def __init__(self, now_ns: int = 0):
+        self.now_ns = now_ns
+
+
+class VirtualTime:
+    """替换服务模块中的 time：时间读数来自虚拟时钟，其余属性转给真实 time 模块"""
+
+    def __init__(self, clock: VirtualClock):
+        self._clock = clock
+
+    def time(self):
+        return self._clock.now_ns / 1e9
+
+    def time_ns(self):
+        return self._clock.now_ns
+
+    def monotonic(self):
+        return self._clock.now_ns / 1e9
+
+    def monotonic_ns(self):
+        return self._clock.now_ns
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def build_service(exchange: str):
+    """创建不连接交易所的服务实例，返回 (服务模块, 服务)"""
+    # 回放时不能再录制
+    os.environ.pop("EDGEX_RECORD_DIR", None)
+    os.environ.pop("PARADEX_RECORD_DIR", None)
+
+    if exchange == "edgex":
+        import edgex_trading_service as module
+        service = module.EdgeXTradingService(account_id="0", stark_private_key="0x0")
+    else:
+        import paradex_ws_service as module
+        service = module.ParadexWSService(l2_address="0x0", l2_private_key="0x0")
+    return module, service
+
+
+class Replayer:
+    """把录制文件送回服务回调，收集 output() 流"""
+
+    def __init__(self, exchange: str, files: list, speed: float = 0, output_path: str = None):
+        self.exchange = exchange
+        self.files = files
+        self.speed = speed
+        self.output_path = output_path
+        self.clock = VirtualClock()
+        self.stats = {
+            "records": 0,
+            "dispatched": 0,
+            "skipped": 0,
+            "outputs": 0,
+            "errors": 0,
+        }
+        self._digest = hashlib.sha256()
+        self._out = None
+
+    def _capture_line(self, line: str):
+        """替换 service._emit：收集真实 output() 编码出的行，写入文件并计入摘要"""
+        self._digest.update(line.encode())
+        self._digest.update(b"\n")
+        self.stats["outputs"] += 1
+        if self._out:
+            self._out.write(line + "\n")
+
+    async def _dispatch_edgex(self, service, channel: str, payload: bytes):
+        if channel == "rest_depth":
+            service._apply_rest_depth(json.loads(payload), self.clock.now_ns // 1_000_000, self.clock.now_ns)
+            return True
+
+        if channel == "ticker" or channel.startswith("ticker/"):
+            conn_id = int(channel.split("/", 1)[1]) if "/" in channel else 0
+            if conn_id >= service.ws_connections:
+                # 录制时开了冗余连接：按录制中出现的连接数启用去重
+                service.ws_connections = conn_id + 1
+                if service.ws_dedup is None:
+                    service.ws_dedup = FirstArrivalDeduplicator(service.ws_connections)
+                else:
+                    service.ws_dedup.stats.setdefault(conn_id, {"received": 0, "won": 0})
+            # 与 WebSocket 线程一样传入原始字符串，由 handle_ticker 解析并投递到事件循环
+            service.handle_ticker(payload.decode(), conn_id)
+            await asyncio.sleep(0)  # 让 _drain_ws_inbox 在下一条消息之前执行
+            return True
+
+        return False
+
+    async def _dispatch_paradex(self, service, channel: str, payload: bytes):
+        if channel == "rest_orderbook":
+            service._apply_rest_orderbook(json.loads(payload), self.clock.now_ns // 1_000_000, self.clock.now_ns)
+            return True
+
+        handler = PARADEX_HANDLERS.get(channel)
+        if handler is None:
+            return False
+        await getattr(service, handler)(channel, json.loads(payload))
+        return True
+
+    async def run(self) -> dict:
+        module, service = build_service(self.exchange)
+        original_time = module.time
+        module.time = VirtualTime(self.clock)
+        service._emit = self._capture_line
+        service.loop = asyncio.get_running_loop()
+        dispatch = self._dispatch_edgex if self.exchange == "edgex" else self._dispatch_paradex
+
+        self._out = open(self.output_path, "w") if self.output_path else None
+        first_ns = None
+        wall_start = time.perf_counter()
+        try:
+            for path in self.files:
+                for recv_ns, channel, payload in iter_capture(path):
+                    self.stats["records"] += 1
+                    if first_ns is None:
+                        first_ns = recv_ns
+
+                    # 按录制节奏等待（speed=0 时不等待）
+                    if self.speed > 0:
+                        delay = (recv_ns - first_ns) / 1e9 / self.speed - (time.perf_counter() - wall_start)
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+
+                    self.clock.now_ns = recv_ns
+                    try:
+                        if await dispatch(service, channel, payload):
+                            self.stats["dispatched"] += 1
+                        else:
+                            self.stats["skipped"] += 1
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        service.logger.error(f"❌ 回放处理错误 [{channel}]: {e}")
+            await asyncio.sleep(0)
+        finally:
+            module.time = original_time
+            if self._out:
+                self._out.close()
+
+        wall = time.perf_counter() - wall_start
+        self.stats.update({
+            "files": len(self.files),
+            "wall_seconds": round(wall, 3),
+            "virtual_seconds": round((self.clock.now_ns - first_ns) / 1e9, 3) if first_ns else 0,
+            "messages_per_second": round(self.stats["dispatched"] / wall, 1) if wall > 0 else 0,
+            "output_sha256": self._digest.hexdigest(),
+        })
+        return self.stats
+
+
+def compare_outputs(path_a: str, path_b: str) -> dict:
+    """逐行对比两次回放的 output 流，返回首个差异"""
+    with open(path_a) as a, open(path_b) as b:
+        line_no = 0
+        for line_a, line_b in itertools.zip_longest(a, b):
+            line_no += 1
+            if line_a != line_b:
+                return {
+                    "identical": False,
+                    "line": line_no,
+                    "a": line_a.rstrip("\n") if line_a is not None else None,
+                    "b": line_b.rstrip("\n") if line_b is not None else None
+                }
+    return {"identical": True, "lines": line_no}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制的行情消息到服务回调")
+    parser.add_argument("exchange", choices=["edgex", "paradex"])
+    parser.add_argument("captures", nargs="+", help="录制目录或 .cap.gz 文件")
+    parser.add_argument("--speed", type=float, default=0, help="0=尽可能快, 1=真实节奏, N=N 倍速")
+    parser.add_argument("--output", help="把 output() 流写入该文件（JSON Lines）")
+    parser.add_argument("--compare", help="与此前一次回放的 output 文件对比（需要 --output）")
+    args = parser.parse_args()
+
+    # 参数在回放前检查，不要等整段回放跑完才报错
+    if args.compare and not args.output:
+        print("❌ --compare 需要同时指定 --output", file=sys.stderr)
+        sys.exit(1)
+    if args.compare and not os.path.isfile(args.compare):
+        print(f"❌ 对比文件不存在: {args.compare}", file=sys.stderr)
+        sys.exit(1)
+
+    files = []
+    for path in args.captures:
+        files.extend(capture_files(path, args.exchange) if os.path.isdir(path) else [path])
+    if not files:
+        print(f"❌ 没有找到 {args.exchange} 录制文件", file=sys.stderr)
+        sys.exit(1)
+
+    stats = asyncio.run(Replayer(args.exchange, files, args.speed, args.output).run())
+    if args.compare:
+        stats["compare"] = compare_outputs(args.compare, args.output)
+
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    if args.compare and not stats["compare"]["identical"]:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
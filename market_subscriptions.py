@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+运行时行情订阅
+每个消费端（stdout，或 broker 模式下的每个客户端）各自选择要收哪些市场的 price_update，以及每个市场的档位：
+    bbo    只有最优买卖价（去掉 orderbook 和 quotes）
+    top5   订单簿前 5 档
+    top    订单簿前 depth 档（subscribe 命令的 depth 参数）
+    full   服务拿到的全部档位（默认）
+同一条行情按档位分组，每种档位只编码一次，只订阅 BBO 的轻量消费端不再为整本订单簿的序列化付费。
+
+交易所侧的频道按所有消费端的需求合并：某个市场有人要订单簿档位时才订阅订单簿频道，
+最后一个消费端退订后退订交易所频道；主交易市场（服务据此下单）始终保持订阅。
+"""
+
+STDOUT = None  # stdout 消费端的订阅者标识（broker 客户端用 client_id）
+
+PROFILES = {"bbo": 0, "top5": 5, "full": None}
+
+
+def profile_depth(profile: str, depth=None):
+    """档位名 → 订单簿档数（0 为只要 BBO，None 为不截断）"""
+    if profile == "top":
+        depth = int(depth or 0)
+        if depth < 1:
+            raise ValueError("profile=top 需要 depth >= 1")
+        return depth
+    if profile not in PROFILES:
+        raise ValueError(f"未知档位: {profile}（可选 bbo / top5 / top / full）")
+    return PROFILES[profile]
+
+
+def profile_name(depth) -> str:
+    if depth is None:
+        return "full"
+    if depth == 0:
+        return "bbo"
+    return "top5" if depth == 5 else f"top{depth}"
+
+
+def shape(data: dict, depth) -> dict:
+    """按档位裁剪 price_update 的 data（返回新 dict，不修改原始数据）"""
+    if depth is None:
+        return data
+    shaped = dict(data)
+    if depth == 0:
+        shaped.pop("orderbook", None)
+        shaped.pop("quotes", None)
+        return shaped
+    orderbook = data.get("orderbook")
+    if orderbook:
+        shaped["orderbook"] = {"bids": orderbook.get("bids", [])[:depth], "asks": orderbook.get("asks", [])[:depth]}
+    return shaped
+
+
+class SubscriptionRegistry:
+    """订阅者 → {市场: 档位}，并按市场缓存分发路由"""
+
+    def __init__(self, primary: str):
+        self.primary = primary
+        self.subscribers = {STDOUT: {primary: None}}
+        self._routes = {}  # 市场 → {档位: [订阅者]}
+
+    def add_subscriber(self, subscriber):
+        """新消费端默认收主交易市场的完整行情（与不使用订阅命令时一致）"""
+        self.subscribers.setdefault(subscriber, {self.primary: None})
+        self._routes.clear()
+
+    def remove_subscriber(self, subscriber) -> list:
+        """移除消费端（broker 客户端断开），返回因此不再有人订阅的市场"""
+        markets = self.subscribers.pop(subscriber, {})
+        self._routes.clear()
+        return [market for market in markets if not self.is_wanted(market)]
+
+    def subscribe(self, subscriber, market: str, depth):
+        self.subscribers.setdefault(subscriber, {})[market] = depth
+        self._routes.clear()
+
+    def unsubscribe(self, subscriber, market: str) -> bool:
+        """退订，返回该消费端原来是否订阅了此市场"""
+        markets = self.subscribers.get(subscriber, {})
+        if market not in markets:
+            return False
+        del markets[market]
+        self._routes.clear()
+        return True
+
+    def is_wanted(self, market: str) -> bool:
+        return market == self.primary or any(market in markets for markets in self.subscribers.values())
+
+    def needs_depth(self, market: str) -> bool:
+        """是否有消费端要此市场的订单簿档位（不只是 BBO）"""
+        return any(markets.get(market, 0) != 0 for markets in self.subscribers.values())
+
+    def markets(self) -> set:
+        """交易所侧需要保持订阅的全部市场"""
+        wanted = {self.primary}
+        for markets in self.subscribers.values():
+            wanted.update(markets)
+        return wanted
+
+    def routes(self, market: str) -> dict:
+        """{档位: [订阅者]}，没有订阅者时为空"""
+        routes = self._routes.get(market)
+        if routes is None:
+            routes = {}
+            for subscriber, markets in self.subscribers.items():
+                if market in markets:
+                    routes.setdefault(markets[market], []).append(subscriber)
+            self._routes[market] = routes
+        return routes
+
+    def of(self, subscriber) -> dict:
+        return {market: profile_name(depth) for market, depth in self.subscribers.get(subscriber, {}).items()}
+
+    def snapshot(self) -> dict:
+        return {
+            "primary": self.primary,
+            "subscribers": {
+                "stdout" if subscriber is STDOUT else str(subscriber): self.of(subscriber)
+                for subscriber in self.subscribers
+            }
+        }
@@ -0,0 +1,830 @@
+#!/usr/bin/env python3
+"""
+本地模拟交易所
+实现两个服务用到的 EdgeX / Paradex REST 与 WebSocket 接口子集（下单、撤单、成交、持仓、深度、BBO、Ticker、服务器时间），
+供两个服务离线压测和端到端基准测试，不需要真实密钥。只依赖标准库。
+
+同一端口同时提供:
+    EdgeX REST      /api/v1/public/...  /api/v1/private/...
+    EdgeX WS        其余路径的 WebSocket 升级（{"type":"subscribe","channel":"ticker.10000001"}）
+    Paradex REST    /v1/...
+    Paradex WS      /v1/ws 或 /ws（JSON-RPC subscribe / auth）
+    Aster 深度      /fapi/v1/depth（EdgeX 服务的 REST 深度来源）
+    控制接口        GET /mock/stats, POST /mock/config, POST /mock/price
+
+用法:
+    python3 mock_exchange.py --port 8800 --latency-ms 20 --jitter-ms 5 --error-rate 0.01 --fill-mode cross
+
+    EDGEX_BASE_URL=http://127.0.0.1:8800 EDGEX_WS_URL=ws://127.0.0.1:8800 \\
+    EDGEX_DEPTH_URL=http://127.0.0.1:8800/fapi/v1/depth python3 edgex_trading_service.py
+
+    PARADEX_API_URL=http://127.0.0.1:8800/v1 PARADEX_WS_URL=ws://127.0.0.1:8800/v1/ws \\
+    python3 paradex_ws_service.py
+
+成交模式（--fill-mode）:
+    cross      市价单按盘口立即成交，限价单在行情穿过挂单价时成交（默认）
+    partial    同 cross，但每次最多成交剩余数量的 --partial-ratio
+    immediate  所有订单提交后立即按限价（市价单按盘口）全部成交
+    never      不成交：限价单一直挂着，市价单直接取消
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import random
+import struct
+import sys
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+HTTP_REASONS = {200: "OK", 404: "Not Found", 429: "Too Many Requests"}
+
+EDGEX_CONTRACT_ID = "10000001"
+PARADEX_MARKET = "BTC-USD-PERP"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stderr
+)
+logger = logging.getLogger("mock_exchange")
+
+
+class MockMarket:
+    """随机游走的模拟盘口（5 档）"""
+
+    def __init__(self, rng: random.Random, mid: float = 100000.0, tick: float = 0.1,
+                 spread_ticks: int = 5, volatility_bps: float = 0.5, levels: int = 5):
+        self.rng = rng
+        self.mid = mid
+        self.tick = tick
+        self.spread_ticks = spread_ticks
+        self.volatility_bps = volatility_bps  # 每个行情周期中间价的标准差（bp）
+        self.levels = levels
+        self.seq = 0
+        self.ts = int(time.time() * 1000)
+        self.bids = []
+        self.asks = []
+        self.last_price = mid
+        self._rebuild()
+
+    def _rebuild(self):
+        best_bid = round((self.mid - self.spread_ticks * self.tick / 2) / self.tick) * self.tick
+        best_ask = best_bid + self.spread_ticks * self.tick
+        self.bids = [[round(best_bid - i * self.tick, 1), round(self.rng.uniform(0.05, 2.0), 3)] for i in range(self.levels)]
+        self.asks = [[round(best_ask + i * self.tick, 1), round(self.rng.uniform(0.05, 2.0), 3)] for i in range(self.levels)]
+
+    def step(self):
+        """推进一个行情周期"""
+        self.mid *= 1 + self.rng.gauss(0, self.volatility_bps / 10000)
+        self.seq += 1
+        self.ts = int(time.time() * 1000)
+        self._rebuild()
+
+    def set_mid(self, mid: float):
+        self.mid = mid
+        self.seq += 1
+        self.ts = int(time.time() * 1000)
+        self._rebuild()
+
+    @property
+    def best_bid(self):
+        return self.bids[0][0]
+
+    @property
+    def best_ask(self):
+        return self.asks[0][0]
+
+
+class MockAccount:
+    """一个交易所账户的订单、成交和持仓（与交易所格式无关，由各接口自行格式化）"""
+
+    def __init__(self, venue: str, taker_fee: float, maker_fee: float, id_base: int):
+        self.venue = venue
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.next_id = id_base
+        self.orders = {}  # 订单ID → 订单
+        self.fills = deque(maxlen=10000)  # 最新成交在右侧
+        self.positions = {}  # 市场 → {size(带符号), avg_price, realized}
+
+    def new_id(self) -> str:
+        self.next_id += 1
+        return str(self.next_id)
+
+    def open_orders(self):
+        return [o for o in self.orders.values() if o["status"] in ("NEW", "OPEN")]
+
+    def apply_fill(self, order: dict, size: float, price: float, liquidity: str) -> dict:
+        """记录一笔成交，更新订单状态和持仓"""
+        fee_rate = self.taker_fee if liquidity == "TAKER" else self.maker_fee
+        fill = {
+            "id": self.new_id(),
+            "order_id": order["id"],
+            "market": order["market"],
+            "side": order["side"],
+            "size": size,
+            "price": price,
+            "fee": round(size * price * fee_rate, 8),
+            "liquidity": liquidity,
+            "created_at": int(time.time() * 1000),
+            "realized_pnl": 0.0
+        }
+
+        order["filled"] = round(order["filled"] + size, 8)
+        order["value"] += size * price
+        if order["filled"] >= order["size"] - 1e-12:
+            order["status"] = "CLOSED"
+            order["cancel_reason"] = ""
+        else:
+            order["status"] = "OPEN"
+
+        signed = size if order["side"] == "BUY" else -size
+        position = self.positions.setdefault(order["market"], {"size": 0.0, "avg_price": 0.0, "realized": 0.0})
+        old = position["size"]
+        new = round(old + signed, 8)
+        if old == 0 or (old > 0) == (signed > 0):
+            # 加仓：更新均价
+            position["avg_price"] = (abs(old) * position["avg_price"] + size * price) / abs(new) if new else 0.0
+        else:
+            # 减仓/反手：按均价结算已实现盈亏
+            closed = min(abs(old), size)
+            pnl = closed * (price - position["avg_price"]) * (1 if old > 0 else -1)
+            position["realized"] += pnl
+            fill["realized_pnl"] = pnl
+            if abs(signed) > abs(old):
+                position["avg_price"] = price
+            elif new == 0:
+                position["avg_price"] = 0.0
+        position["size"] = new
+
+        self.fills.append(fill)
+        return fill
+
+
+class WebSocketConnection:
+    """最小 RFC 6455 服务端连接：文本帧收发、ping/pong、关闭"""
+
+    def __init__(self, reader, writer, kind: str):
+        self.reader = reader
+        self.writer = writer
+        self.kind = kind  # edgex / paradex
+        self.channels = set()
+        self.closed = False
+
+    def send(self, message: dict):
+        if self.closed:
+            return
+        self._send_frame(0x1, json.dumps(message).encode())
+
+    def _send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        try:
+            self.writer.write(header + payload)
+        except Exception:
+            self.closed = True
+
+    async def receive(self):
+        """读取一条文本消息，连接关闭时返回 None"""
+        while True:
+            head = await self.reader.readexactly(2)
+            opcode = head[0] & 0x0F
+            masked = head[1] & 0x80
+            length = head[1] & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+            mask = await self.reader.readexactly(4) if masked else None
+            payload = await self.reader.readexactly(length)
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+            if opcode == 0x8:
+                self._send_frame(0x8, b"")
+                self.closed = True
+                return None
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode in (0x1, 0x2):
+                return payload.decode()
+
+
+class MockExchange:
+    """模拟交易所：REST/WS 路由、行情推进、成交撮合、延迟与 429 注入"""
+
+    def __init__(self, args):
+        self.latency_ms = args.latency_ms
+        self.jitter_ms = args.jitter_ms
+        self.error_rate = args.error_rate
+        self.rate_limit = args.rate_limit
+        self.rate_window = args.rate_window
+        self.fill_mode = args.fill_mode
+        self.partial_ratio = args.partial_ratio
+        self.tick_ms = args.tick_ms
+
+        self.rng = random.Random(args.seed)
+        self.market = MockMarket(self.rng, mid=args.mid, volatility_bps=args.volatility_bps)
+        self.edgex = MockAccount("edgex", taker_fee=0.00038, maker_fee=0.0, id_base=600000000000000000)
+        self.paradex = MockAccount("paradex", taker_fee=0.0003, maker_fee=0.0, id_base=1700000000000000000)
+
+        self.ws_clients = set()
+        self.private_requests = deque()  # 私有接口请求时间（滑动窗口限速）
+        self.stats = {
+            "http_requests": 0,
+            "http_429": 0,
+            "ws_connections": 0,
+            "ws_messages_sent": 0,
+            "orders": 0,
+            "fills": 0,
+            "unknown_paths": 0,
+        }
+
+    # ==================== 延迟与错误注入 ====================
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def _throttled(self, path: str) -> bool:
+        """按错误率随机注入 429；私有接口另按滑动窗口限速"""
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return True
+        if self.rate_limit and ("/private/" in path or path.startswith("/v1/orders") or path.startswith("/v1/fills")):
+            now = time.monotonic()
+            while self.private_requests and now - self.private_requests[0] > self.rate_window:
+                self.private_requests.popleft()
+            if len(self.private_requests) >= self.rate_limit:
+                return True
+            self.private_requests.append(now)
+        return False
+
+    # ==================== HTTP ====================
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._serve_websocket(reader, writer, target, headers)
+                    return
+
+                body = b""
+                if headers.get("content-length"):
+                    body = await reader.readexactly(int(headers["content-length"]))
+
+                status, payload = await self._serve_http(method, target, body)
+                data = json.dumps(payload).encode()
+                head = [
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'Error')}",
+                    "Content-Type: application/json",
+                    f"Content-Length: {len(data)}",
+                    "Connection: keep-alive"
+                ]
+                if status == 429:
+                    head.append("Retry-After: 1")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_http(self, method: str, target: str, body: bytes):
+        self.stats["http_requests"] += 1
+        url = urlsplit(target)
+        path = url.path.rstrip("/")
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            params = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            params = {}
+
+        await asyncio.sleep(self._delay())
+
+        if path.startswith("/mock/"):
+            return 200, self._serve_control(path, params)
+
+        if self._throttled(path):
+            self.stats["http_429"] += 1
+            if path.startswith("/api/"):
+                return 429, {"code": "TOO_MANY_REQUEST", "msg": "Too Many Requests"}
+            return 429, {"error": "RATE_LIMIT_EXCEEDED", "message": "Too Many Requests"}
+
+        if path.startswith("/api/v1/"):
+            result = self._serve_edgex(method, path, query, params)
+        elif path.startswith("/v1/"):
+            result = self._serve_paradex(method, path, query, params)
+        elif path == "/fapi/v1/depth":
+            result = self._aster_depth(int(query.get("limit", 5)))
+        else:
+            result = None
+
+        if result is None:
+            self.stats["unknown_paths"] += 1
+            logger.warning(f"⚠️ 未实现的接口: {method} {path}")
+            return 404, {"code": "NOT_FOUND", "msg": f"{method} {path} not implemented by mock"}
+        return 200, result
+
+    def _serve_control(self, path: str, params: dict):
+        if path == "/mock/config":
+            for key in ("latency_ms", "jitter_ms", "error_rate", "rate_limit", "rate_window", "fill_mode", "partial_ratio", "tick_ms"):
+                if key in params:
+                    setattr(self, key, params[key])
+        elif path == "/mock/price" and params.get("mid"):
+            self.market.set_mid(float(params["mid"]))
+            self._match_resting_orders()
+        return {
+            "stats": self.stats,
+            "config": {
+                "latency_ms": self.latency_ms,
+                "jitter_ms": self.jitter_ms,
+                "error_rate": self.error_rate,
+                "rate_limit": self.rate_limit,
+                "rate_window": self.rate_window,
+                "fill_mode": self.fill_mode,
+                "partial_ratio": self.partial_ratio,
+                "tick_ms": self.tick_ms
+            },
+            "market": {"mid": self.market.mid, "bid": self.market.best_bid, "ask": self.market.best_ask, "seq": self.market.seq}
+        }
+
+    # ==================== 撮合 ====================
+
+    def _submit(self, account: MockAccount, market: str, side: str, order_type: str, size: float,
+                price: float, post_only: bool = False, client_id: str = None) -> dict:
+        """提交订单：按成交模式立即成交、挂单或拒绝"""
+        self.stats["orders"] += 1
+        order = {
+            "id": account.new_id(),
+            "market": market,
+            "side": side.upper(),
+            "type": order_type.upper(),
+            "size": size,
+            "price": price,
+            "filled": 0.0,
+            "value": 0.0,
+            "status": "NEW",
+            "post_only": post_only,
+            "client_id": client_id,
+            "cancel_reason": "",
+            "created_at": int(time.time() * 1000)
+        }
+        account.orders[order["id"]] = order
+
+        touch = self.market.best_ask if order["side"] == "BUY" else self.market.best_bid
+        crosses = price <= 0 or (order["side"] == "BUY" and price >= touch) or (order["side"] == "SELL" and price <= touch)
+
+        if order["type"] == "MARKET":
+            if self.fill_mode == "never":
+                order["status"] = "CLOSED"
+                order["cancel_reason"] = "NO_LIQUIDITY"
+            else:
+                self._fill(account, order, self._fill_size(order), touch, "TAKER")
+        elif post_only and crosses:
+            order["status"] = "CLOSED"
+            order["cancel_reason"] = "POST_ONLY_WOULD_CROSS"
+        elif self.fill_mode == "immediate":
+            self._fill(account, order, order["size"], price, "TAKER" if crosses else "MAKER")
+        elif crosses and self.fill_mode in ("cross", "partial"):
+            self._fill(account, order, self._fill_size(order), touch, "TAKER")
+        else:
+            order["status"] = "OPEN"
+
+        self._notify_order(account, order)
+        return order
+
+    def _fill_size(self, order: dict) -> float:
+        remaining = round(order["size"] - order["filled"], 8)
+        if self.fill_mode == "partial":
+            return max(round(remaining * self.partial_ratio, 3), min(remaining, 0.001))
+        return remaining
+
+    def _fill(self, account: MockAccount, order: dict, size: float, price: float, liquidity: str):
+        if size <= 0:
+            return
+        fill = account.apply_fill(order, size, price, liquidity)
+        self.stats["fills"] += 1
+        if account is self.paradex:
+            self._broadcast_paradex("fills.", self._paradex_fill(fill))
+            position = self._paradex_positions(order["market"])
+            for item in position:
+                self._broadcast_paradex("positions", item)
+
+    def _cancel(self, account: MockAccount, order_id: str) -> bool:
+        order = account.orders.get(str(order_id))
+        if not order or order["status"] == "CLOSED":
+            return False
+        order["status"] = "CLOSED"
+        order["cancel_reason"] = "USER_CANCELED"
+        self._notify_order(account, order)
+        return True
+
+    def _match_resting_orders(self):
+        """行情变化后撮合挂单（限价单作为 maker 按挂单价成交）"""
+        if self.fill_mode not in ("cross", "partial"):
+            return
+        for account in (self.edgex, self.paradex):
+            for order in account.open_orders():
+                if order["type"] != "LIMIT":
+                    continue
+                if (order["side"] == "BUY" and self.market.best_ask <= order["price"]) or \
+                        (order["side"] == "SELL" and self.market.best_bid >= order["price"]):
+                    self._fill(account, order, self._fill_size(order), order["price"], "MAKER")
+                    self._notify_order(account, order)
+
+    def _notify_order(self, account: MockAccount, order: dict):
+        if account is self.paradex:
+            self._broadcast_paradex("orders.", self._paradex_order(order))
+
+    # ==================== EdgeX ====================
+
+    def _serve_edgex(self, method: str, path: str, query: dict, params: dict):
+        account = self.edgex
+        ok = lambda data: {"code": "SUCCESS", "data": data, "msg": None}
+
+        if path == "/api/v1/public/meta/getMetaData":
+            return ok({
+                "global": {"starkExChainId": "0x1", "starkExCollateralCoin": {"coinId": "1000", "coinName": "USDT"}},
+                "coinList": [{"coinId": "1000", "coinName": "USDT", "stepSize": "0.000001"}],
+                "contractList": [{
+                    "contractId": EDGEX_CONTRACT_ID, "contractName": "BTCUSD", "baseCoinId": "1001",
+                    "quoteCoinId": "1000", "tickSize": "0.1", "stepSize": "0.001", "minOrderSize": "0.001",
+                    "defaultTakerFeeRate": str(account.taker_fee), "defaultMakerFeeRate": str(account.maker_fee),
+                    "starkExSyntheticAssetId": "0x4254432d3130000000000000000000", "starkExResolution": "0x2540be400"
+                }]
+            })
+        if path == "/api/v1/public/meta/getServerTime":
+            return ok({"timeMillis": str(int(time.time() * 1000))})
+        if path in ("/api/v1/public/quote/getTicker", "/api/v1/public/quote/getTicketSummary", "/api/v1/public/quote/getQuoteSummary"):
+            return ok([self._edgex_ticker()])
+        if path == "/api/v1/public/quote/getDepth":
+            level = int(query.get("level", 5))
+            return ok([{
+                "contractId": EDGEX_CONTRACT_ID,
+                "bids": [{"price": str(p), "size": str(s)} for p, s in self.market.bids[:level]],
+                "asks": [{"price": str(p), "size": str(s)} for p, s in self.market.asks[:level]]
+            }])
+
+        if path == "/api/v1/private/order/createOrder":
+            order = self._submit(
+                account, params.get("contractId", EDGEX_CONTRACT_ID), params.get("side", "BUY"),
+                params.get("type", "LIMIT"), float(params.get("size", 0)), float(params.get("price", 0) or 0),
+                post_only=params.get("timeInForce") == "POST_ONLY" or bool(params.get("postOnly")),
+                client_id=params.get("clientOrderId")
+            )
+            if order["cancel_reason"] == "POST_ONLY_WOULD_CROSS":
+                return {"code": "ORDER_POST_ONLY_WOULD_CROSS", "msg": "post only order would cross", "data": None}
+            return ok({"orderId": order["id"]})
+        if path == "/api/v1/private/order/cancelOrderById":
+            ids = params.get("orderIdList") or [params.get("orderId")]
+            return ok({"cancelResultMap": {str(i): "SUCCESS" if self._cancel(account, i) else "ORDER_NOT_FOUND" for i in ids}})
+        if path == "/api/v1/private/order/cancelAllOrder":
+            for order in account.open_orders():
+                self._cancel(account, order["id"])
+            return ok({})
+        if path == "/api/v1/private/order/getActiveOrderPage":
+            return ok({"dataList": [self._edgex_order(o) for o in account.open_orders()], "nextPageOffsetData": ""})
+        if path in ("/api/v1/private/order/getOrderFillTransactionPage",
+                    "/api/v1/private/order/getHistoryOrderFillTransactionPage"):
+            order_ids = set(str(query.get("filterOrderIdList", "")).split(",")) - {""}
+            start = int(query.get("filterStartCreatedTimeInclusive", 0) or 0)
+            end = int(query.get("filterEndCreatedTimeExclusive", 0) or 0)
+            size = int(query.get("size", 20))
+            fills = [
+                f for f in reversed(account.fills)
+                if (not order_ids or f["order_id"] in order_ids)
+                and f["created_at"] >= start and (not end or f["created_at"] < end)
+            ][:size]
+            return ok({"dataList": [self._edgex_fill(f) for f in fills], "nextPageOffsetData": ""})
+        if path in ("/api/v1/private/account/getAccountAsset", "/api/v1/private/account/getPositionByContractId"):
+            return ok({
+                "positionList": [
+                    {"contractId": market, "openSize": str(p["size"])}
+                    for market, p in account.positions.items() if p["size"]
+                ],
+                "positionAssetList": [
+                    {"contractId": market, "avgEntryPrice": str(p["avg_price"]),
+                     "unrealizePnl": str(round(p["size"] * (self.market.mid - p["avg_price"]), 8))}
+                    for market, p in account.positions.items() if p["size"]
+                ]
+            })
+        return None
+
+    def _edgex_ticker(self):
+        return {
+            "contractId": EDGEX_CONTRACT_ID,
+            "bestBidPrice": str(self.market.best_bid),
+            "bestAskPrice": str(self.market.best_ask),
+            "lastPrice": str(self.market.last_price),
+            "markPrice": str(round(self.market.mid, 1)),
+            "indexPrice": str(round(self.market.mid, 1)),
+            "endTime": str(self.market.ts)
+        }
+
+    def _edgex_order(self, order: dict):
+        return {
+            "id": order["id"], "contractId": order["market"], "side": order["side"], "type": order["type"],
+            "size": str(order["size"]), "price": str(order["price"]), "status": order["status"],
+            "cumFillSize": str(order["filled"]), "clientOrderId": order["client_id"],
+            "createdTime": str(order["created_at"])
+        }
+
+    def _edgex_fill(self, fill: dict):
+        return {
+            "id": fill["id"], "orderId": fill["order_id"], "contractId": fill["market"],
+            "orderSide": fill["side"], "fillSize": str(fill["size"]), "fillPrice": str(fill["price"]),
+            "fillValue": str(round(fill["size"] * fill["price"], 8)), "fillFee": str(fill["fee"]),
+            "realizePnl": str(round(fill["realized_pnl"], 8)), "direction": fill["liquidity"],
+            "createdTime": str(fill["created_at"])
+        }
+
+    def _aster_depth(self, limit: int):
+        return {
+            "lastUpdateId": self.market.seq,
+            "E": self.market.ts,
+            "T": self.market.ts,
+            "bids": [[str(p), str(s)] for p, s in self.market.bids[:limit]],
+            "asks": [[str(p), str(s)] for p, s in self.market.asks[:limit]]
+        }
+
+    # ==================== Paradex ====================
+
+    def _serve_paradex(self, method: str, path: str, query: dict, params: dict):
+        account = self.paradex
+
+        if path == "/v1/system/config":
+            return {
+                "starknet_gateway_url": "http://127.0.0.1", "starknet_chain_id": "PRIVATE_SN_POTC_SEPOLIA",
+                "block_explorer_url": "", "paraclear_address": "0x0", "paraclear_decimals": 8,
+                "paraclear_account_proxy_hash": "0x0", "paraclear_account_hash": "0x0",
+                "bridged_tokens": [], "l1_core_contract_address": "0x0", "l1_operator_address": "0x0",
+                "l1_chain_id": "1", "liquidation_fee": "0.0035"
+            }
+        if path == "/v1/system/time":
+            return {"server_time": int(time.time() * 1000)}
+        if path == "/v1/auth" or path.startswith("/v1/auth/"):
+            return {"jwt_token": "mock-jwt"}
+        if path == "/v1/account":
+            return {"account": "0x0", "account_value": "100000", "free_collateral": "100000", "status": "ACTIVE"}
+        if path.startswith("/v1/orderbook/"):
+            depth = int(query.get("depth", 5))
+            return {
+                "market": path.rsplit("/", 1)[1],
+                "bids": [[str(p), str(s)] for p, s in self.market.bids[:depth]],
+                "asks": [[str(p), str(s)] for p, s in self.market.asks[:depth]],
+                "last_updated_at": self.market.ts,
+                "seq_no": self.market.seq
+            }
+        if path.startswith("/v1/bbo/"):
+            return self._paradex_bbo()
+
+        if path == "/v1/orders/batch":
+            if method == "DELETE":
+                ids = params.get("order_ids") or []
+                return {"results": [{"id": i, "status": "QUEUED_FOR_CANCELLATION" if self._cancel(account, i) else "NOT_FOUND"} for i in ids]}
+            orders = params if isinstance(params, list) else params.get("orders", [])
+            return {"orders": [self._paradex_order(self._paradex_submit(o)) for o in orders], "errors": []}
+        if path == "/v1/orders":
+            if method == "POST":
+                return self._paradex_order(self._paradex_submit(params))
+            if method == "DELETE":
+                for order in account.open_orders():
+                    self._cancel(account, order["id"])
+                return {}
+            market = query.get("market")
+            return {"results": [self._paradex_order(o) for o in account.open_orders() if not market or o["market"] == market]}
+        if path.startswith("/v1/orders/"):
+            order_id = path.rsplit("/", 1)[1]
+            if method == "DELETE":
+                return {} if self._cancel(account, order_id) else None
+            if method == "PUT":
+                order = account.orders.get(order_id)
+                if not order or order["status"] == "CLOSED":
+                    return None
+                order["price"] = float(params.get("price", order["price"]))
+                order["size"] = float(params.get("size", order["size"]))
+                self._notify_order(account, order)
+                self._match_resting_orders()
+                return self._paradex_order(order)
+            order = account.orders.get(order_id)
+            return self._paradex_order(order) if order else None
+        if path == "/v1/fills":
+            market = query.get("market")
+            page_size = int(query.get("page_size", 100))
+            start = int(query.get("start_at", 0) or 0)
+            fills = [
+                f for f in reversed(account.fills)
+                if (not market or f["market"] == market) and f["created_at"] >= start
+            ][:page_size]
+            return {"results": [self._paradex_fill(f) for f in fills]}
+        if path == "/v1/positions":
+            return {"results": self._paradex_positions()}
+        return None
+
+    def _paradex_submit(self, params: dict) -> dict:
+        return self._submit(
+            self.paradex, params.get("market", PARADEX_MARKET), params.get("side", "BUY"),
+            params.get("type", "LIMIT"), float(params.get("size", 0)), float(params.get("price", 0) or 0),
+            post_only=params.get("instruction") == "POST_ONLY", client_id=params.get("client_id")
+        )
+
+    def _paradex_bbo(self):
+        return {
+            "market": PARADEX_MARKET,
+            "bid": str(self.market.best_bid), "bid_size": str(self.market.bids[0][1]),
+            "ask": str(self.market.best_ask), "ask_size": str(self.market.asks[0][1]),
+            "last_updated_at": self.market.ts, "seq_no": self.market.seq
+        }
+
+    def _paradex_order(self, order: dict):
+        return {
+            "id": order["id"], "market": order["market"], "side": order["side"], "type": order["type"],
+            "size": str(order["size"]), "price": str(order["price"]),
+            "remaining_size": str(round(order["size"] - order["filled"], 8)),
+            "avg_fill_price": str(round(order["value"] / order["filled"], 2)) if order["filled"] else "",
+            "status": order["status"], "cancel_reason": order["cancel_reason"],
+            "instruction": "POST_ONLY" if order["post_only"] else "GTC",
+            "client_id": order["client_id"] or "", "created_at": order["created_at"],
+            "last_updated_at": int(time.time() * 1000)
+        }
+
+    def _paradex_fill(self, fill: dict):
+        return {
+            "id": fill["id"], "order_id": fill["order_id"], "market": fill["market"], "side": fill["side"],
+            "size": str(fill["size"]), "price": str(fill["price"]), "fee": str(fill["fee"]),
+            "fee_currency": "USDC", "liquidity": fill["liquidity"], "created_at": fill["created_at"],
+            "realized_pnl": str(round(fill["realized_pnl"], 8))
+        }
+
+    def _paradex_positions(self, market: str = None):
+        return [
+            {
+                "market": m, "size": str(p["size"]), "side": "LONG" if p["size"] > 0 else "SHORT",
+                "avg_entry_price": str(round(p["avg_price"], 2)),
+                "unrealized_pnl": str(round(p["size"] * (self.market.mid - p["avg_price"]), 8)),
+                "status": "OPEN" if p["size"] else "CLOSED", "last_updated_at": int(time.time() * 1000)
+            }
+            for m, p in self.paradex.positions.items() if market is None or m == market
+        ]
+
+    # ==================== WebSocket ====================
+
+    async def _serve_websocket(self, reader, writer, target: str, headers: dict):
+        accept = base64.b64encode(hashlib.sha1((headers.get("sec-websocket-key", "") + WS_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        path = urlsplit(target).path
+        kind = "paradex" if path.startswith("/v1") or path.startswith("/ws") else "edgex"
+        conn = WebSocketConnection(reader, writer, kind)
+        self.ws_clients.add(conn)
+        self.stats["ws_connections"] += 1
+        logger.info(f"🔗 WebSocket 连接 ({kind}): {path}")
+
+        try:
+            while True:
+                text = await conn.receive()
+                if text is None:
+                    break
+                try:
+                    message = json.loads(text)
+                except json.JSONDecodeError:
+                    continue
+                if kind == "edgex":
+                    self._on_edgex_ws(conn, message)
+                else:
+                    self._on_paradex_ws(conn, message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            conn.closed = True
+            self.ws_clients.discard(conn)
+            writer.close()
+
+    def _on_edgex_ws(self, conn: WebSocketConnection, message: dict):
+        msg_type = message.get("type")
+        if msg_type == "subscribe":
+            channel = message.get("channel", "")
+            conn.channels.add(channel)
+            conn.send({"type": "subscribed", "channel": channel})
+            if channel.startswith("ticker."):
+                conn.send(self._edgex_ticker_event("Snapshot"))
+        elif msg_type == "unsubscribe":
+            conn.channels.discard(message.get("channel", ""))
+        elif msg_type == "ping":
+            conn.send({"type": "pong", "time": message.get("time")})
+
+    def _on_paradex_ws(self, conn: WebSocketConnection, message: dict):
+        method = message.get("method")
+        msg_id = message.get("id")
+        if method == "auth":
+            conn.send({"jsonrpc": "2.0", "result": {}, "id": msg_id})
+        elif method == "subscribe":
+            channel = message.get("params", {}).get("channel", "")
+            conn.channels.add(channel)
+            conn.send({"jsonrpc": "2.0", "result": {"channel": channel}, "id": msg_id})
+        elif method == "unsubscribe":
+            conn.channels.discard(message.get("params", {}).get("channel", ""))
+            conn.send({"jsonrpc": "2.0", "result": {}, "id": msg_id})
+
+    def _edgex_ticker_event(self, data_type: str = "Changed"):
+        return {
+            "type": "quote-event",
+            "channel": f"ticker.{EDGEX_CONTRACT_ID}",
+            "content": {"dataType": data_type, "channel": f"ticker.{EDGEX_CONTRACT_ID}", "data": [self._edgex_ticker()]}
+        }
+
+    def _send_later(self, conn: WebSocketConnection, message: dict):
+        """按配置延迟推送（模拟交易所到本地的网络延迟）"""
+        def send():
+            conn.send(message)
+            self.stats["ws_messages_sent"] += 1
+        asyncio.get_running_loop().call_later(self._delay(), send)
+
+    def _broadcast_paradex(self, prefix: str, data: dict):
+        for conn in list(self.ws_clients):
+            if conn.kind != "paradex":
+                continue
+            for channel in conn.channels:
+                if channel.startswith(prefix):
+                    self._send_later(conn, {"jsonrpc": "2.0", "method": "subscription", "params": {"channel": channel, "data": data}})
+
+    async def run_market(self):
+        """行情推进：每个周期更新盘口、撮合挂单并推送 EdgeX Ticker / Paradex BBO、ORDER_BOOK"""
+        while True:
+            await asyncio.sleep(self.tick_ms / 1000)
+            self.market.step()
+            self._match_resting_orders()
+
+            ticker = self._edgex_ticker_event()
+            bbo = self._paradex_bbo()
+            book = {
+                "market": PARADEX_MARKET,
+                "bids": [[str(p), str(s)] for p, s in self.market.bids],
+                "asks": [[str(p), str(s)] for p, s in self.market.asks],
+                "last_updated_at": self.market.ts,
+                "seq_no": self.market.seq
+            }
+            for conn in list(self.ws_clients):
+                for channel in conn.channels:
+                    if conn.kind == "edgex" and channel.startswith("ticker."):
+                        self._send_later(conn, ticker)
+                    elif conn.kind == "paradex" and channel.startswith("bbo."):
+                        self._send_later(conn, {"jsonrpc": "2.0", "method": "subscription", "params": {"channel": channel, "data": bbo}})
+                    elif conn.kind == "paradex" and channel.startswith("order_book."):
+                        self._send_later(conn, {"jsonrpc": "2.0", "method": "subscription", "params": {"channel": channel, "data": book}})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="EdgeX / Paradex 本地模拟交易所")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency-ms", type=float, default=0, help="REST 响应和 WS 推送的平均延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="延迟抖动（均匀分布 ±jitter）")
+    parser.add_argument("--error-rate", type=float, default=0, help="随机返回 429 的概率")
+    parser.add_argument("--rate-limit", type=int, default=0, help="私有接口在 --rate-window 秒内的请求上限（0=不限）")
+    parser.add_argument("--rate-window", type=float, default=2.0)
+    parser.add_argument("--fill-mode", choices=["cross", "partial", "immediate", "never"], default="cross")
+    parser.add_argument("--partial-ratio", type=float, default=0.5)
+    parser.add_argument("--tick-ms", type=float, default=100, help="行情推进周期")
+    parser.add_argument("--mid", type=float, default=100000.0, help="初始中间价")
+    parser.add_argument("--volatility-bps", type=float, default=0.5, help="每个周期中间价的标准差（bp）")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    exchange = MockExchange(args)
+    server = await asyncio.start_server(exchange.handle_connection, args.host, args.port)
+    logger.info(f"🚀 模拟交易所已启动: http://{args.host}:{args.port} (成交模式: {args.fill_mode})")
+    async with server:
+        await asyncio.gather(server.serve_forever(), exchange.run_market())
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
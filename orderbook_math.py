@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+订单簿计算工具
+供 edgex_trading_service.py 和 paradex_ws_service.py 共用
+订单簿单边格式: [[price, size], ...]，最优价在前
+"""
+
+
+def visible_depth(levels: list, max_slippage_bps: float, max_levels: int = 5) -> float:
+    """前 max_levels 档中，价格距最优价不超过 max_slippage_bps 的挂单总量"""
+    if not levels:
+        return 0.0
+
+    top = levels[0][0]
+    limit = top * max_slippage_bps / 10000
+    return sum(size for price, size in levels[:max_levels] if abs(price - top) <= limit)
+
+
+def walk_book(levels: list, size: float):
+    """按档吃单 size 数量，返回 (成交均价, 最差成交价, 可成交数量)
+
+    可见深度不足时只统计能成交的部分，可成交数量 < size
+    """
+    remaining = size
+    value = 0.0
+    worst = 0.0
+
+    for price, level_size in levels:
+        if remaining <= 0:
+            break
+        take = min(remaining, level_size)
+        value += take * price
+        remaining -= take
+        worst = price
+
+    filled = size - max(remaining, 0.0)
+    vwap = value / filled if filled > 0 else 0.0
+    return vwap, worst, filled
+
+
+def executable_quotes(orderbook: dict, sizes: list) -> dict:
+    """计算各档数量的可成交价格
+
+    buy 吃卖盘、sell 吃买盘；slippage_bps 为成交均价相对最优价的滑点（基点）
+    返回 {"buy": [{size, vwap, worst, slippage_bps, fillable}, ...], "sell": [...]}
+    """
+    quotes = {"buy": [], "sell": []}
+    if not orderbook:
+        return quotes
+
+    for side, book_side in (("buy", "asks"), ("sell", "bids")):
+        levels = orderbook.get(book_side) or []
+        if not levels:
+            continue
+        top = levels[0][0]
+        for size in sizes:
+            vwap, worst, filled = walk_book(levels, size)
+            quotes[side].append({
+                "size": size,
+                "vwap": vwap,
+                "worst": worst,
+                "slippage_bps": abs(vwap - top) / top * 10000 if vwap > 0 and top > 0 else 0.0,
+                "fillable": filled >= size
+            })
+
+    return quotes
@@ -6,52 +6,287 @@ Paradex WebSocket 服务
 """
 
 import asyncio
+import contextlib
 import json
 import sys
 import os
-import logging
+import math
+import random
 import time
-from datetime import datetime
 
 # 添加 paradex_py 路径
 sys.path.insert(0, '/root/paradex-py')
 
 from paradex_py import ParadexSubkey
-from paradex_py.api.ws_client import ParadexWebsocketChannel
+from paradex_py.api.api_client import ParadexApiClient
+from paradex_py.api.ws_client import ParadexWebsocketChannel, ParadexWebsocketClient
 from paradex_py.environment import Environment
 
+from orderbook_math import executable_quotes, visible_depth
+from quote_arbiter import LOCAL_CLOCK, QuoteArbiter
+from feed_monitor import FeedMonitor, parse_stale_thresholds
+from ws_dedup import FirstArrivalDeduplicator
+from market_recorder import MarketRecorder
+from service_metrics import ServiceMetrics, serve_metrics
+import command_timing
+from async_logging import setup_logging
+from loop_monitor import LoopLagMonitor
+from live_profiler import LiveProfiler
+from clock_sync import ClockEstimator
+from replay_buffer import ReplayBuffer
+from service_broker import BrokerServer, current_client_id
+from market_subscriptions import STDOUT, SubscriptionRegistry, profile_depth, profile_name, shape
+
+# 输出编码器：紧凑分隔符，跳过循环引用检查（输出内容不含循环引用）
+_encode = json.JSONEncoder(separators=(",", ":"), check_circular=False).encode
+
 
 class ParadexWSService:
     """Paradex WebSocket 服务类"""
 
+    BATCH_MAX_ORDERS = 10  # Paradex /orders/batch 单次最多提交的订单数
+    MAX_LOGICAL_ORDERS = 1000  # 改单链记录上限
+    TAKER_FEE_RATE = float(os.getenv("PARADEX_TAKER_FEE_RATE", "0.0003"))  # 吃单费率，用于估算 maker 节省的手续费
+
     def __init__(self, l2_address: str, l2_private_key: str, market: str = "BTC-USD-PERP", testnet: bool = False):
         self.l2_address = l2_address
         self.l2_private_key = l2_private_key
         self.market = market
         self.env = 'testnet' if testnet else 'prod'
+        self.api_url = os.getenv("PARADEX_API_URL")
+        self.ws_url = os.getenv("PARADEX_WS_URL")
+        # 交易所时钟偏差/RTT 估计：服务器时间每 PARADEX_CLOCK_SYNC_INTERVAL 秒一次，WebSocket ping 每 PARADEX_PING_INTERVAL 秒一次
+        self.clock_sync_interval = float(os.getenv("PARADEX_CLOCK_SYNC_INTERVAL", "30"))
+        self.ping_interval = float(os.getenv("PARADEX_PING_INTERVAL", "5"))
+        self.clock = ClockEstimator()
         self.paradex = None
         self.last_price = 0
         self.orderbook = None  # 存储最新的订单簿数据
 
-        # 配置日志
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            stream=sys.stderr  # 日志输出到 stderr，避免干扰数据流
+        # 可成交价格预计算：每次订单簿更新时计算这些数量在买卖两侧的成交均价/最差价
+        self.quote_sizes = [float(x) for x in os.getenv("PARADEX_QUOTE_SIZES", "0.01,0.03,0.1").split(",") if x.strip()]
+        self.executable_quotes = None
+
+        # 盘口最优价（maker 执行据此报价），变化时唤醒等待 book_event 的执行任务
+        self.best_bid = 0
+        self.best_ask = 0
+        self.book_event = asyncio.Event()
+
+        # 行情来源仲裁：BBO / ORDER_BOOK / REST 三个来源只接受交易所时间戳更新的数据
+        self.quote_arbiter = QuoteArbiter()
+
+        # 行情源新鲜度监控：WebSocket ORDER_BOOK 正常时暂停 REST 轮询，过期时自动切换到 REST
+        self.feed_monitor = FeedMonitor(parse_stale_thresholds(
+            os.getenv("PARADEX_FEED_STALE_MS", ""), ["bbo", "orderbook", "rest"], 2000
+        ), fallbacks={"rest": "orderbook"})
+
+        # WebSocket 连接守护：断线或 BBO/ORDER_BOOK 超过阈值无消息时重连
+        self.ws_reconnect_stale_ms = int(os.getenv("PARADEX_WS_RECONNECT_STALE_MS", "15000"))
+        self.ws_connected_at = 0
+        self.reconnects = 0
+
+        # 冗余公共连接：同时开 N 条连接订阅 BBO/ORDER_BOOK/TRADES，只转发最先到达的消息
+        self.ws_connections = max(1, int(os.getenv("PARADEX_WS_CONNECTIONS", "1")))
+        self.ws_dedup = FirstArrivalDeduplicator(self.ws_connections) if self.ws_connections > 1 else None
+        self.redundant_ws_clients = {}  # 连接编号（1..N-1）→ ParadexWebsocketClient
+
+        # 已处理的成交ID（WebSocket 与重连补发去重）和最新成交时间
+        self.seen_fill_ids = {}
+        self.last_fill_ts = 0
+
+        # maker 执行中订单的 WebSocket 成交累计：标准化订单ID → {size, value, fee}
+        self.maker_fills = {}
+
+        # 改单链：逻辑订单ID → {原始订单ID, 当前订单ID, 改单次数}，以及 当前订单ID → 逻辑订单ID
+        self.logical_orders = {}
+        self.order_logical_ids = {}
+
+        # 配置日志（队列 + 后台线程写 stderr，见 async_logging.py）
+        self.logger = setup_logging("paradex")
+
+        # 原始行情录制（设置 PARADEX_RECORD_DIR 时启用）
+        record_dir = os.getenv("PARADEX_RECORD_DIR")
+        self.recorder = MarketRecorder(
+            record_dir, "paradex",
+            rotate_bytes=int(os.getenv("PARADEX_RECORD_ROTATE_MB", "64")) * 1024 * 1024,
+            logger=self.logger
+        ) if record_dir else None
+
+        # 输出序号：seq 全局递增，stream_seq 按消息类型（price_update 按市场）各自递增
+        self.output_seq = 0
+        self.stream_seq = {}
+        # 最近的非行情事件，供消费端重启后用 replay_since 补齐
+        self.replay_buffer = ReplayBuffer(int(os.getenv("PARADEX_REPLAY_BUFFER", "5000")))
+        self.stdout_closed = False
+
+        # broker 模式：设置 PARADEX_BROKER_SOCKET 时在该 Unix socket 上服务多个客户端（见 service_broker.py）
+        self.broker_socket = os.getenv("PARADEX_BROKER_SOCKET")
+        self.broker = None
+
+        # 运行时行情订阅：各消费端订阅的市场和档位（subscribe / unsubscribe 命令，见 market_subscriptions.py）
+        self.subscriptions = SubscriptionRegistry(self.market)
+        self.market_channels = {}  # 主连接上额外订阅的市场 → {频道: 交易所频道名}
+        self.market_price_ticks = {}  # 其他市场订单簿的价格聚合档位（subscribe 命令的 price_tick）
+        self.market_tops = {}  # 其他市场最新被接受的最优买卖价
+        self.subscription_lock = asyncio.Lock()
+        self.subscription_task = None
+
+        # 指标（Prometheus 文本格式）：始终采集，设置 PARADEX_METRICS_PORT 时在本机开放 /metrics
+        self.metrics = ServiceMetrics("paradex")
+        self.metrics_port = int(os.getenv("PARADEX_METRICS_PORT", "0"))
+        self.metrics_server = None
+
+        # 事件循环延迟/阻塞检测：阻塞超过阈值时抓取调用栈并推送 loop_blocked
+        self.loop_monitor = LoopLagMonitor(
+            interval=float(os.getenv("PARADEX_LOOP_LAG_INTERVAL_MS", "50")) / 1000,
+            block_threshold=float(os.getenv("PARADEX_LOOP_BLOCK_MS", "100")) / 1000,
+            on_lag=self.metrics.loop_lag.observe,
+            on_block=self._on_loop_blocked
         )
-        self.logger = logging.getLogger(__name__)
+        self.loop_monitor_task = None
+
+        # 按需性能剖析（profile 命令），结果写到 PARADEX_PROFILE_DIR（默认系统临时目录）
+        self.profiler = LiveProfiler(os.getenv("PARADEX_PROFILE_DIR"), "paradex")
+
+    def _apply_url_overrides(self, api_client=None, ws_client=None):
+        """PARADEX_API_URL / PARADEX_WS_URL 覆盖 SDK 按 env 生成的地址（压测时指向 mock_exchange.py）"""
+        if api_client is not None and self.api_url:
+            api_client.api_url = self.api_url
+        if ws_client is not None and self.ws_url:
+            ws_client.api_url = self.ws_url
+
+    @contextlib.contextmanager
+    def _sdk_url_overrides(self):
+        """在 SDK 构造期间生效的地址覆盖
+
+        ParadexSubkey 的构造函数里就会拉取 system config 并认证，构造完再改 api_url 为时已晚（仍会请求正式环境）。
+        这里临时包装客户端类的 __init__，让客户端一创建就指向覆盖地址，退出时恢复原样。
+        """
+        patched = []
+        for cls, url in ((ParadexApiClient, self.api_url), (ParadexWebsocketClient, self.ws_url)):
+            if not url:
+                continue
+            original = cls.__init__
+
+            def __init__(client, *args, _original=original, _url=url, **kwargs):
+                _original(client, *args, **kwargs)
+                client.api_url = _url
+
+            cls.__init__ = __init__
+            patched.append((cls, original))
+        try:
+            yield
+        finally:
+            for cls, original in patched:
+                cls.__init__ = original
 
     def output(self, message_type: str, data: dict):
-        """输出 JSON 消息到 stdout 供 TypeScript 读取"""
-        message = {
+        """输出 JSON 消息到 stdout 供 TypeScript 读取
+
+        信封字段：seq 为全局序号（所有消息统一从 1 递增），stream_seq 按消息类型从 1 递增（消费端据此发现缺口），
+        timestamp 为毫秒时间戳，
+        emit_mono_ns 为写出时的单调时钟纳秒；来自交易所的消息在 data 中另带
+        exchange_ts（交易所毫秒时间戳）、recv_ts 和 recv_mono_ns（本地接收时间），
+        emit_mono_ns - recv_mono_ns 即服务内处理耗时；
+        price_update 只发给订阅了该市场的消费端，按各自的档位裁剪，stream_seq 按市场递增
+        """
+        self.metrics.messages_out.inc(message_type)
+        if message_type == "command_result":
+            # 命令耗时分解（当前上下文中有正在处理的命令时）
+            timing = command_timing.current()
+            if timing is not None:
+                if timing.trace_id is not None:
+                    data["trace_id"] = timing.trace_id
+                data["timing"] = timing.breakdown()
+        self.output_seq += 1
+        seq = self.output_seq
+        if message_type == "price_update":
+            self._route_price_update(seq, data)
+            return
+        stream_seq = self.stream_seq.get(message_type, 0) + 1
+        self.stream_seq[message_type] = stream_seq
+        line = _encode({
             "type": message_type,
-            "timestamp": datetime.now().isoformat(),
+            "seq": seq,
+            "stream_seq": stream_seq,
+            "timestamp": time.time_ns() // 1_000_000,
+            "emit_mono_ns": time.monotonic_ns(),
             "data": data
-        }
-        print(json.dumps(message), flush=True)
+        })
+        self.replay_buffer.add(seq, message_type, line)
+        self._publish(message_type, line, broadcast=message_type != "command_result")
+
+    def _route_price_update(self, seq: int, data: dict):
+        """price_update 按订阅分发：同一档位的消费端共用一次编码，stream_seq 按市场递增（交易市场沿用 price_update）"""
+        market = data.get("market")
+        routes = self.subscriptions.routes(market)
+        if not routes:
+            return
+        stream_key = "price_update" if market == self.market else f"price_update:{market}"
+        stream_seq = self.stream_seq.get(stream_key, 0) + 1
+        self.stream_seq[stream_key] = stream_seq
+        timestamp = time.time_ns() // 1_000_000
+        emit_mono_ns = time.monotonic_ns()
+        for depth, subscribers in routes.items():
+            line = _encode({
+                "type": "price_update",
+                "seq": seq,
+                "stream_seq": stream_seq,
+                "timestamp": timestamp,
+                "emit_mono_ns": emit_mono_ns,
+                "data": shape(data, depth)
+            })
+            clients = [subscriber for subscriber in subscribers if subscriber is not STDOUT]
+            if clients and self.broker is not None:
+                self.broker.send_to(clients, "price_update", line)
+            if len(clients) != len(subscribers):
+                self._emit(line)
+
+    def _publish(self, message_type: str, line: str, broadcast: bool = True):
+        """分发一行输出：broker 客户端 + stdout；broadcast=False 的消息只回给发出命令的一方"""
+        if self.broker is None or self.broker.publish(message_type, line, broadcast):
+            self._emit(line)
+
+    def _emit(self, line: str):
+        """写一行到 stdout（回放时替换为收集）；stdout 已关闭（启动本服务的进程退出）后不再写入"""
+        if self.stdout_closed:
+            return
+        stdout = sys.stdout
+        try:
+            stdout.write(line + "\n")
+            stdout.flush()
+        except (BrokenPipeError, ValueError):
+            self.stdout_closed = True
+            self.logger.warning("⚠️ stdout 已关闭，之后只向 broker 客户端输出")
+
+    def replay_since(self, seq: int) -> dict:
+        """把缓冲中序号大于 seq 的事件按原样重新输出（保留原序号，消费端按 seq 去重），返回补发摘要
+
+        complete 为 False 表示 seq 之后的部分事件已被挤出缓冲，消费端仍需通过 REST 对账
+        """
+        lines, complete = self.replay_buffer.since(seq)
+        for line in lines:
+            self._publish(None, line, broadcast=False)
+        if lines:
+            self.logger.info(f"🔁 重放 seq>{seq} 的事件 {len(lines)} 条" + ("" if complete else "（缓冲不完整）"))
+        return dict(self.replay_buffer.snapshot(), since=seq, replayed=len(lines), complete=complete, latest_seq=self.output_seq)
+
+    def _update_top_of_book(self, bid: float, ask: float):
+        """更新盘口最优价，变化时唤醒所有等待 book_event 的任务"""
+        if bid == self.best_bid and ask == self.best_ask:
+            return
+        self.best_bid = bid
+        self.best_ask = ask
+        event, self.book_event = self.book_event, asyncio.Event()
+        event.set()
 
     async def on_bbo_update(self, ws_channel, message):
         """BBO (Best Bid/Offer) 价格更新回调 - 直接推送（订单簿由 REST API 提供）"""
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        self.metrics.messages_in.inc("bbo")
+        if self.recorder:
+            self.recorder.record("bbo", message)
         try:
             # 只输出一次确认消息
             if not hasattr(self, '_bbo_received'):
@@ -60,6 +295,9 @@ class ParadexWSService:
 
             params = message.get("params", {})
             data = params.get("data", {})
+            exchange_ts = int(data.get("last_updated_at") or recv_ts)
+            self.feed_monitor.record("bbo", exchange_ts, recv_ts)
+            self.metrics.ws_message_age.observe(self.clock.message_age_ms(exchange_ts, recv_ts) / 1000, "bbo")
 
             # 提取价格信息
             bid = float(data.get("bid", 0))
@@ -69,8 +307,17 @@ class ParadexWSService:
 
             # 计算中间价
             mid_price = (bid + ask) / 2 if bid > 0 and ask > 0 else 0
+            if mid_price <= 0:
+                return
+
+            # ✅ 来源仲裁：只接受交易所时间戳更新的行情
+            clock = "paradex" if data.get("last_updated_at") else LOCAL_CLOCK
+            if not self.quote_arbiter.offer(self.market, "bbo", exchange_ts, recv_ts, clock=clock):
+                return
 
-            if mid_price > 0 and mid_price != self.last_price:
+            self._update_top_of_book(bid, ask)
+
+            if mid_price != self.last_price:
                 self.last_price = mid_price
 
                 # ✅ 直接推送，订单簿由 REST API 轮询提供
@@ -82,28 +329,116 @@ class ParadexWSService:
                     "bid_size": bid_size,
                     "ask_size": ask_size,
                     "spread": ask - bid,
-                    "orderbook": self.orderbook  # REST API 提供
+                    "orderbook": self.orderbook,  # REST API 提供
+                    "quotes": self.executable_quotes,
+                    "source": "bbo",
+                    "exchange_ts": exchange_ts,
+                    "recv_ts": recv_ts,
+                    "recv_mono_ns": recv_mono_ns
                 })
 
         except Exception as e:
-            self.logger.error(f"❌ BBO处理错误: {e}", exc_info=True)
+            self.logger.error("❌ BBO处理错误: %s", e, exc_info=True, extra={"event": "bbo_update"})
+
+    def _market_callback(self, market: str, channel: str):
+        async def callback(ws_channel, message):
+            await self.on_market_update(market, channel, message)
+        return callback
+
+    async def on_market_update(self, market: str, channel: str, message: dict):
+        """运行时订阅的其他市场的 BBO / 订单簿回调：只按订阅转发，不影响交易市场的行情状态（也不录制）"""
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        self.metrics.messages_in.inc(f"market_{channel}")
+        if not self.subscriptions.routes(market):
+            return  # 已无人订阅（SDK 不支持退订时交易所仍会推送）
+        try:
+            data = message.get("params", {}).get("data", {})
+            exchange_ts = int(data.get("last_updated_at") or recv_ts)
+            clock = "paradex" if data.get("last_updated_at") else LOCAL_CLOCK
+            if channel == "bbo":
+                bid = float(data.get("bid", 0))
+                ask = float(data.get("ask", 0))
+                update = {
+                    "market": market,
+                    "bid": bid,
+                    "ask": ask,
+                    "bid_size": float(data.get("bid_size", 0)),
+                    "ask_size": float(data.get("ask_size", 0))
+                }
+            else:
+                bids = [[float(b[0]), float(b[1])] for b in data.get("bids", []) if len(b) >= 2]
+                asks = [[float(a[0]), float(a[1])] for a in data.get("asks", []) if len(a) >= 2]
+                if not bids or not asks:
+                    return
+                if not self.quote_arbiter.offer(market, channel, exchange_ts, recv_ts, kind="depth", clock=clock):
+                    return
+                bid = bids[0][0]
+                ask = asks[0][0]
+                update = {"market": market, "bid": bid, "ask": ask, "orderbook": {"bids": bids, "asks": asks}}
+
+            # 最优价与深度分开仲裁：较旧的订单簿快照只更新深度，最优价沿用最新 BBO
+            if bid <= 0 or ask <= 0:
+                return
+            if self.quote_arbiter.offer(market, channel, exchange_ts, recv_ts, clock=clock):
+                self.market_tops[market] = (bid, ask)
+            elif channel == "bbo" or market not in self.market_tops:
+                return
+            else:
+                bid, ask = self.market_tops[market]
+                update["bid"], update["ask"] = bid, ask
+            update.update({
+                "mid": (bid + ask) / 2,
+                "spread": ask - bid,
+                "source": channel,
+                "exchange_ts": exchange_ts,
+                "recv_ts": recv_ts,
+                "recv_mono_ns": recv_mono_ns
+            })
+            self.output("price_update", update)
+
+        except Exception as e:
+            self.logger.error("❌ %s 行情处理错误: %s", market, e, exc_info=True, extra={"event": "market_update"})
+
+    def _book_top(self, bids: list, asks: list, source: str, exchange_ts: int, recv_ts: int, clock: str):
+        """订单簿快照的最优价单独仲裁：比已接受的 BBO 新时更新盘口，否则返回当前盘口最优价"""
+        bid_price, ask_price = bids[0][0], asks[0][0]
+        if self.quote_arbiter.offer(self.market, source, exchange_ts, recv_ts, clock=clock):
+            self._update_top_of_book(bid_price, ask_price)
+            self.last_price = (bid_price + ask_price) / 2
+        elif self.best_bid > 0 and self.best_ask > 0:
+            bid_price, ask_price = self.best_bid, self.best_ask
+        return bid_price, ask_price
 
     async def on_trades_update(self, ws_channel, message):
         """交易数据更新回调"""
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        self.metrics.messages_in.inc("trades")
+        if self.recorder:
+            self.recorder.record("trades", message)
         try:
             params = message.get("params", {})
             data = params.get("data", {})
 
             self.output("trade_update", {
                 "market": self.market,
-                "data": data
+                "data": data,
+                "exchange_ts": self._exchange_ts(data, recv_ts),
+                "recv_ts": recv_ts,
+                "recv_mono_ns": recv_mono_ns
             })
 
         except Exception as e:
-            self.logger.error(f"❌ 交易数据处理错误: {e}")
+            self.logger.error("❌ 交易数据处理错误: %s", e, extra={"event": "trades_update"})
 
     async def on_orderbook_update(self, ws_channel, message):
         """订单簿更新回调 - WebSocket 方式"""
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        self.metrics.messages_in.inc("orderbook")
+        if self.recorder:
+            self.recorder.record("orderbook", message)
         try:
             # 只输出一次确认消息
             if not hasattr(self, '_orderbook_received'):
@@ -112,6 +447,9 @@ class ParadexWSService:
 
             params = message.get("params", {})
             data = params.get("data", {})
+            exchange_ts = int(data.get("last_updated_at") or recv_ts)
+            self.feed_monitor.record("orderbook", exchange_ts, recv_ts)
+            self.metrics.ws_message_age.observe(self.clock.message_age_ms(exchange_ts, recv_ts) / 1000, "orderbook")
 
             # 获取订单簿数据（取前5档）
             bids_raw = data.get("bids", [])[:5]
@@ -122,17 +460,21 @@ class ParadexWSService:
             asks = [[float(a[0]), float(a[1])] for a in asks_raw if len(a) >= 2]
 
             if len(bids) >= 5 and len(asks) >= 5:
+                # ✅ 来源仲裁：深度只和更早的深度快照比较（节流的快照时间戳常常不晚于最新 BBO）
+                clock = "paradex" if data.get("last_updated_at") else LOCAL_CLOCK
+                if not self.quote_arbiter.offer(self.market, "orderbook", exchange_ts, recv_ts, kind="depth", clock=clock):
+                    return
+
                 self.orderbook = {
                     "bids": bids,
                     "asks": asks
                 }
+                self.executable_quotes = executable_quotes(self.orderbook, self.quote_sizes)
 
-                # ✅ 推送实时 price_update（100ms 刷新）
-                bid_price = bids[0][0]
-                ask_price = asks[0][0]
+                # ✅ 推送实时 price_update（100ms 刷新）；快照比最新 BBO 旧时沿用 BBO 的最优价
+                bid_price, ask_price = self._book_top(bids, asks, "orderbook", exchange_ts, recv_ts, clock)
                 mid_price = (bid_price + ask_price) / 2
 
-                self.last_price = mid_price
                 self.output("price_update", {
                     "market": self.market,
                     "bid": bid_price,
@@ -140,7 +482,12 @@ class ParadexWSService:
                     "mid": mid_price,
                     "last_price": mid_price,
                     "orderbook": self.orderbook,
-                    "timestamp": int(time.time() * 1000)
+                    "quotes": self.executable_quotes,
+                    "timestamp": int(time.time() * 1000),
+                    "source": "orderbook",
+                    "exchange_ts": exchange_ts,
+                    "recv_ts": recv_ts,
+                    "recv_mono_ns": recv_mono_ns
                 })
 
                 # 仅第一次或深度变化时输出日志
@@ -149,7 +496,7 @@ class ParadexWSService:
                     self._last_bid_count_ws = len(bids)
 
         except Exception as e:
-            self.logger.error(f"❌ WebSocket 订单簿处理错误: {e}", exc_info=True)
+            self.logger.error("❌ WebSocket 订单簿处理错误: %s", e, exc_info=True, extra={"event": "orderbook_update"})
 
     async def poll_orderbook_rest(self):
         """
@@ -168,49 +515,12 @@ class ParadexWSService:
                         await asyncio.sleep(1)
                         continue
 
-                    # 使用 Paradex REST API 获取订单簿（5档更快更精准）
-                    # 正确的方法名是 fetch_orderbook (没有下划线)
-                    response = self.paradex.api_client.fetch_orderbook(self.market, params={"depth": 5})
-
-                    if response and isinstance(response, dict):
-                        bids_raw = response.get("bids", [])
-                        asks_raw = response.get("asks", [])
-
-                        # 转换格式: Paradex 格式 [["99000", "0.5"], ...] → [[99000, 0.5], ...]
-                        bids = [[float(b[0]), float(b[1])] for b in bids_raw if len(b) >= 2]
-                        asks = [[float(a[0]), float(a[1])] for a in asks_raw if len(a) >= 2]
-
-                        if len(bids) >= 3 and len(asks) >= 3:  # 至少 3 档深度
-                            self.orderbook = {
-                                "bids": bids,
-                                "asks": asks
-                            }
-                            # 仅第一次或深度变化时输出日志
-                            if len(bids) != getattr(self, '_last_bid_count', 0):
-                                self.logger.info(f"✅ REST 订单簿: {len(bids)} 档买单, {len(asks)} 档卖单")
-                                self._last_bid_count = len(bids)
-
-                            # ✅ 计算价格并推送 price_update（替代 WebSocket BBO）
-                            bid_price = bids[0][0]
-                            ask_price = asks[0][0]
-                            mid_price = (bid_price + ask_price) / 2
-
-                            # 每次都推送，确保主程序知道数据是新鲜的
-                            if mid_price > 0:
-                                self.last_price = mid_price
-                                self.output("price_update", {
-                                    "market": self.market,
-                                    "bid": bid_price,
-                                    "ask": ask_price,
-                                    "mid": mid_price,
-                                    "bid_size": bids[0][1],
-                                    "ask_size": asks[0][1],
-                                    "spread": ask_price - bid_price,
-                                    "orderbook": self.orderbook
-                                })
-                        else:
-                            self.logger.warning(f"⚠️  订单簿深度不足: {len(bids)} bids, {len(asks)} asks")
+                    # ✅ WebSocket 订单簿正常时暂停 REST 轮询
+                    if self.feed_monitor.is_fresh("orderbook", int(time.time() * 1000)):
+                        await asyncio.sleep(0.5)
+                        continue
 
+                    self._fetch_rest_orderbook()
                     await asyncio.sleep(0.5)  # 每 500ms 拉取一次（更快响应）
 
                 except Exception as e:
@@ -220,80 +530,298 @@ class ParadexWSService:
         except Exception as e:
             self.logger.error(f"❌ REST 轮询任务崩溃: {e}", exc_info=True)
 
+    def _fetch_rest_orderbook(self):
+        """通过 REST API 拉取一次订单簿快照并推送 price_update"""
+        # 使用 Paradex REST API 获取订单簿（5档更快更精准）
+        # 正确的方法名是 fetch_orderbook (没有下划线)
+        response = self.paradex.api_client.fetch_orderbook(self.market, params={"depth": 5})
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        if self.recorder:
+            self.recorder.record("rest_orderbook", response)
+        self._apply_rest_orderbook(response, recv_ts, recv_mono_ns)
+
+    def _apply_rest_orderbook(self, response, recv_ts: int, recv_mono_ns: int):
+        """处理一次 REST 订单簿快照（回放时直接调用）"""
+        self.metrics.messages_in.inc("rest_orderbook")
+        if response and isinstance(response, dict):
+            exchange_ts = int(response.get("last_updated_at") or recv_ts)
+            self.feed_monitor.record("rest", exchange_ts, recv_ts)
+
+            bids_raw = response.get("bids", [])
+            asks_raw = response.get("asks", [])
+
+            # 转换格式: Paradex 格式 [["99000", "0.5"], ...] → [[99000, 0.5], ...]
+            bids = [[float(b[0]), float(b[1])] for b in bids_raw if len(b) >= 2]
+            asks = [[float(a[0]), float(a[1])] for a in asks_raw if len(a) >= 2]
+
+            if len(bids) >= 3 and len(asks) >= 3:  # 至少 3 档深度
+                # ✅ 来源仲裁：旧的 REST 快照不能覆盖更新的 WebSocket 订单簿
+                clock = "paradex" if response.get("last_updated_at") else LOCAL_CLOCK
+                if not self.quote_arbiter.offer(self.market, "rest", exchange_ts, recv_ts, kind="depth", clock=clock):
+                    return
+
+                self.orderbook = {
+                    "bids": bids,
+                    "asks": asks
+                }
+                self.executable_quotes = executable_quotes(self.orderbook, self.quote_sizes)
+                # 仅第一次或深度变化时输出日志
+                if len(bids) != getattr(self, '_last_bid_count', 0):
+                    self.logger.info(f"✅ REST 订单簿: {len(bids)} 档买单, {len(asks)} 档卖单")
+                    self._last_bid_count = len(bids)
+
+                # ✅ 计算价格并推送 price_update（替代 WebSocket BBO）
+                bid_price, ask_price = self._book_top(bids, asks, "rest", exchange_ts, recv_ts, clock)
+                mid_price = (bid_price + ask_price) / 2
+
+                # 每次都推送，确保主程序知道数据是新鲜的
+                if mid_price > 0:
+                    self.output("price_update", {
+                        "market": self.market,
+                        "bid": bid_price,
+                        "ask": ask_price,
+                        "mid": mid_price,
+                        "bid_size": bids[0][1],
+                        "ask_size": asks[0][1],
+                        "spread": ask_price - bid_price,
+                        "orderbook": self.orderbook,
+                        "quotes": self.executable_quotes,
+                        "source": "rest",
+                        "exchange_ts": exchange_ts,
+                        "recv_ts": recv_ts,
+                        "recv_mono_ns": recv_mono_ns
+                    })
+            else:
+                self.logger.warning("⚠️  订单簿深度不足: %d bids, %d asks", len(bids), len(asks), extra={"event": "rest_orderbook"})
+
+    def _sample_server_time(self):
+        """请求一次服务器时间（在线程池中执行），返回 (服务器毫秒时间, 发送时本地毫秒时间, RTT 毫秒)"""
+        sent_ts = time.time() * 1000
+        start = time.monotonic_ns()
+        response = self.paradex.api_client.fetch_system_time()
+        rtt_ms = (time.monotonic_ns() - start) / 1e6
+        return int(response["server_time"]), sent_ts, rtt_ms
+
+    def _record_clock_sample(self, server_ts: int, sent_ts: float, rtt_ms: float):
+        first = self.clock.offset_ms is None
+        self.clock.add_server_time(server_ts, sent_ts, rtt_ms)
+        self.metrics.exchange_rtt.observe(rtt_ms / 1000, "server_time")
+        self.metrics.clock_offset.set(self.clock.offset_ms / 1000)
+        if first:
+            self.logger.info(f"🕐 交易所时钟偏差 {self.clock.offset_ms:+.1f}ms (RTT {rtt_ms:.1f}ms)")
+
+    async def sync_clock(self):
+        """定期采样服务器时间，估计时钟偏差和 RTT（启动时每秒一次连续采样几次以尽快收敛）"""
+        loop = asyncio.get_running_loop()
+        warmup = 5
+        while True:
+            try:
+                server_ts, sent_ts, rtt_ms = await loop.run_in_executor(None, self._sample_server_time)
+                self._record_clock_sample(server_ts, sent_ts, rtt_ms)
+            except Exception as e:
+                self.logger.warning(f"⚠️ 服务器时间采样失败: {e}")
+            warmup = max(0, warmup - 1)
+            await asyncio.sleep(1 if warmup else self.clock_sync_interval)
+
+    def clock_status(self):
+        """时钟偏差/RTT 估计，以及按偏差换算的当前交易所时间"""
+        now_ms = int(time.time() * 1000)
+        status = self.clock.snapshot(now_ms)
+        status["local_ts"] = now_ms
+        status["exchange_now_ts"] = int(now_ms + self.clock.offset_ms) if self.clock.offset_ms is not None else None
+        return status
+
+    async def ping_websocket(self):
+        """定期在主 WebSocket 连接上 ping，pong 往返时间作为行情链路的 RTT 样本"""
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            ws = getattr(self.paradex.ws_client, "ws", None)
+            if ws is None or getattr(ws, "closed", False):
+                continue
+            try:
+                start = time.monotonic_ns()
+                pong_waiter = await ws.ping()
+                await asyncio.wait_for(pong_waiter, timeout=5)
+                rtt_ms = (time.monotonic_ns() - start) / 1e6
+                self.clock.add_ping(rtt_ms)
+                self.metrics.exchange_rtt.observe(rtt_ms / 1000, "ws_ping")
+            except Exception as e:
+                self.logger.debug(f"WebSocket ping 失败: {e}")
+
+    def feed_status(self):
+        """各行情源的新鲜度状态；tradable 为 False 时说明所有价格来源都已过期"""
+        now_ms = int(time.time() * 1000)
+        return {
+            "feeds": self.feed_monitor.snapshot(now_ms),
+            "tradable": any(self.feed_monitor.is_fresh(feed, now_ms) for feed in self.feed_monitor.feeds),
+            "rest_polling": not self.feed_monitor.is_fresh("orderbook", now_ms),
+            "ws_connections": self.ws_dedup.snapshot() if self.ws_dedup else None,
+            "clock_offset_ms": self.clock.offset_ms
+        }
+
+    async def monitor_feeds(self):
+        """定期检查行情源新鲜度，健康状态变化时推送 feed_status"""
+        while True:
+            try:
+                changed = self.feed_monitor.check(int(time.time() * 1000))
+                if changed:
+                    status = self.feed_status()
+                    for feed in changed:
+                        if status["feeds"][feed]["healthy"]:
+                            self.logger.info(f"✅ 行情源恢复: {feed}")
+                        else:
+                            self.logger.warning(f"⚠️ 行情源过期: {feed} (超过 {status['feeds'][feed]['stale_after_ms']}ms 无消息)")
+                    self.output("feed_status", dict(status, changed=changed))
+            except Exception as e:
+                self.logger.error(f"❌ 行情源监控错误: {e}")
+
+            await asyncio.sleep(0.5)
+
+    @staticmethod
+    def _exchange_ts(data, recv_ts: int) -> int:
+        """私有频道/成交消息的交易所毫秒时间戳，消息中没有时间字段时取本地接收时间"""
+        if isinstance(data, dict):
+            return int(data.get("last_updated_at") or data.get("updated_at") or data.get("created_at") or recv_ts)
+        return recv_ts
+
     async def on_account_update(self, ws_channel, message):
         """账户更新回调（私有频道）"""
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        self.metrics.messages_in.inc("account")
+        if self.recorder:
+            self.recorder.record("account", message)
         try:
             params = message.get("params", {})
             data = params.get("data", {})
 
             self.output("account_update", {
-                "data": data
+                "data": data,
+                "exchange_ts": self._exchange_ts(data, recv_ts),
+                "recv_ts": recv_ts,
+                "recv_mono_ns": recv_mono_ns
             })
 
-            self.logger.info(f"💰 账户更新: {data}")
+            self.logger.info("💰 账户更新: %s", data, extra={"event": "account_update"})
 
         except Exception as e:
-            self.logger.error(f"❌ 账户更新处理错误: {e}")
+            self.logger.error("❌ 账户更新处理错误: %s", e, extra={"event": "account_update"})
 
     async def on_positions_update(self, ws_channel, message):
         """持仓更新回调（私有频道）"""
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        self.metrics.messages_in.inc("positions")
+        if self.recorder:
+            self.recorder.record("positions", message)
         try:
             params = message.get("params", {})
             data = params.get("data", {})
 
             self.output("positions_update", {
-                "data": data
+                "data": data,
+                "exchange_ts": self._exchange_ts(data, recv_ts),
+                "recv_ts": recv_ts,
+                "recv_mono_ns": recv_mono_ns
             })
 
-            self.logger.info(f"📊 持仓更新: {data}")
+            self.logger.info("📊 持仓更新: %s", data, extra={"event": "positions_update"})
 
         except Exception as e:
-            self.logger.error(f"❌ 持仓更新处理错误: {e}")
+            self.logger.error("❌ 持仓更新处理错误: %s", e, extra={"event": "positions_update"})
 
     async def on_orders_update(self, ws_channel, message):
         """订单更新回调（私有频道）"""
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        self.metrics.messages_in.inc("orders")
+        if self.recorder:
+            self.recorder.record("orders", message)
         try:
             params = message.get("params", {})
             data = params.get("data", {})
 
             self.output("orders_update", {
-                "data": data
+                "data": data,
+                "exchange_ts": self._exchange_ts(data, recv_ts),
+                "recv_ts": recv_ts,
+                "recv_mono_ns": recv_mono_ns
             })
 
-            self.logger.info(f"📋 订单更新: {data}")
+            if data.get("status") == "CLOSED":
+                self._forget_order(data.get("id"))
+
+            self.logger.info("📋 订单更新: %s", data, extra={"event": "orders_update"})
 
         except Exception as e:
-            self.logger.error(f"❌ 订单更新处理错误: {e}")
+            self.logger.error("❌ 订单更新处理错误: %s", e, extra={"event": "orders_update"})
 
     async def on_fills_update(self, ws_channel, message):
         """成交记录回调（私有频道）"""
+        recv_ts = int(time.time() * 1000)
+        recv_mono_ns = time.monotonic_ns()
+        self.metrics.messages_in.inc("fills")
+        if self.recorder:
+            self.recorder.record("fills", message)
         try:
             params = message.get("params", {})
             data = params.get("data", {})
+            self._handle_fill(data, recv_ts=recv_ts, recv_mono_ns=recv_mono_ns)
 
-            # 提取成交信息
-            fill_info = {
-                "id": data.get("id"),
-                "order_id": data.get("order_id"),
-                "market": data.get("market"),
-                "side": data.get("side"),
-                "size": float(data.get("size", 0)),
-                "price": float(data.get("price", 0)),
-                "fee": float(data.get("fee", 0)),
-                "fee_token": data.get("fee_token", "USDC"),
-                "liquidity": data.get("liquidity"),  # MAKER or TAKER
-                "created_at": data.get("created_at")
-            }
+        except Exception as e:
+            self.logger.error("❌ 成交记录处理错误: %s", e, extra={"event": "fills_update"})
+
+    def _handle_fill(self, data: dict, backfill: bool = False, recv_ts: int = None, recv_mono_ns: int = None):
+        """处理一条成交记录（WebSocket 推送或重连后 REST 补发），按成交ID去重；补发时接收时间取当前时间"""
+        fill_id = data.get("id")
+        if fill_id is not None:
+            if fill_id in self.seen_fill_ids:
+                return
+            self.seen_fill_ids[fill_id] = True
+            if len(self.seen_fill_ids) > 1000:
+                self.seen_fill_ids.pop(next(iter(self.seen_fill_ids)))
+        self.last_fill_ts = max(self.last_fill_ts, int(data.get("created_at") or 0))
+
+        # 提取成交信息
+        fill_info = {
+            "id": data.get("id"),
+            "order_id": data.get("order_id"),
+            "market": data.get("market"),
+            "side": data.get("side"),
+            "size": float(data.get("size", 0)),
+            "price": float(data.get("price", 0)),
+            "fee": float(data.get("fee", 0)),
+            "fee_token": data.get("fee_token", "USDC"),
+            "liquidity": data.get("liquidity"),  # MAKER or TAKER
+            "created_at": data.get("created_at")
+        }
+        if recv_ts is None:
+            recv_ts, recv_mono_ns = int(time.time() * 1000), time.monotonic_ns()
+        fill_info["exchange_ts"] = self._exchange_ts(data, recv_ts)
+        fill_info["recv_ts"] = recv_ts
+        fill_info["recv_mono_ns"] = recv_mono_ns
 
-            self.output("fill_update", fill_info)
+        if backfill:
+            fill_info["backfill"] = True
+        self.output("fill_update", fill_info)
 
-            self.logger.info(f"💰 成交记录: {fill_info['side']} {fill_info['size']} @ ${fill_info['price']} | 手续费: ${fill_info['fee']} ({fill_info['liquidity']})")
+        # maker 执行中的订单：累计成交量，供改价循环计算剩余数量
+        tracked = self.maker_fills.get(self.normalize_order_id(fill_info["order_id"]))
+        if tracked is not None:
+            tracked["size"] += fill_info["size"]
+            tracked["value"] += fill_info["size"] * fill_info["price"]
+            tracked["fee"] += fill_info["fee"]
 
-        except Exception as e:
-            self.logger.error(f"❌ 成交记录处理错误: {e}")
+        self.logger.info(f"💰 成交记录: {fill_info['side']} {fill_info['size']} @ ${fill_info['price']} | 手续费: ${fill_info['fee']} ({fill_info['liquidity']})")
+
+    async def handle_command(self, command: dict, received_at: float = None):
+        """处理来自 TypeScript 的命令
 
-    async def handle_command(self, command: dict):
-        """处理来自 TypeScript 的命令"""
+        received_at: stdin 读到命令时的 perf_counter()，用于计算排队等待；command 可带 trace_id，原样返回在 command_result 中
+        """
+        started = time.perf_counter()
+        timing_token = command_timing.begin(command.get("trace_id"), received_at)
         try:
             action = command.get("action")
             params = command.get("params", {})
@@ -309,6 +837,115 @@ class ParadexWSService:
                 })
             elif action == "cancel_order":
                 result = await self.cancel_order(params)
+                self._forget_order(params.get("order_id"))
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "create_orders":
+                result = await self.create_orders(params)
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "cancel_orders":
+                result = await self.cancel_orders(params)
+                for item in result["results"]:
+                    if item["success"]:
+                        self._forget_order(item["order_id"])
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "replace_order":
+                result = await self.replace_order(params)
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "quote_size":
+                result = await self.quote_size(params)
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "get_feed_status":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.feed_status()
+                })
+            elif action == "replay_since":
+                result = self.replay_since(int(params.get("seq", 0)))
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "get_broker_status":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.broker.snapshot() if self.broker else {"socket": None, "clients": []}
+                })
+            elif action == "subscribe":
+                result = await self.subscribe_market(params)
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "unsubscribe":
+                result = await self.unsubscribe_market(params)
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": result
+                })
+            elif action == "get_subscriptions":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.subscriptions.snapshot()
+                })
+            elif action == "get_clock":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.clock_status()
+                })
+            elif action == "get_loop_stats":
+                self.output("command_result", {
+                    "id": request_id,
+                    "action": action,
+                    "success": True,
+                    "data": self.loop_monitor.snapshot()
+                })
+            elif action == "profile":
+                result = await self.profiler.run(
+                    duration=float(params.get("duration", 10)),
+                    mode=params.get("mode", "cprofile"),
+                    interval_ms=float(params.get("interval_ms", 5)),
+                    top=int(params.get("top", 20))
+                )
+                self.logger.info(f"🔬 剖析完成: {result['path']}")
                 self.output("command_result", {
                     "id": request_id,
                     "action": action,
@@ -349,12 +986,17 @@ class ParadexWSService:
 
         except Exception as e:
             self.logger.error(f"❌ 命令处理错误: {e}", exc_info=True)
+            if "429" in str(e):
+                self.metrics.rate_limited.inc()
             self.output("command_result", {
                 "id": request_id,
                 "action": action,
                 "success": False,
                 "error": str(e)
             })
+        finally:
+            command_timing.end(timing_token)
+            self.metrics.command_duration.observe(time.perf_counter() - started, command.get("action"))
 
     def normalize_order_id(self, order_id):
         """标准化 order_id：统一转为小写无连字符字符串"""
@@ -364,8 +1006,8 @@ class ParadexWSService:
         order_id_str = str(order_id).lower().replace('-', '').replace('{', '').replace('}', '').strip()
         return order_id_str
 
-    async def create_order(self, params: dict):
-        """创建订单（市价单或限价单）"""
+    def _build_order(self, params: dict):
+        """根据命令参数构造 Paradex SDK 的 Order 对象"""
         from paradex_py.common.order import Order, OrderSide, OrderType
         from decimal import Decimal
 
@@ -397,11 +1039,31 @@ class ParadexWSService:
                 order_type=order_type,
                 order_side=order_side,
                 size=size,
-                limit_price=Decimal(str(price))
+                limit_price=Decimal(str(price)),
+                instruction="POST_ONLY" if params.get("post_only") else "GTC"
             )
 
+        return order
+
+    async def create_order(self, params: dict):
+        """创建订单（市价单或限价单）"""
+        if params.get("execution") == "maker":
+            return await self.execute_maker(params)
+        if params.get("execution") == "sliced":
+            return await self.execute_sliced(params)
+
+        market = params.get("market", self.market)
+        order_type_str = params.get("type", "MARKET").upper()
+        order = self._build_order(params)
+
         # 使用 Paradex SDK 提交订单
-        result = self.paradex.api_client.submit_order(order=order)
+        submit_time = int(time.time() * 1000)
+        ack_start = time.perf_counter()
+        try:
+            result = self.paradex.api_client.submit_order(order=order)
+        finally:
+            command_timing.record("ack", time.perf_counter() - ack_start)
+        self.metrics.order_ack.observe(time.perf_counter() - ack_start)
 
         order_id = result.get('id')
         self.logger.info(f"✅ 订单已提交: {order_id}")
@@ -409,81 +1071,483 @@ class ParadexWSService:
         # 市价单：等待5秒后查询成交记录（简化逻辑，避免频繁请求）
         if order_type_str == "MARKET" and order_id:
             self.logger.info(f"⏳ 等待 5 秒后查询成交...")
+            fill_wait_start = time.perf_counter()
 
             # ✅ 固定等待 5 秒（给订单足够时间成交）
             await asyncio.sleep(5)
 
             # ⚠️ Paradex API 不支持按 order_id 查询，只能查最近的成交
             self.logger.info(f"🔍 查询订单 {order_id} 的成交...")
-            fills = self.paradex.api_client.fetch_fills(params={
-                "market": market,
-                "page_size": 20  # 增加数量确保包含当前订单
-            })
+            fill_list = self._fetch_recent_fills(market, 20)
+            self._apply_fills(result, order_id, fill_list)
+            command_timing.record("fill_wait", time.perf_counter() - fill_wait_start)
+            self._observe_fill_confirm(result, submit_time)
+
+        return result
+
+    def _fetch_recent_fills(self, market: str, page_size: int):
+        """查询市场最近的成交记录"""
+        fills = self.paradex.api_client.fetch_fills(params={
+            "market": market,
+            "page_size": page_size  # 增加数量确保包含当前订单
+        })
+
+        if fills and fills.get("results"):
+            self.logger.info(f"✅ 查询到成交记录")
+            return fills["results"]
+
+        self.logger.warning(f"⚠️ 未找到成交记录")
+        return []
+
+    def _observe_fill_confirm(self, result: dict, submit_time: int):
+        """记录下单到确认成交的耗时（只统计查到成交记录的订单）"""
+        fill = result.get("fill") if isinstance(result, dict) else None
+        if fill and fill.get("filled") and not fill.get("reason"):
+            self.metrics.fill_confirm.observe((time.time() * 1000 - submit_time) / 1000)
+
+    def _apply_fills(self, result: dict, order_id: str, fill_list: list):
+        """从成交记录中汇总属于该订单的成交，写入 result['fill']"""
+        from decimal import Decimal
+
+        if fill_list:
+            self.logger.info(f"📋 API返回 {len(fill_list)} 条成交记录")
+
+            # ✅ 过滤：只累加当前订单的成交记录（防止累加其他订单）
+            # ⚠️ 确保类型一致：使用 normalize_order_id 统一格式
+            order_id_normalized = self.normalize_order_id(order_id)
+            current_order_fills = [f for f in fill_list if self.normalize_order_id(f.get('order_id')) == order_id_normalized]
+            self.logger.info(f"🔍 过滤后属于订单 {order_id} 的成交: {len(current_order_fills)} 条")
 
-            if fills and fills.get("results"):
-                self.logger.info(f"✅ 查询到成交记录")
+            if not current_order_fills:
+                self.logger.error(f"❌ API返回成交记录，但无当前订单的成交: order_id={order_id}")
+                result['fill'] = {'filled': False, 'reason': 'no_matching_fills'}
+                return
+
+            # 累加所有成交记录（处理拆分成交）
+            total_size = Decimal('0')
+            total_value = Decimal('0')
+            total_fee = Decimal('0')
+            liquidity = current_order_fills[0].get('liquidity')
+
+            for fill in current_order_fills:
+                size = Decimal(str(fill.get('size', 0)))
+                price = Decimal(str(fill.get('price', 0)))
+                fee = Decimal(str(fill.get('fee', 0)))
+
+                total_size += size
+                total_value += size * price
+                total_fee += fee
+
+            # 加权平均价格
+            avg_price = total_value / total_size if total_size > 0 else Decimal('0')
+
+            self.logger.info(f"✅ 订单已成交! (拆分{len(current_order_fills)}笔)")
+            self.logger.info(f"   成交价格: ${float(avg_price):.2f} (加权平均)")
+            self.logger.info(f"   成交数量: {float(total_size)}")
+            self.logger.info(f"   手续费: ${float(total_fee):.6f} (方向: {liquidity})")
+
+            # 添加成交信息到结果
+            result['fill'] = {
+                'filled': True,
+                'fillPrice': str(avg_price),
+                'fillSize': str(total_size),
+                'fillFee': str(total_fee),
+                'liquidity': liquidity,
+                'fillId': current_order_fills[0].get('id')
+            }
+        else:
+            # ⚠️ 未找到成交记录
+            if order_id:
+                # 有 order_id，说明下单成功，即使查不到成交也返回成功
+                self.logger.warning(f"⚠️ 订单未找到成交记录，但订单已提交 {order_id}，假定成功")
+                result['fill'] = {'filled': True, 'reason': 'order_submitted', 'fillPrice': '0'}
             else:
-                self.logger.warning(f"⚠️ 未找到成交记录")
-
-            if fills and fills.get("results"):
-                fill_list = fills["results"]
-                self.logger.info(f"📋 API返回 {len(fill_list)} 条成交记录")
-
-                # ✅ 过滤：只累加当前订单的成交记录（防止累加其他订单）
-                # ⚠️ 确保类型一致：使用 normalize_order_id 统一格式
-                order_id_normalized = self.normalize_order_id(order_id)
-                current_order_fills = [f for f in fill_list if self.normalize_order_id(f.get('order_id')) == order_id_normalized]
-                self.logger.info(f"🔍 过滤后属于订单 {order_id} 的成交: {len(current_order_fills)} 条")
-
-                if not current_order_fills:
-                    self.logger.error(f"❌ API返回成交记录，但无当前订单的成交: order_id={order_id}")
-                    result['fill'] = {'filled': False, 'reason': 'no_matching_fills'}
-                    return result
-
-                # 累加所有成交记录（处理拆分成交）
-                total_size = Decimal('0')
-                total_value = Decimal('0')
-                total_fee = Decimal('0')
-                liquidity = current_order_fills[0].get('liquidity')
-
-                for fill in current_order_fills:
-                    size = Decimal(str(fill.get('size', 0)))
-                    price = Decimal(str(fill.get('price', 0)))
-                    fee = Decimal(str(fill.get('fee', 0)))
-
-                    total_size += size
-                    total_value += size * price
-                    total_fee += fee
-
-                # 加权平均价格
-                avg_price = total_value / total_size if total_size > 0 else Decimal('0')
-
-                self.logger.info(f"✅ 订单已成交! (拆分{len(current_order_fills)}笔)")
-                self.logger.info(f"   成交价格: ${float(avg_price):.2f} (加权平均)")
-                self.logger.info(f"   成交数量: {float(total_size)}")
-                self.logger.info(f"   手续费: ${float(total_fee):.6f} (方向: {liquidity})")
-
-                # 添加成交信息到结果
-                result['fill'] = {
-                    'filled': True,
-                    'fillPrice': str(avg_price),
-                    'fillSize': str(total_size),
-                    'fillFee': str(total_fee),
-                    'liquidity': liquidity,
-                    'fillId': fill_list[0].get('id')
-                }
+                # 没有 order_id，真的失败了
+                self.logger.error(f"❌ 下单失败")
+                result['fill'] = {'filled': False, 'reason': 'no_order_id'}
+
+    def _maker_price(self, side: str, offset_ticks: int, tick_size: float):
+        """计算 post-only 报价：在己方最优价基础上向内让 offset_ticks 档，但不越过对手价"""
+        bid, ask = self.best_bid, self.best_ask
+        if bid <= 0 or ask <= 0:
+            return None
+
+        if side == "BUY":
+            price = min(bid + offset_ticks * tick_size, ask - tick_size)
+            price = math.floor(price / tick_size + 1e-9) * tick_size
+        else:
+            price = max(ask - offset_ticks * tick_size, bid + tick_size)
+            price = math.ceil(price / tick_size - 1e-9) * tick_size
+
+        return round(price, 10)
+
+    async def execute_maker(self, params: dict):
+        """Maker 执行：挂 post-only 限价单并随盘口变化改价，截止时间后撤单并用市价单吃掉剩余数量
+
+        可选参数: deadline_ms（默认 10000）、max_reprices（改价次数预算，默认 20）、
+        min_reprice_interval_ms（默认 200）、offset_ticks（默认 0）、tick_size（默认 0.1）、
+        min_size（默认 0.001）、taker_fallback（默认 true）
+        """
+        market = params.get("market", self.market)
+        side = params.get("side", "BUY").upper()
+        size = float(params.get("size", "0.005"))
+        deadline = time.monotonic() + float(params.get("deadline_ms", 10000)) / 1000
+        max_reprices = int(params.get("max_reprices", 20))
+        min_reprice_interval = float(params.get("min_reprice_interval_ms", 200)) / 1000
+        offset_ticks = int(params.get("offset_ticks", 0))
+        tick_size = float(params.get("tick_size", 0.1))
+        min_size = float(params.get("min_size", 0.001))
+        taker_fallback = params.get("taker_fallback", True)
+
+        price = self._maker_price(side, offset_ticks, tick_size)
+        if price is None:
+            raise ValueError("盘口数据未就绪，无法 maker 报价")
+
+        self.logger.info(f"🎯 Maker 执行: {side} {size} {market} @ {price} (截止 {params.get('deadline_ms', 10000)}ms, 改价预算 {max_reprices})")
+
+        order_params = {"market": market, "side": side, "size": str(size), "type": "LIMIT", "price": str(price), "post_only": True}
+        result = self.paradex.api_client.submit_order(order=self._build_order(order_params))
+        order_id = result.get('id')
+        if not order_id:
+            raise Exception(f"Maker 挂单失败: {result}")
+
+        order_ids = [order_id]
+        self.maker_fills[self.normalize_order_id(order_id)] = {"size": 0.0, "value": 0.0, "fee": 0.0}
+        logical_id = str(order_id)
+        reprices = 0
+        last_reprice = time.monotonic()
+
+        def filled_size():
+            return sum(self.maker_fills.get(self.normalize_order_id(o), {}).get("size", 0.0) for o in order_ids)
+
+        try:
+            while size - filled_size() >= min_size:
+                remaining_time = deadline - time.monotonic()
+                if remaining_time <= 0:
+                    break
+
+                # 等待盘口变化（或截止）
+                event = self.book_event
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=remaining_time)
+                except asyncio.TimeoutError:
+                    break
+
+                new_price = self._maker_price(side, offset_ticks, tick_size)
+                if new_price is None or new_price == price or reprices >= max_reprices:
+                    continue
+
+                # 改价节流：距上次改价不足 min_reprice_interval 时等待
+                wait_time = last_reprice + min_reprice_interval - time.monotonic()
+                if wait_time > 0:
+                    await asyncio.sleep(min(wait_time, max(0.0, deadline - time.monotonic())))
+                    new_price = self._maker_price(side, offset_ticks, tick_size)
+                    if new_price is None or new_price == price:
+                        continue
+
+                remaining = size - filled_size()
+                if remaining < min_size:
+                    break
+
+                try:
+                    replaced = await self.replace_order(dict(
+                        order_params, order_id=order_ids[-1], logical_id=logical_id,
+                        size=str(round(remaining, 8)), price=str(new_price)
+                    ))
+                except Exception as e:
+                    self.logger.warning(f"⚠️ Maker 改价失败: {e}")
+                    reprices += 1
+                    last_reprice = time.monotonic()
+                    continue
+
+                reprices += 1
+                last_reprice = time.monotonic()
+                price = new_price
+                new_order_id = replaced["order_id"]
+                if new_order_id != order_ids[-1]:
+                    order_ids.append(new_order_id)
+                    self.maker_fills.setdefault(self.normalize_order_id(new_order_id), {"size": 0.0, "value": 0.0, "fee": 0.0})
+
+            # 截止：撤掉仍在簿上的订单，并确认订单已关闭（已撤销或已成交）后才允许市价吃单，避免同一数量成交两次
+            closed = True
+            if size - filled_size() >= min_size:
+                try:
+                    await self.cancel_order({"order_id": order_ids[-1]})
+                except Exception as e:
+                    self.logger.warning(f"⚠️ Maker 撤单失败（可能已成交）: {e}")
+                closed = await self._wait_order_closed(order_ids[-1])
+        finally:
+            for o in order_ids:
+                self.maker_fills.pop(self.normalize_order_id(o), None)
+
+        # 以 REST 成交记录为准核对 maker 成交
+        normalized_ids = {self.normalize_order_id(o) for o in order_ids}
+        maker_size = maker_value = maker_fee = 0.0
+        for fill in self._fetch_recent_fills(market, 100):
+            if self.normalize_order_id(fill.get('order_id')) in normalized_ids:
+                maker_size += float(fill.get('size', 0))
+                maker_value += float(fill.get('size', 0)) * float(fill.get('price', 0))
+                maker_fee += float(fill.get('fee', 0))
+
+        taker_size = taker_value = taker_fee = 0.0
+        remaining = size - maker_size
+        if remaining >= min_size and not closed:
+            self.logger.error(f"❌ Maker 订单 {order_ids[-1]} 撤单未确认，跳过市价吃单")
+            raise Exception(
+                f"Maker 订单 {order_ids[-1]} 撤单未确认（可能仍在簿上），已跳过市价吃单；"
+                f"maker 已成交 {maker_size}，剩余 {remaining:.6f}"
+            )
+        self._forget_order(order_ids[-1])  # maker 订单已撤销或已成交，改单链结束
+        if remaining >= min_size and taker_fallback:
+            self.logger.info(f"⏰ Maker 截止，剩余 {remaining:.6f} 市价吃单")
+            taker = await self.create_order({"market": market, "side": side, "size": str(round(remaining, 8)), "type": "MARKET"})
+            fill = taker.get('fill', {})
+            if fill.get('filled') and float(fill.get('fillSize', 0) or 0) > 0:
+                taker_size = float(fill['fillSize'])
+                taker_value = taker_size * float(fill['fillPrice'])
+                taker_fee = float(fill.get('fillFee', 0))
+
+        total_size = maker_size + taker_size
+        fees_saved = maker_value * float(params.get("taker_fee_rate", self.TAKER_FEE_RATE)) - maker_fee
+        self.logger.info(f"✅ Maker 执行完成: maker {maker_size} / taker {taker_size}，改价 {reprices} 次，节省手续费 ${fees_saved:.6f}")
+
+        return {
+            "execution": "maker",
+            "logical_id": logical_id,
+            "order_ids": order_ids,
+            "reprices": reprices,
+            "maker_size": str(maker_size),
+            "maker_avg_price": str(maker_value / maker_size if maker_size > 0 else 0),
+            "maker_fee": str(maker_fee),
+            "taker_size": str(taker_size),
+            "taker_avg_price": str(taker_value / taker_size if taker_size > 0 else 0),
+            "taker_fee": str(taker_fee),
+            "fees_saved": str(fees_saved),
+            "fill": {
+                "filled": total_size > 0,
+                "fillPrice": str((maker_value + taker_value) / total_size if total_size > 0 else 0),
+                "fillSize": str(total_size),
+                "fillFee": str(maker_fee + taker_fee),
+                "liquidity": "MAKER" if taker_size == 0 else "MIXED"
+            }
+        }
+
+    async def execute_sliced(self, params: dict):
+        """分片执行（TWAP/冰山）：子单数量按对手盘可见深度决定，按固定间隔逐笔市价成交
+
+        每个子单成交后推送 execution_progress 事件（累计成交量、均价、剩余数量）
+
+        可选参数: interval_ms（子单间隔，默认 1000）、participation（子单占可见深度比例，默认 0.5）、
+        max_slippage_bps（计入可见深度的价格范围，默认 5）、max_child_size、min_size（默认 0.001）、
+        size_step（默认 0.001）、max_slices（默认 50）、max_empty_books（默认 5）、execution_id
+
+        对手盘没有可见深度（空盘口或尚未收到订单簿）时不下单，等下一个间隔；
+        连续 max_empty_books 次都没有深度则以 status="no_depth" 结束。
+        已提交但查不到成交的子单记为 unconfirmed：不算作已成交（remaining 不扣减），也不再重复下单
+        """
+        market = params.get("market", self.market)
+        side = params.get("side", "BUY").upper()
+        size = float(params.get("size", "0.005"))
+        interval = float(params.get("interval_ms", 1000)) / 1000
+        participation = float(params.get("participation", 0.5))
+        max_slippage_bps = float(params.get("max_slippage_bps", 5))
+        max_child_size = float(params.get("max_child_size", 0) or 0) or float("inf")
+        min_size = float(params.get("min_size", 0.001))
+        size_step = float(params.get("size_step", 0.001))
+        max_slices = int(params.get("max_slices", 50))
+        max_empty_books = int(params.get("max_empty_books", 5))
+        execution_id = params.get("execution_id") or f"slice-{int(time.time() * 1000)}"
+
+        # 买单吃卖盘，卖单吃买盘
+        book_side = "asks" if side == "BUY" else "bids"
+
+        self.logger.info(f"🧩 分片执行 {execution_id}: {side} {size} {market} (间隔 {interval}s, 深度占比 {participation})")
+
+        filled = 0.0
+        priced_size = 0.0  # 有成交价的数量（用于计算均价）
+        value = 0.0
+        fee = 0.0
+        unconfirmed = 0.0  # 已提交但未确认成交的数量
+        slices = 0
+        empty_books = 0
+        status = "done"
+        error = None
+        next_time = time.monotonic()
+
+        while size - filled - unconfirmed >= min_size and slices < max_slices:
+            wait_time = next_time - time.monotonic()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+            next_time = time.monotonic() + interval
+
+            remaining = size - filled - unconfirmed
+            depth = visible_depth((self.orderbook or {}).get(book_side, []), max_slippage_bps)
+            if depth <= 0:
+                empty_books += 1
+                if empty_books >= max_empty_books:
+                    self.logger.error(f"❌ 分片执行 {execution_id}: 连续 {empty_books} 次对手盘无可见深度，停止")
+                    status = "no_depth"
+                    error = f"连续 {empty_books} 次对手盘无可见深度"
+                    break
+                self.logger.warning(f"⚠️ 分片执行 {execution_id}: 对手盘无可见深度，等待下一个间隔")
+                continue
+            empty_books = 0
+            child = depth * participation
+            child = math.floor(min(child, remaining, max_child_size) / size_step + 1e-9) * size_step
+            child = round(min(max(child, min_size), remaining), 8)
+
+            try:
+                child_result = await self.create_order({"market": market, "side": side, "size": str(child), "type": "MARKET"})
+            except Exception as e:
+                self.logger.error(f"❌ 分片 {slices + 1} 下单失败: {e}")
+                status = "aborted"
+                error = str(e)
+                break
+
+            slices += 1
+            fill = child_result.get('fill', {})
+            child_filled = float(fill.get('fillSize', 0) or 0)
+            if child_filled > 0:
+                filled += child_filled
+                priced_size += child_filled
+                value += child_filled * float(fill.get('fillPrice', 0))
+                fee += float(fill.get('fillFee', 0))
+            elif fill.get('filled'):
+                # 订单已提交但未查到成交记录：记为未确认，不算作已成交，也不再为这部分数量下单
+                unconfirmed += child
+                self.logger.warning(f"⚠️ 分片 {slices} 已提交但未确认成交: {child}")
             else:
-                # ⚠️ 未找到成交记录
-                if order_id:
-                    # 有 order_id，说明下单成功，即使查不到成交也返回成功
-                    self.logger.warning(f"⚠️ 订单未找到成交记录，但订单已提交 {order_id}，假定成功")
-                    result['fill'] = {'filled': True, 'reason': 'order_submitted', 'fillPrice': '0'}
-                else:
-                    # 没有 order_id，真的失败了
-                    self.logger.error(f"❌ 下单失败")
-                    result['fill'] = {'filled': False, 'reason': 'no_order_id'}
+                self.logger.error(f"❌ 分片 {slices} 未成交: {fill.get('reason')}")
+                status = "aborted"
+                error = fill.get('reason', 'not_filled')
+                break
+
+            self.output("execution_progress", {
+                "execution_id": execution_id,
+                "execution": "sliced",
+                "market": market,
+                "side": side,
+                "slice": slices,
+                "child_size": child,
+                "visible_depth": depth,
+                "filled": filled,
+                "unconfirmed": unconfirmed,
+                "remaining": max(size - filled, 0.0),
+                "avg_price": value / priced_size if priced_size > 0 else 0,
+                "status": "running"
+            })
 
-        return result
+        if status == "done" and size - filled >= min_size:
+            status = "unconfirmed" if unconfirmed > 0 and size - filled - unconfirmed < min_size else "incomplete"
+
+        avg_price = value / priced_size if priced_size > 0 else 0
+        self.output("execution_progress", {
+            "execution_id": execution_id,
+            "execution": "sliced",
+            "market": market,
+            "side": side,
+            "slice": slices,
+            "filled": filled,
+            "unconfirmed": unconfirmed,
+            "remaining": max(size - filled, 0.0),
+            "avg_price": avg_price,
+            "status": status,
+            "error": error
+        })
+        self.logger.info(f"✅ 分片执行 {execution_id} 结束: {status}，{slices} 笔共成交 {filled} @ ${avg_price:.2f}")
+
+        return {
+            "execution": "sliced",
+            "execution_id": execution_id,
+            "status": status,
+            "error": error,
+            "slices": slices,
+            "unconfirmed": str(unconfirmed),
+            "fill": {
+                "filled": filled > 0,
+                "fillPrice": str(avg_price),
+                "fillSize": str(filled),
+                "fillFee": str(fee)
+            }
+        }
+
+    async def create_orders(self, params: dict):
+        """批量创建订单
+
+        使用 Paradex /orders/batch 端点按批提交；SDK 不支持批量接口时并发逐单提交。
+        市价单的成交记录在统一等待后一次查询取回
+        """
+        items = params.get("orders") or []
+        if not items:
+            raise ValueError("orders 不能为空")
+
+        self.logger.info(f"📦 批量创建订单: {len(items)} 笔")
+
+        if not hasattr(self.paradex.api_client, "submit_orders_batch"):
+            self.logger.warning(f"⚠️ SDK 不支持批量下单，改为并发逐单提交")
+            outcomes = await asyncio.gather(*[self.create_order(item) for item in items], return_exceptions=True)
+            return self._batch_summary([
+                {"index": i, "success": False, "error": str(o)} if isinstance(o, Exception)
+                else {"index": i, "success": True, "data": o}
+                for i, o in enumerate(outcomes)
+            ])
+
+        results = [None] * len(items)
+        submitted = []  # [(index, order)]
+        for index, item in enumerate(items):
+            try:
+                submitted.append((index, self._build_order(item)))
+            except Exception as e:
+                results[index] = {"index": index, "success": False, "error": str(e)}
+
+        # 按批提交（单批最多 BATCH_MAX_ORDERS 笔）
+        market_orders = []  # [(index, market, order_id)]
+        submit_time = int(time.time() * 1000)
+        for offset in range(0, len(submitted), self.BATCH_MAX_ORDERS):
+            chunk = submitted[offset:offset + self.BATCH_MAX_ORDERS]
+            try:
+                with command_timing.measure("ack"):
+                    ack_start = time.perf_counter()
+                    response = self.paradex.api_client.submit_orders_batch([order for _, order in chunk]) or {}
+                    self.metrics.order_ack.observe(time.perf_counter() - ack_start)
+            except Exception as e:
+                for index, _ in chunk:
+                    results[index] = {"index": index, "success": False, "error": str(e)}
+                continue
+
+            orders = response.get("orders") or []
+            errors = response.get("errors") or []
+            for position, (index, _) in enumerate(chunk):
+                error = errors[position] if position < len(errors) else None
+                data = orders[position] if position < len(orders) else None
+                if error or not data:
+                    results[index] = {"index": index, "success": False, "error": str(error or "no_order_returned")}
+                    continue
+
+                order_id = data.get('id')
+                self.logger.info(f"✅ 订单已提交: {order_id}")
+                results[index] = {"index": index, "success": True, "data": data}
+                if items[index].get("type", "MARKET").upper() == "MARKET" and order_id:
+                    market_orders.append((index, items[index].get("market", self.market), order_id))
+
+        # 市价单统一等待后一次性查询成交
+        if market_orders:
+            self.logger.info(f"⏳ 等待 5 秒后查询成交...")
+            fill_wait_start = time.perf_counter()
+            await asyncio.sleep(5)
+
+            fills_by_market = {}
+            for index, market, order_id in market_orders:
+                try:
+                    if market not in fills_by_market:
+                        fills_by_market[market] = self._fetch_recent_fills(market, min(100, 20 * len(market_orders)))
+                    self._apply_fills(results[index]["data"], order_id, fills_by_market[market])
+                    self._observe_fill_confirm(results[index]["data"], submit_time)
+                except Exception as e:
+                    self.logger.warning(f"⚠️ 查询订单 {order_id} 成交失败: {e}")
+            command_timing.record("fill_wait", time.perf_counter() - fill_wait_start)
+
+        return self._batch_summary(results)
 
     async def cancel_order(self, params: dict):
         """撤销订单"""
@@ -491,11 +1555,180 @@ class ParadexWSService:
 
         self.logger.info(f"🗑️ 撤销订单: {order_id}")
 
-        result = await self.paradex.api_client.orders.cancel(order_id)
+        with command_timing.measure("ack"):
+            result = self.paradex.api_client.cancel_order(order_id)
 
         self.logger.info(f"✅ 订单撤销成功")
         return result
 
+    async def _wait_order_closed(self, order_id, timeout: float = 3.0) -> bool:
+        """轮询订单状态，确认订单已离开订单簿（CLOSED：已撤销或已全部成交）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                order = self.paradex.api_client.fetch_order(order_id) or {}
+                if order.get("status") == "CLOSED":
+                    return True
+            except Exception as e:
+                self.logger.warning(f"⚠️ 查询订单 {order_id} 状态失败: {e}")
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.3)
+
+    async def replace_order(self, params: dict):
+        """改单（限价单重新报价）
+
+        优先使用 Paradex 原生改单端点（PUT /orders/{id}）；SDK 不支持或改单被拒时，
+        先撤旧单、撤单成功后再提交新单（撤单失败即改单失败，不会同时挂着新旧两单），
+        新旧订单作为同一个逻辑订单跟踪。side 和 size 必须提供（不沿用下单默认值）
+        """
+        order_id = params.get("order_id")
+        if not order_id:
+            raise ValueError("改单必须提供 order_id")
+        if not params.get("side") or not params.get("size"):
+            raise ValueError("改单必须提供 side 和 size")
+
+        new_params = dict(params, type="LIMIT")
+        order = self._build_order(new_params)
+        self.logger.info(f"🔁 改单: {order_id} → {new_params['side']} {new_params['size']} @ {new_params.get('price')}")
+
+        if hasattr(self.paradex.api_client, "modify_order"):
+            try:
+                result = self.paradex.api_client.modify_order(order_id=order_id, order=order)
+                new_order_id = result.get('id', order_id)
+                logical_id, revision = self._track_replacement(params, order_id, new_order_id)
+                self.logger.info(f"✅ 原生改单完成: {order_id} (逻辑订单 {logical_id} 第 {revision} 次改单)")
+                return {
+                    "logical_id": logical_id,
+                    "order_id": new_order_id,
+                    "replaced_order_id": order_id,
+                    "revision": revision,
+                    "method": "modify",
+                    "cancel_error": None,
+                    "data": result
+                }
+            except Exception as e:
+                self.logger.warning(f"⚠️ 原生改单失败: {e}，改为撤单+新单")
+
+        try:
+            await self.cancel_order({"order_id": order_id})
+        except Exception as e:
+            # 旧订单仍在簿上（或已成交）：不提交新单
+            raise Exception(f"改单失败，旧订单 {order_id} 撤销失败: {e}")
+
+        try:
+            submit_outcome = self.paradex.api_client.submit_order(order=order)
+        except Exception as e:
+            submit_outcome = e
+        if isinstance(submit_outcome, Exception) or not submit_outcome.get('id'):
+            # 旧订单已撤销，逻辑订单到此结束
+            self._forget_order(order_id)
+            raise Exception(f"改单失败，旧订单已撤销但新订单提交失败: {submit_outcome}")
+
+        new_order_id = submit_outcome.get('id')
+        cancel_error = None
+
+        logical_id, revision = self._track_replacement(params, order_id, new_order_id)
+        self.logger.info(f"✅ 改单完成: {order_id} → {new_order_id} (逻辑订单 {logical_id} 第 {revision} 次改单)")
+
+        return {
+            "logical_id": logical_id,
+            "order_id": new_order_id,
+            "replaced_order_id": order_id,
+            "revision": revision,
+            "method": "cancel_replace",
+            "cancel_error": cancel_error,
+            "data": submit_outcome
+        }
+
+    def _forget_order(self, order_id):
+        """订单进入终态（已撤销/已全部成交）后清理改单链"""
+        logical_id = self.order_logical_ids.pop(str(order_id), None)
+        if logical_id is not None and self.logical_orders.get(logical_id, {}).get("order_id") == str(order_id):
+            del self.logical_orders[logical_id]
+
+    def _track_replacement(self, params: dict, old_order_id, new_order_id):
+        """记录改单链：多次改单的订单对外始终对应同一个逻辑订单ID"""
+        old_key = str(old_order_id)
+        new_key = str(new_order_id)
+        logical_id = params.get("logical_id") or self.order_logical_ids.get(old_key) or old_key
+
+        entry = self.logical_orders.setdefault(logical_id, {"original_order_id": old_key, "order_id": old_key, "revisions": 0})
+        entry["revisions"] += 1
+        if new_key != old_key:
+            self.order_logical_ids.pop(old_key, None)
+        entry["order_id"] = new_key
+        self.order_logical_ids[new_key] = logical_id
+
+        # 没有收到终态的逻辑订单（如未经本服务确认的成交）按最早记录淘汰，防止无限增长
+        while len(self.logical_orders) > self.MAX_LOGICAL_ORDERS:
+            stale_id = next(iter(self.logical_orders))
+            self.order_logical_ids.pop(self.logical_orders.pop(stale_id)["order_id"], None)
+
+        return logical_id, entry["revisions"]
+
+    async def cancel_orders(self, params: dict):
+        """批量撤单：使用 Paradex 批量撤单端点，SDK 不支持时并发逐单撤销"""
+        order_ids = params.get("order_ids") or []
+        if not order_ids:
+            raise ValueError("order_ids 不能为空")
+
+        self.logger.info(f"🗑️ 批量撤单: {len(order_ids)} 笔")
+
+        if not hasattr(self.paradex.api_client, "cancel_orders_batch"):
+            self.logger.warning(f"⚠️ SDK 不支持批量撤单，改为并发逐单撤销")
+            outcomes = await asyncio.gather(*[self.cancel_order({"order_id": o}) for o in order_ids], return_exceptions=True)
+            return self._batch_summary([
+                {"index": i, "order_id": o, "success": False, "error": str(r)} if isinstance(r, Exception)
+                else {"index": i, "order_id": o, "success": True, "data": r}
+                for i, (o, r) in enumerate(zip(order_ids, outcomes))
+            ])
+
+        response = self.paradex.api_client.cancel_orders_batch(order_ids=order_ids) or {}
+
+        # 响应格式: {"results": [{"id": "...", "status": "...", "error": ...}, ...]}
+        by_id = {
+            self.normalize_order_id(r.get("id") or r.get("order_id")): r
+            for r in response.get("results", []) if isinstance(r, dict)
+        }
+
+        results = []
+        for index, order_id in enumerate(order_ids):
+            item = by_id.get(self.normalize_order_id(order_id))
+            if item is None:
+                # 响应中没有该订单：撤单结果未知，不能当作成功
+                results.append({"index": index, "order_id": order_id, "success": False, "error": "批量撤单响应中缺少该订单，结果未知"})
+            elif item.get("error"):
+                results.append({"index": index, "order_id": order_id, "success": False, "error": str(item["error"])})
+            else:
+                results.append({"index": index, "order_id": order_id, "success": True, "data": item})
+
+        return self._batch_summary(results)
+
+    def _batch_summary(self, results: list):
+        """汇总批量命令的逐单结果"""
+        succeeded = sum(1 for r in results if r["success"])
+        self.logger.info(f"📦 批量结果: 成功 {succeeded} / 失败 {len(results) - succeeded}")
+        return {
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded
+        }
+
+    async def quote_size(self, params: dict):
+        """按本地订单簿计算指定数量的可成交价格（成交均价、最差价、滑点）
+
+        参数: size 或 sizes（默认使用预计算的 quote_sizes）
+        """
+        if not self.orderbook:
+            raise ValueError("订单簿数据未就绪")
+
+        sizes = params.get("sizes") or ([params["size"]] if params.get("size") else None)
+        if not sizes:
+            return self.executable_quotes
+
+        return executable_quotes(self.orderbook, [float(x) for x in sizes])
+
     async def get_account(self):
         """获取账户信息"""
         result = await self.paradex.api_client.account.retrieve()
@@ -547,6 +1780,333 @@ class ParadexWSService:
             "unrealized_pnl": 0
         }
 
+    def _reconnect_delay(self, attempt: int):
+        """重连等待时间：指数退避（最长 30 秒）加随机抖动，避免多个实例同时重连"""
+        return min(30.0, 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+    async def _connect_websocket(self, max_retries: int = None):
+        """连接 WebSocket，失败时抖动退避重试；max_retries 为 None 时一直重试"""
+        attempt = 0
+        while max_retries is None or attempt < max_retries:
+            attempt += 1
+            self.logger.info(f"🔌 连接 Paradex WebSocket... (尝试 {attempt}{f'/{max_retries}' if max_retries else ''})")
+            try:
+                if await self.paradex.ws_client.connect():
+                    self.ws_connected_at = int(time.time() * 1000)
+                    self.logger.info("✅ WebSocket 连接成功")
+                    return True
+            except Exception as e:
+                self.logger.warning(f"⚠️ WebSocket 连接异常: {e}")
+
+            delay = self._reconnect_delay(attempt)
+            self.logger.warning(f"⚠️ 连接失败，{delay:.1f}秒后重试...")
+            await asyncio.sleep(delay)
+
+        return False
+
+    def _public_callback(self, handler, channel: str, conn_id: int):
+        """公共频道回调：开启冗余连接时先按交易所序号（或时间戳）去重，只处理最先到达的一份"""
+        if self.ws_dedup is None:
+            return handler
+
+        async def callback(ws_channel, message):
+            data = message.get("params", {}).get("data", {})
+            key = data.get("seq_no") or data.get("id") or data.get("last_updated_at")
+            if key is None or self.ws_dedup.accept(conn_id, (channel, key)):
+                await handler(ws_channel, message)
+
+        return callback
+
+    async def _subscribe_public(self, ws_client, conn_id: int = 0):
+        """在指定连接上订阅公共频道（BBO / ORDER_BOOK / TRADES）"""
+        # 订阅公共频道 - BBO（最佳买卖价，最实时）
+        await ws_client.subscribe(
+            ParadexWebsocketChannel.BBO,
+            callback=self._public_callback(self.on_bbo_update, "bbo", conn_id),
+            params={"market": self.market}
+        )
+
+        # ✅ 尝试 WebSocket ORDER_BOOK（5档更精准）
+        await ws_client.subscribe(
+            ParadexWebsocketChannel.ORDER_BOOK,
+            callback=self._public_callback(self.on_orderbook_update, "orderbook", conn_id),
+            params={
+                "market": self.market,
+                "depth": "5",
+                "refresh_rate": "100ms",
+                "price_tick": "1"
+            }
+        )
+
+        # 订阅成交数据（可选）
+        await ws_client.subscribe(
+            ParadexWebsocketChannel.TRADES,
+            callback=self._public_callback(self.on_trades_update, "trades", conn_id),
+            params={"market": self.market}
+        )
+
+    async def subscribe_market(self, params: dict) -> dict:
+        """subscribe 命令：为发出命令的消费端订阅市场行情
+
+        params: market（默认交易市场）、profile（bbo / top5 / top / full）、depth（profile=top 时的档数）、
+        price_tick（其他市场订单簿频道的价格聚合档位，订阅其他市场的订单簿档位时必填，同一市场只需传一次）
+        其他市场只要 bbo 时只订阅交易所 BBO 频道，有人要订单簿档位时再加订 ORDER_BOOK 频道
+        """
+        market = params.get("market") or self.market
+        primary = market == self.market
+        depth = profile_depth(params.get("profile") or ("full" if primary else "bbo"), params.get("depth"))
+        if not primary and depth != 0:
+            if params.get("price_tick"):
+                self.market_price_ticks[market] = str(params["price_tick"])
+            elif market not in self.market_price_ticks:
+                raise ValueError(f"订阅 {market} 的订单簿档位需要 price_tick 参数")
+
+        subscriber = current_client_id()
+        markets = self.subscriptions.subscribers.get(subscriber, {})
+        had, previous = market in markets, markets.get(market)
+        self.subscriptions.subscribe(subscriber, market, depth)
+        try:
+            await self._sync_market_channels()
+        except Exception:
+            # 交易所订阅失败：恢复原来的订阅
+            if had:
+                self.subscriptions.subscribe(subscriber, market, previous)
+            else:
+                self.subscriptions.unsubscribe(subscriber, market)
+            raise
+        return {
+            "market": market,
+            "profile": profile_name(depth),
+            "channels": sorted(self.market_channels.get(market, {}).values()),
+            "subscriptions": self.subscriptions.of(subscriber)
+        }
+
+    async def unsubscribe_market(self, params: dict) -> dict:
+        """unsubscribe 命令：发出命令的消费端不再接收该市场的 price_update（交易市场在交易所侧保持订阅）"""
+        market = params.get("market") or self.market
+        subscriber = current_client_id()
+        if not self.subscriptions.unsubscribe(subscriber, market):
+            raise ValueError(f"未订阅市场 {market}")
+        await self._sync_market_channels()
+        return {"market": market, "subscriptions": self.subscriptions.of(subscriber)}
+
+    def _release_subscriber(self, client_id: int):
+        """broker 客户端断开：释放它的订阅（交易所侧退订在后台进行）"""
+        if self.subscriptions.remove_subscriber(client_id):
+            self.subscription_task = asyncio.create_task(self._resync_market_channels())
+
+    async def _resync_market_channels(self):
+        try:
+            await self._sync_market_channels()
+        except Exception as e:
+            self.logger.warning(f"⚠️ 行情频道同步失败: {e}")
+
+    def _market_channel_specs(self, market: str) -> dict:
+        """某个其他市场按当前订阅需要的交易所频道：{频道: (ParadexWebsocketChannel, params)}"""
+        specs = {"bbo": (ParadexWebsocketChannel.BBO, {"market": market})}
+        if self.subscriptions.needs_depth(market):
+            params = {"market": market, "depth": "15", "refresh_rate": "100ms",
+                      "price_tick": self.market_price_ticks[market]}  # subscribe_market 已保证有 price_tick
+            specs["orderbook"] = (ParadexWebsocketChannel.ORDER_BOOK, params)
+        return specs
+
+    async def _sync_market_channels(self):
+        """让主连接上额外订阅的频道与消费端的订阅一致（交易市场的频道由 _subscribe_all 管理）
+
+        加订中途失败时退订本次已加订的频道再抛出，market_channels 与交易所侧保持一致
+        """
+        ws_client = self.paradex.ws_client if self.paradex else None
+        if ws_client is None or getattr(ws_client, "ws", None) is None:
+            return  # 连接建立后 _subscribe_all 按当前订阅补订
+        async with self.subscription_lock:
+            unsubscribe = getattr(ws_client, "unsubscribe_by_name", None)
+            wanted = {
+                market: self._market_channel_specs(market)
+                for market in self.subscriptions.markets() if market != self.market
+            }
+            added = []
+            try:
+                for market, specs in wanted.items():
+                    active = self.market_channels.setdefault(market, {})
+                    for name, (channel, params) in specs.items():
+                        if name in active:
+                            continue
+                        await ws_client.subscribe(channel, callback=self._market_callback(market, name), params=params)
+                        active[name] = channel.value.format(**params)
+                        added.append((market, name))
+                        self.logger.info(f"✅ 订阅 {active[name]}")
+            except Exception:
+                for market, name in reversed(added):
+                    channel_name = self.market_channels[market].pop(name)
+                    if unsubscribe is not None:
+                        try:
+                            await unsubscribe(channel_name)
+                        except Exception as e:
+                            self.logger.warning(f"⚠️ 回滚退订 {channel_name} 失败: {e}")
+                for market in wanted:
+                    if not self.market_channels.get(market):
+                        self.market_channels.pop(market, None)
+                raise
+
+            if unsubscribe is None:
+                return  # SDK 不支持退订：保持交易所订阅，消息在 on_market_update 中丢弃
+            for market, active in list(self.market_channels.items()):
+                for name in [name for name in active if name not in wanted.get(market, {})]:
+                    channel_name = active.pop(name)
+                    await unsubscribe(channel_name)
+                    self.logger.info(f"✅ 退订 {channel_name}")
+                if not active:
+                    del self.market_channels[market]
+
+    async def _subscribe_all(self):
+        """订阅所有公共和私有频道（启动和每次重连后调用）"""
+        await self._subscribe_public(self.paradex.ws_client)
+        self.logger.info(f"✅ 订阅 BBO 频道: {self.market}")
+        self.logger.info(f"✅ 订阅 ORDER_BOOK 频道: {self.market} (5档@100ms)")
+        self.logger.info(f"✅ 订阅 TRADES 频道: {self.market}")
+
+        # 消费端运行时订阅的其他市场（重连后按当前订阅补订）
+        self.market_channels = {}
+        await self._resync_market_channels()
+
+        # 订阅私有频道（需要认证）
+        try:
+            # 账户状态
+            await self.paradex.ws_client.subscribe(
+                ParadexWebsocketChannel.ACCOUNT,
+                callback=self.on_account_update
+            )
+            self.logger.info(f"✅ 订阅 ACCOUNT 频道")
+
+            # 持仓更新
+            await self.paradex.ws_client.subscribe(
+                ParadexWebsocketChannel.POSITIONS,
+                callback=self.on_positions_update
+            )
+            self.logger.info(f"✅ 订阅 POSITIONS 频道")
+
+            # 订单更新
+            await self.paradex.ws_client.subscribe(
+                ParadexWebsocketChannel.ORDERS,
+                callback=self.on_orders_update,
+                params={"market": self.market}
+            )
+            self.logger.info(f"✅ 订阅 ORDERS 频道")
+
+            # 成交记录更新（重要：用于捕获实际成交价和手续费）
+            await self.paradex.ws_client.subscribe(
+                ParadexWebsocketChannel.FILLS,
+                callback=self.on_fills_update,
+                params={"market": self.market}
+            )
+            self.logger.info(f"✅ 订阅 FILLS 频道（成交记录）")
+
+        except Exception as e:
+            self.logger.warning(f"⚠️ 私有频道订阅失败（可能需要充值激活账户）: {e}")
+
+    async def _ensure_redundant_connections(self):
+        """建立（或重建已断开的）冗余公共连接，只订阅公共频道"""
+        for conn_id in range(1, self.ws_connections):
+            client = self.redundant_ws_clients.get(conn_id)
+            ws = getattr(client, "ws", None) if client else None
+            if ws is not None and not getattr(ws, "closed", False):
+                continue
+
+            try:
+                if client:
+                    await client.close()
+                client = ParadexWebsocketClient(env=self.paradex.env, logger=self.logger)
+                self._apply_url_overrides(ws_client=client)
+                if await client.connect():
+                    await self._subscribe_public(client, conn_id)
+                    self.redundant_ws_clients[conn_id] = client
+                    self.logger.info(f"✅ 冗余连接 #{conn_id} 已订阅公共频道")
+            except Exception as e:
+                self.logger.warning(f"⚠️ 冗余连接 #{conn_id} 建立失败: {e}")
+
+    def _websocket_alive(self):
+        """WebSocket 连接是否正常：连接已关闭，或连接后 BBO/ORDER_BOOK 长时间无消息（静默断线）都视为中断"""
+        ws = getattr(self.paradex.ws_client, "ws", None)
+        if ws is None or getattr(ws, "closed", False):
+            return False
+
+        last_recv = max(
+            self.feed_monitor.feeds["bbo"]["last_recv_ts"],
+            self.feed_monitor.feeds["orderbook"]["last_recv_ts"],
+            self.ws_connected_at
+        )
+        return int(time.time() * 1000) - last_recv <= self.ws_reconnect_stale_ms
+
+    async def supervise_websocket(self):
+        """WebSocket 连接守护：断线后抖动退避重连，重新订阅所有频道，并通过 REST 恢复断线期间的状态"""
+        while True:
+            await asyncio.sleep(1)
+            try:
+                if self.ws_connections > 1:
+                    await self._ensure_redundant_connections()
+
+                if self._websocket_alive():
+                    continue
+
+                down_since = int(time.time() * 1000)
+                self.reconnects += 1
+                self.metrics.reconnects.inc()
+                self.logger.warning(f"⚠️ WebSocket 连接中断，开始重连 (第 {self.reconnects} 次)...")
+                self.output("ws_status", {"connected": False, "reconnects": self.reconnects})
+
+                try:
+                    await self.paradex.ws_client.close()
+                except Exception as e:
+                    self.logger.debug(f"关闭旧连接失败: {e}")
+
+                await self._connect_websocket()
+                await self._subscribe_all()
+                self._rebuild_state(down_since)
+
+                downtime_ms = int(time.time() * 1000) - down_since
+                self.logger.info(f"✅ WebSocket 已恢复，中断 {downtime_ms}ms")
+                self.output("ws_status", {"connected": True, "reconnects": self.reconnects, "downtime_ms": downtime_ms})
+
+            except Exception as e:
+                self.logger.error(f"❌ WebSocket 重连失败: {e}", exc_info=True)
+
+    def _rebuild_state(self, down_since: int):
+        """重连后恢复状态：REST 快照重建订单簿，补发断线期间遗漏的成交和当前挂单"""
+        try:
+            self._fetch_rest_orderbook()
+        except Exception as e:
+            self.logger.warning(f"⚠️ 订单簿快照拉取失败: {e}")
+
+        try:
+            since = self.last_fill_ts or down_since
+            fills = self.paradex.api_client.fetch_fills(params={
+                "market": self.market,
+                "start_at": since,
+                "page_size": 100
+            })
+            missed = [f for f in (fills or {}).get("results", []) if f.get("id") not in self.seen_fill_ids]
+            # API 按时间倒序返回，按成交顺序补发
+            for fill in reversed(missed):
+                self._handle_fill(fill, backfill=True)
+            if missed:
+                self.logger.info(f"🔁 补发断线期间成交 {len(missed)} 笔")
+        except Exception as e:
+            self.logger.warning(f"⚠️ 成交记录补发失败: {e}")
+
+        try:
+            orders = self.paradex.api_client.fetch_orders(params={"market": self.market})
+            recv_ts, recv_mono_ns = int(time.time() * 1000), time.monotonic_ns()
+            for order in (orders or {}).get("results", []):
+                self.output("orders_update", {
+                    "data": order,
+                    "backfill": True,
+                    "exchange_ts": self._exchange_ts(order, recv_ts),
+                    "recv_ts": recv_ts,
+                    "recv_mono_ns": recv_mono_ns
+                })
+        except Exception as e:
+            self.logger.warning(f"⚠️ 挂单补发失败: {e}")
+
     async def listen_stdin(self):
         """监听 stdin 接收命令"""
         loop = asyncio.get_running_loop()
@@ -556,7 +2116,7 @@ class ParadexWSService:
                 try:
                     command = json.loads(line.strip())
                     # 使用 call_soon_threadsafe 在事件循环中执行
-                    asyncio.run_coroutine_threadsafe(self.handle_command(command), loop)
+                    asyncio.run_coroutine_threadsafe(self.handle_command(command, time.perf_counter()), loop)
                 except json.JSONDecodeError as e:
                     self.logger.error(f"❌ JSON解析失败: {e}")
                 except Exception as e:
@@ -567,6 +2127,16 @@ class ParadexWSService:
         stdin_thread = threading.Thread(target=read_stdin, daemon=True)
         stdin_thread.start()
 
+    def _on_loop_blocked(self, lag: float, stack: str):
+        """事件循环阻塞超过阈值（恢复后回调）"""
+        self.metrics.loop_blocked.inc()
+        self.logger.warning(f"🐢 事件循环阻塞 {lag * 1000:.0f}ms" + (f"，阻塞位置:\n{stack}" if stack else ""))
+        self.output("loop_blocked", {
+            "blocked_ms": round(lag * 1000, 1),
+            "stack": stack,
+            "timestamp": int(time.time() * 1000)
+        })
+
     async def start(self):
         """启动 WebSocket 服务"""
         try:
@@ -575,13 +2145,33 @@ class ParadexWSService:
             self.logger.info(f"   L2地址: {self.l2_address}")
             self.logger.info(f"   市场: {self.market}")
 
-            # 初始化 Paradex (使用 SubKey 模式)
-            self.paradex = ParadexSubkey(
-                env=self.env,
-                l2_address=self.l2_address,
-                l2_private_key=self.l2_private_key,
-                logger=self.logger
-            )
+            if self.metrics_port:
+                self.metrics_server = await serve_metrics(self.metrics, "127.0.0.1", self.metrics_port)
+                self.logger.info(f"📈 指标端点: http://127.0.0.1:{self.metrics_port}/metrics")
+
+            self.loop_monitor_task = asyncio.create_task(self.loop_monitor.run())
+
+            if self.broker_socket:
+                self.broker = BrokerServer(
+                    self.broker_socket, self.handle_command, self.logger,
+                    hello=lambda: {"latest_seq": self.output_seq, "replay_buffer": self.replay_buffer.snapshot()},
+                    on_connect=self.subscriptions.add_subscriber,
+                    on_disconnect=self._release_subscriber
+                )
+                await self.broker.start()
+                self.logger.info(f"📡 broker 模式: {self.broker_socket}")
+
+            # 初始化 Paradex (使用 SubKey 模式)，地址覆盖须在构造前生效（构造函数内即拉取配置并认证）
+            with self._sdk_url_overrides():
+                self.paradex = ParadexSubkey(
+                    env=self.env,
+                    l2_address=self.l2_address,
+                    l2_private_key=self.l2_private_key,
+                    logger=self.logger
+                )
+
+            # 签名在 submit_order 内部完成，包一层计时以便从确认耗时中拆出
+            command_timing.instrument_signing(self.paradex.account, "sign_order")
 
             self.logger.info(f"✅ Paradex 初始化成功 (SubKey 模式)")
             self.logger.info(f"   L2地址: {hex(self.paradex.account.l2_address)}")
@@ -593,90 +2183,13 @@ class ParadexWSService:
                 "env": str(self.env)
             })
 
-            # 连接 WebSocket
-            is_connected = False
-            retry_count = 0
-            max_retries = 5
-
-            while not is_connected and retry_count < max_retries:
-                self.logger.info(f"🔌 连接 Paradex WebSocket... (尝试 {retry_count + 1}/{max_retries})")
-                is_connected = await self.paradex.ws_client.connect()
-
-                if not is_connected:
-                    retry_count += 1
-                    self.logger.warning(f"⚠️ 连接失败，1秒后重试...")
-                    await asyncio.sleep(1)
-
-            if not is_connected:
+            # 连接 WebSocket 并订阅所有频道
+            if not await self._connect_websocket(max_retries=5):
                 self.logger.error("❌ WebSocket 连接失败")
                 self.output("error", {"message": "WebSocket连接失败"})
                 return
 
-            self.logger.info("✅ WebSocket 连接成功")
-
-            # 订阅公共频道 - BBO（最佳买卖价，最实时）
-            await self.paradex.ws_client.subscribe(
-                ParadexWebsocketChannel.BBO,
-                callback=self.on_bbo_update,
-                params={"market": self.market}
-            )
-            self.logger.info(f"✅ 订阅 BBO 频道: {self.market}")
-
-            # ✅ 尝试 WebSocket ORDER_BOOK（5档更精准）
-            await self.paradex.ws_client.subscribe(
-                ParadexWebsocketChannel.ORDER_BOOK,
-                callback=self.on_orderbook_update,
-                params={
-                    "market": self.market,
-                    "depth": "5",
-                    "refresh_rate": "100ms",
-                    "price_tick": "1"
-                }
-            )
-            self.logger.info(f"✅ 订阅 ORDER_BOOK 频道: {self.market} (5档@100ms)")
-
-            # 订阅成交数据（可选）
-            await self.paradex.ws_client.subscribe(
-                ParadexWebsocketChannel.TRADES,
-                callback=self.on_trades_update,
-                params={"market": self.market}
-            )
-            self.logger.info(f"✅ 订阅 TRADES 频道: {self.market}")
-
-            # 订阅私有频道（需要认证）
-            try:
-                # 账户状态
-                await self.paradex.ws_client.subscribe(
-                    ParadexWebsocketChannel.ACCOUNT,
-                    callback=self.on_account_update
-                )
-                self.logger.info(f"✅ 订阅 ACCOUNT 频道")
-
-                # 持仓更新
-                await self.paradex.ws_client.subscribe(
-                    ParadexWebsocketChannel.POSITIONS,
-                    callback=self.on_positions_update
-                )
-                self.logger.info(f"✅ 订阅 POSITIONS 频道")
-
-                # 订单更新
-                await self.paradex.ws_client.subscribe(
-                    ParadexWebsocketChannel.ORDERS,
-                    callback=self.on_orders_update,
-                    params={"market": self.market}
-                )
-                self.logger.info(f"✅ 订阅 ORDERS 频道")
-
-                # 成交记录更新（重要：用于捕获实际成交价和手续费）
-                await self.paradex.ws_client.subscribe(
-                    ParadexWebsocketChannel.FILLS,
-                    callback=self.on_fills_update,
-                    params={"market": self.market}
-                )
-                self.logger.info(f"✅ 订阅 FILLS 频道（成交记录）")
-
-            except Exception as e:
-                self.logger.warning(f"⚠️ 私有频道订阅失败（可能需要充值激活账户）: {e}")
+            await self._subscribe_all()
 
             self.logger.info("🎯 所有频道订阅完成，开始监听数据...")
 
@@ -685,10 +2198,20 @@ class ParadexWSService:
             # 启动 stdin 监听
             stdin_task = asyncio.create_task(self.listen_stdin())
 
-            # ✅ 启用 REST 轮询（WebSocket orderbook回调未触发）
+            # ✅ REST 轮询作为 WebSocket 订单簿过期时的备用来源
             poll_task = asyncio.create_task(self.poll_orderbook_rest())
 
-            await asyncio.gather(poll_task, stdin_task)
+            # 行情源新鲜度监控
+            monitor_task = asyncio.create_task(self.monitor_feeds())
+
+            # WebSocket 连接守护（断线自动重连）
+            supervise_task = asyncio.create_task(self.supervise_websocket())
+
+            # 交易所时钟偏差/RTT 估计
+            clock_task = asyncio.create_task(self.sync_clock())
+            ping_task = asyncio.create_task(self.ping_websocket())
+
+            await asyncio.gather(poll_task, stdin_task, monitor_task, supervise_task, clock_task, ping_task)
 
         except KeyboardInterrupt:
             self.logger.info("⚠️ 收到中断信号，正在关闭...")
@@ -696,6 +2219,15 @@ class ParadexWSService:
         except Exception as e:
             self.logger.error(f"❌ 服务错误: {e}", exc_info=True)
             self.output("error", {"message": str(e)})
+        finally:
+            if self.loop_monitor_task:
+                self.loop_monitor_task.cancel()
+            if self.broker:
+                self.broker.close()
+            if self.recorder:
+                self.recorder.close()
+            if self.metrics_server:
+                self.metrics_server.close()
 
 
 async def main():
@@ -721,5 +2253,5 @@ if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print(json.dumps({"type": "shutdown", "timestamp": datetime.now().isoformat()}), flush=True)
+        print(_encode({"type": "shutdown", "timestamp": time.time_ns() // 1_000_000}), flush=True)
         sys.exit(0)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+行情来源仲裁
+同一市场的行情可能来自多个来源（WebSocket BBO / 订单簿 / Ticker / REST 轮询），
+避免旧的 REST 快照覆盖更新的 WebSocket 报价。
+
+盘口最优价（top）和订单簿深度（depth）分开仲裁：100ms 节流的订单簿快照时间戳常常不晚于最新 BBO，
+不能因此丢弃深度；反过来，较旧的深度快照也不能回退最优价。
+
+时间戳只在同一时钟内比较（clock 参数：同一交易所的 WebSocket 和 REST 共用交易所时钟，
+其他交易所的深度源用自己的时钟，没有交易所时间戳的消息为 "local"）。
+不同时钟的来源之间不比较时间戳：当前来源超过 takeover_ms 没有被接受的行情时，才由另一时钟的来源接管。
+"""
+
+LOCAL_CLOCK = "local"  # 消息没有交易所时间戳，exchange_ts 只是本地接收时间
+
+
+class QuoteArbiter:
+    """按 (市场, 类别) 记录最新被接受的行情，并统计各来源的接受/丢弃次数"""
+
+    def __init__(self, takeover_ms: int = 1000):
+        self.takeover_ms = takeover_ms
+        self._latest = {}  # (market, kind) → {"source", "clock", "exchange_ts", "recv_ts"}
+        self.stats = {}  # "source/kind" → {"accepted": n, "rejected": n}
+
+    def offer(self, market: str, source: str, exchange_ts: int, recv_ts: int,
+              kind: str = "top", clock: str = "exchange") -> bool:
+        """提交一条行情，比已接受的同类行情更新时返回 True
+
+        kind: "top"（最优买卖价）或 "depth"（订单簿深度）
+        只在事件循环中调用（单写入方），无需加锁
+        """
+        stats = self.stats.setdefault(f"{source}/{kind}", {"accepted": 0, "rejected": 0})
+        key = (market, kind)
+        latest = self._latest.get(key)
+
+        if latest is not None:
+            if clock == latest["clock"]:
+                # 同一时钟：交易所时间戳必须严格更新（本地时钟的消息按到达顺序接受）
+                stale = clock != LOCAL_CLOCK and exchange_ts <= latest["exchange_ts"]
+            else:
+                # 不同时钟：只比较本地接收时间，当前来源安静超过 takeover_ms 才接管
+                stale = recv_ts - latest["recv_ts"] < self.takeover_ms
+            if stale:
+                stats["rejected"] += 1
+                return False
+
+        self._latest[key] = {"source": source, "clock": clock, "exchange_ts": exchange_ts, "recv_ts": recv_ts}
+        stats["accepted"] += 1
+        return True
+
+    def latest(self, market: str, kind: str = "top"):
+        """返回该市场该类别最新被接受的行情来源信息"""
+        return self._latest.get((market, kind))
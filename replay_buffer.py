@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+输出重放缓冲
+保存最近的非行情事件（成交、订单、持仓、账户、状态等）已编码的输出行及其全局序号，
+消费端重启或落后时用 replay_since 命令从自己最后处理的序号补齐，不需要再查 REST。
+
+行情类消息（price_update / trade_update）很快过时且量大，不进缓冲；
+command_result 只对发出命令的那个消费端实例有意义，也不进缓冲。
+"""
+
+import collections
+
+EXCLUDED_TYPES = frozenset(("price_update", "trade_update", "command_result"))
+
+
+class ReplayBuffer:
+    """按全局序号保存输出行的有界环形缓冲"""
+
+    def __init__(self, capacity: int = 5000):
+        self.capacity = capacity
+        self._ring = collections.deque(maxlen=capacity)  # (序号, 输出行)
+        self.evicted_seq = 0  # 已被挤出缓冲的最大序号
+
+    def add(self, seq: int, message_type: str, line: str):
+        if message_type in EXCLUDED_TYPES:
+            return
+        if not self.capacity:
+            self.evicted_seq = seq  # 缓冲已关闭：事件不保存，since 不能报告完整
+            return
+        if len(self._ring) == self.capacity:
+            self.evicted_seq = self._ring[0][0]
+        self._ring.append((seq, line))
+
+    def since(self, seq: int):
+        """序号大于 seq 的事件行，以及缓冲是否完整覆盖了 seq 之后的全部事件"""
+        lines = [line for s, line in self._ring if s > seq]
+        return lines, seq >= self.evicted_seq
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "size": len(self._ring),
+            "oldest_seq": self._ring[0][0] if self._ring else None,
+            "newest_seq": self._ring[-1][0] if self._ring else None,
+            "evicted_seq": self.evicted_seq
+        }
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+本地 pub/sub broker
+设置 EDGEX_BROKER_SOCKET / PARADEX_BROKER_SOCKET 时，服务在该 Unix socket 上同时服务多个客户端：
+每个客户端按行发送与 stdin 相同格式的 JSON 命令，按行收到与 stdout 相同格式的消息。
+    - 行情和事件消息广播给所有客户端（以及 stdout）
+    - command_result 和 replay_since 补发的事件只发给发出该命令的客户端
+    - price_update 按各客户端的行情订阅（subscribe / unsubscribe 命令，见 market_subscriptions.py）定向发送
+多个机器人共用一组 WebSocket 连接、一次 REST 轮询和同一个账户的请求限速，增加机器人不会成倍增加 API 负载。
+
+客户端跟不上时：写缓冲超过 max_buffer 后丢弃该客户端的行情消息（事件消息照发），
+超过 4 倍 max_buffer 时断开该客户端（重连后可用 replay_since 补齐事件）。
+
+启动阶段只输出一次的状态消息（connected、ready）和最新一条 ws_status 会被缓存，
+服务启动之后才连上的客户端在 broker_hello 之后立即收到它们，等待 ready / connected 的程序不会一直卡住。
+
+原来直接启动服务的程序不用改代码，改为启动桥接进程即可（stdin 关闭时桥接进程半关闭 socket）:
+    python3 service_broker.py /tmp/edgex.sock
+"""
+
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+# 当前命令来自哪个客户端（命令协程及其创建的任务继承此上下文）
+_client = contextvars.ContextVar("broker_client", default=None)
+
+MARKET_DATA_TYPES = frozenset(("price_update", "trade_update"))
+STATUS_TYPES = ("connected", "ready", "ws_status")  # 新客户端连上时补发的状态消息（按此顺序，各保留最新一条）
+
+
+def current_client_id():
+    """当前命令来自的 broker 客户端编号（stdin 命令为 None）"""
+    client = _client.get()
+    return client.client_id if client is not None else None
+
+
+class BrokerClient:
+    """一个已连接的客户端"""
+
+    def __init__(self, client_id: int, writer):
+        self.client_id = client_id
+        self.writer = writer
+        self.connected_at = int(time.time() * 1000)
+        self.commands = 0
+        self.tasks = set()  # 该客户端仍在执行的命令
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, data: bytes, droppable: bool, max_buffer: int) -> bool:
+        """写入一行，返回 False 表示客户端严重积压，应断开"""
+        buffered = self.writer.transport.get_write_buffer_size()
+        if buffered > max_buffer:
+            if buffered > max_buffer * 4:
+                return False
+            if droppable:
+                self.dropped += 1
+                return True
+        self.writer.write(data)
+        self.sent += 1
+        return True
+
+    def snapshot(self) -> dict:
+        return {
+            "client_id": self.client_id,
+            "connected_at": self.connected_at,
+            "commands": self.commands,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "buffered_bytes": self.writer.transport.get_write_buffer_size()
+        }
+
+
+class BrokerServer:
+    """在服务事件循环中运行的 Unix socket 服务端"""
+
+    def __init__(self, path: str, handle_command, logger, hello=None, on_connect=None, on_disconnect=None,
+                 max_buffer: int = 4 * 1024 * 1024, drain_timeout: float = 30.0):
+        self.path = path
+        self.handle_command = handle_command
+        self.logger = logger
+        self.hello = hello  # 返回新客户端欢迎消息 data 的回调（如当前 seq）
+        self.on_connect = on_connect  # 客户端连接/断开回调（参数为 client_id），用于登记和释放行情订阅
+        self.on_disconnect = on_disconnect
+        self.max_buffer = max_buffer
+        self.drain_timeout = drain_timeout  # 客户端断开（EOF）后等待其未完成命令的最长时间，结果仍发回该客户端
+        self.clients = {}
+        self.status_lines = {}  # 消息类型 → 最新一条状态消息的行
+        self.server = None
+        self._ids = itertools.count(1)
+        self._tasks = set()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # 上次异常退出留下的 socket 文件
+        # 在严格的 umask 下创建 socket（仅本用户可连接），而不是创建后再 chmod（中间有可被其他用户连接的窗口）
+        previous_umask = os.umask(0o177)
+        try:
+            self.server = await asyncio.start_unix_server(self._serve, path=self.path, limit=1024 * 1024)
+        finally:
+            os.umask(previous_umask)
+
+    def close(self):
+        if self.server:
+            self.server.close()
+        for client in list(self.clients.values()):
+            client.writer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve(self, reader, writer):
+        client = BrokerClient(next(self._ids), writer)
+        self.clients[client.client_id] = client
+        if self.on_connect:
+            self.on_connect(client.client_id)
+        self.logger.info(f"🔌 broker 客户端 #{client.client_id} 已连接（共 {len(self.clients)} 个）")
+        hello = {"type": "broker_hello", "data": dict(self.hello() if self.hello else {}, client_id=client.client_id)}
+        writer.write(json.dumps(hello).encode() + b"\n")
+        for message_type in STATUS_TYPES:
+            if message_type in self.status_lines:
+                writer.write(self.status_lines[message_type].encode() + b"\n")
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    command = json.loads(line)
+                except json.JSONDecodeError as e:
+                    self.logger.error(f"❌ broker 客户端 #{client.client_id} JSON解析失败: {e}")
+                    continue
+                client.commands += 1
+                # 命令并发执行（与 stdin 一致），任务继承当前客户端上下文以便 command_result 回到该客户端
+                token = _client.set(client)
+                try:
+                    task = asyncio.create_task(self.handle_command(command, time.perf_counter()))
+                finally:
+                    _client.reset(token)
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                client.tasks.add(task)
+                task.add_done_callback(client.tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            self.logger.warning(f"⚠️ broker 客户端 #{client.client_id} 连接错误: {e}")
+        finally:
+            # 客户端半关闭（如桥接进程的 stdin 结束）后仍在读：等它发出的命令执行完，command_result 才能送达
+            if client.tasks and not writer.is_closing():
+                await asyncio.wait(list(client.tasks), timeout=self.drain_timeout)
+                await self._drain(writer)
+            self.clients.pop(client.client_id, None)
+            writer.close()
+            if self.on_disconnect:
+                self.on_disconnect(client.client_id)
+            self.logger.info(f"🔌 broker 客户端 #{client.client_id} 已断开（剩余 {len(self.clients)} 个）")
+
+    async def _drain(self, writer):
+        try:
+            await asyncio.wait_for(writer.drain(), self.drain_timeout)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+
+    def publish(self, message_type: str, line: str, broadcast: bool = True) -> bool:
+        """分发一行输出；返回 True 表示还应写到 stdout（命令来自 broker 客户端的定向消息不写）"""
+        client = _client.get()
+        if not broadcast:
+            if client is None:
+                return True  # stdin 发出的命令，只回 stdout
+            if client.client_id in self.clients and not client.send(line.encode() + b"\n", False, self.max_buffer):
+                self._disconnect(client)
+            return False
+
+        if message_type in STATUS_TYPES:
+            self.status_lines[message_type] = line
+        if self.clients:
+            data = line.encode() + b"\n"
+            droppable = message_type in MARKET_DATA_TYPES
+            for other in list(self.clients.values()):
+                if not other.send(data, droppable, self.max_buffer):
+                    self._disconnect(other)
+        return True
+
+    def send_to(self, client_ids, message_type: str, line: str):
+        """把一行输出发给指定的客户端（按行情订阅路由的 price_update）"""
+        data = line.encode() + b"\n"
+        droppable = message_type in MARKET_DATA_TYPES
+        for client_id in client_ids:
+            client = self.clients.get(client_id)
+            if client is not None and not client.send(data, droppable, self.max_buffer):
+                self._disconnect(client)
+
+    def _disconnect(self, client: BrokerClient):
+        self.logger.warning(f"⚠️ broker 客户端 #{client.client_id} 积压过多，断开连接")
+        self.clients.pop(client.client_id, None)
+        client.writer.transport.abort()
+
+    def snapshot(self) -> dict:
+        return {
+            "socket": self.path,
+            "clients": [client.snapshot() for client in self.clients.values()]
+        }
+
+
+async def bridge(path: str):
+    """stdin/stdout ↔ broker socket 桥接：让按子进程方式启动服务的程序无需改动即可接入 broker"""
+    reader, writer = await asyncio.open_unix_connection(path, limit=16 * 1024 * 1024)
+    loop = asyncio.get_running_loop()
+
+    def read_stdin():
+        # 与服务的 listen_stdin 一样在守护线程中读 stdin，退出时不需要等待它
+        for line in sys.stdin.buffer:
+            loop.call_soon_threadsafe(writer.write, line)
+        # stdin 关闭：半关闭 socket，服务端执行完已发出的命令、发回结果后关闭连接，桥接进程随之退出
+        loop.call_soon_threadsafe(writer.write_eof)
+
+    threading.Thread(target=read_stdin, daemon=True).start()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            sys.stdout.buffer.write(line)
+            sys.stdout.buffer.flush()
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("用法: python3 service_broker.py <socket 路径>", file=sys.stderr)
+        sys.exit(2)
+    try:
+        asyncio.run(bridge(sys.argv[1]))
+    except KeyboardInterrupt:
+        pass
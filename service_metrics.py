@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+服务指标
+计数器、仪表和直方图（Prometheus 文本格式），以及在服务事件循环中运行的 /metrics HTTP 端点。
+
+热路径开销：observe 只做一次 bisect 和两次加法，桶计数不累加（导出时再累加），
+标签值组合首次出现时才分配；所有写入都在事件循环线程中进行，不加锁。
+"""
+
+import asyncio
+from bisect import bisect_left
+
+# 延迟类直方图的默认桶（秒）：覆盖亚毫秒的行情处理到数秒的下单确认
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """可增可减的当前值"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """固定桶直方图"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self.children = {}  # 标签值 → [各桶计数（最后一个为 +Inf）, 总和, 次数]
+
+    def observe(self, value: float, *labels):
+        child = self.children.get(labels)
+        if child is None:
+            child = self.children[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        child[0][bisect_left(self.buckets, value)] += 1
+        child[1] += value
+        child[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self.children.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class ServiceMetrics:
+    """两个服务共用的指标集合，指标名带服务前缀（edgex_ / paradex_）"""
+
+    def __init__(self, prefix: str):
+        self.command_duration = Histogram(
+            f"{prefix}_command_duration_seconds", "stdin 命令从收到到输出 command_result 的耗时", ("action",))
+        self.order_ack = Histogram(
+            f"{prefix}_order_ack_seconds", "下单请求到交易所确认的耗时")
+        self.fill_confirm = Histogram(
+            f"{prefix}_fill_confirm_seconds", "下单到确认成交的耗时")
+        self.rate_limit_wait = Histogram(
+            f"{prefix}_rate_limit_wait_seconds", "请求限速器的等待时间")
+        self.ws_message_age = Histogram(
+            f"{prefix}_ws_message_age_seconds", "行情消息接收时间与交易所时间戳之差（已按时钟偏差修正）", ("channel",))
+        self.messages_in = Counter(
+            f"{prefix}_messages_in_total", "收到的行情/账户消息数", ("channel",))
+        self.messages_out = Counter(
+            f"{prefix}_messages_out_total", "输出到 stdout 的消息数", ("type",))
+        self.rate_limited = Counter(
+            f"{prefix}_http_429_total", "交易所返回 429 限流的次数")
+        self.reconnects = Counter(
+            f"{prefix}_ws_reconnects_total", "WebSocket 重连次数")
+        self.loop_lag = Histogram(
+            f"{prefix}_event_loop_lag_seconds", "事件循环调度延迟（心跳实际醒来时间与预期之差）")
+        self.loop_blocked = Counter(
+            f"{prefix}_event_loop_blocked_total", "事件循环阻塞超过阈值的次数")
+        self.clock_offset = Gauge(
+            f"{prefix}_clock_offset_seconds", "交易所时钟减本地时钟的平滑估计")
+        self.exchange_rtt = Histogram(
+            f"{prefix}_exchange_rtt_seconds", "到交易所的往返时间（服务器时间请求 / WebSocket ping）", ("source",))
+        self._metrics = [
+            self.command_duration, self.order_ack, self.fill_confirm, self.rate_limit_wait, self.ws_message_age,
+            self.messages_in, self.messages_out, self.rate_limited, self.reconnects, self.loop_lag, self.loop_blocked,
+            self.clock_offset, self.exchange_rtt
+        ]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(metrics: ServiceMetrics, host: str, port: int):
+    """在当前事件循环中启动 /metrics 端点，返回 asyncio Server"""
+
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            path = request_line.split(b" ")[1] if request_line.count(b" ") >= 2 else b""
+            if path.split(b"?")[0] == b"/metrics":
+                body = metrics.render().encode()
+                status = "200 OK"
+            else:
+                body = b"not found\n"
+                status = "404 Not Found"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 被测模块位于仓库根目录
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
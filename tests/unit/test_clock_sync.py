@@ -0,0 +1,39 @@
+from clock_sync import ClockEstimator
+
+
+def sample(clock, true_offset, sent_ts, out_ms, back_ms):
+    """去程 out_ms、回程 back_ms 的服务器时间样本"""
+    server_ts = sent_ts + out_ms + true_offset
+    clock.add_server_time(server_ts, sent_ts, out_ms + back_ms)
+
+
+def test_offset_error_bounded_by_half_rtt_under_asymmetric_rtt():
+    clock = ClockEstimator()
+    sample(clock, 250.0, 1000.0, 30.0, 10.0)  # 去程慢：估计偏大 10ms
+    assert abs(clock.offset_ms - 250.0) <= clock.uncertainty_ms
+    assert clock.offset_ms == 260.0
+    assert clock.uncertainty_ms == 20.0
+
+
+def test_min_rtt_sample_wins_over_slow_samples():
+    clock = ClockEstimator(alpha=1.0)
+    sample(clock, -100.0, 1000.0, 2.0, 2.0)
+    sample(clock, -100.0, 2000.0, 400.0, 5.0)  # 排队造成的慢样本，偏差估计误差 ~198ms
+    assert clock.offset_ms == -100.0
+    assert clock.uncertainty_ms == 2.0
+
+
+def test_message_age_uses_offset():
+    clock = ClockEstimator()
+    assert clock.message_age_ms(900, 1000) == 100
+    sample(clock, 50.0, 0.0, 1.0, 1.0)
+    assert clock.message_age_ms(1000, 1000) == clock.offset_ms
+
+
+def test_one_way_prefers_ws_ping():
+    clock = ClockEstimator()
+    assert clock.one_way_ms() is None
+    sample(clock, 0.0, 0.0, 10.0, 10.0)
+    assert clock.one_way_ms() == 10.0
+    clock.add_ping(6.0)
+    assert clock.one_way_ms() == 3.0
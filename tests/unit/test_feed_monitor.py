@@ -0,0 +1,30 @@
+from feed_monitor import FeedMonitor, parse_stale_thresholds
+
+
+def test_parse_stale_thresholds():
+    feeds = ["bbo", "rest"]
+    assert parse_stale_thresholds("", feeds, 3000) == {"bbo": 3000, "rest": 3000}
+    assert parse_stale_thresholds("2000", feeds, 3000) == {"bbo": 2000, "rest": 2000}
+    assert parse_stale_thresholds("rest=5000", feeds, 3000) == {"bbo": 3000, "rest": 5000}
+
+
+def test_reports_stale_and_recovery_once():
+    monitor = FeedMonitor({"bbo": 1000})
+    monitor.record("bbo", 1, 1000)
+    assert monitor.check(1500) == ["bbo"]
+    assert monitor.check(1600) == []
+    assert monitor.check(2500) == ["bbo"]
+    assert not monitor.feeds["bbo"]["healthy"]
+    monitor.record("bbo", 2, 2600)
+    assert monitor.check(2700) == ["bbo"]
+
+
+def test_fallback_stays_on_standby_while_primary_is_fresh():
+    monitor = FeedMonitor({"ticker": 1000, "rest_ticker": 1000}, fallbacks={"rest_ticker": "ticker"})
+    monitor.record("ticker", 1, 1000)
+    monitor.record("rest_ticker", 1, 1000)
+    assert monitor.check(1100) == ["ticker"]
+    for now in (1500, 1900):
+        monitor.record("ticker", now, now)
+        assert monitor.check(now + 100) == []  # 兜底源不再在过期/恢复之间切换
+    assert monitor.snapshot(2000)["rest_ticker"]["standby"]
@@ -0,0 +1,51 @@
+import pytest
+
+from market_subscriptions import STDOUT, SubscriptionRegistry, profile_depth, shape
+
+
+def test_routes_after_subscribe_unsubscribe_and_remove():
+    registry = SubscriptionRegistry("BTC")
+    assert registry.routes("BTC") == {None: [STDOUT]}
+
+    registry.add_subscriber(1)
+    registry.subscribe(1, "ETH", 0)
+    registry.subscribe(STDOUT, "ETH", 5)
+    assert registry.routes("BTC") == {None: [STDOUT, 1]}
+    assert registry.routes("ETH") == {5: [STDOUT], 0: [1]}
+    assert registry.needs_depth("ETH")
+
+    assert registry.unsubscribe(STDOUT, "ETH")
+    assert not registry.unsubscribe(STDOUT, "ETH")
+    assert registry.routes("ETH") == {0: [1]}
+    assert not registry.needs_depth("ETH")
+
+    assert registry.remove_subscriber(1) == ["ETH"]
+    assert registry.routes("ETH") == {}
+    assert registry.routes("BTC") == {None: [STDOUT]}
+    assert registry.markets() == {"BTC"}
+
+
+def test_remove_subscriber_keeps_markets_still_wanted():
+    registry = SubscriptionRegistry("BTC")
+    registry.subscribe(1, "ETH", 0)
+    registry.subscribe(2, "ETH", 0)
+    assert registry.remove_subscriber(1) == []
+    assert registry.routes("ETH") == {0: [2]}
+
+
+def test_profile_depth():
+    assert profile_depth("bbo") == 0
+    assert profile_depth("full") is None
+    assert profile_depth("top", 3) == 3
+    with pytest.raises(ValueError):
+        profile_depth("top")
+    with pytest.raises(ValueError):
+        profile_depth("deep")
+
+
+def test_shape_does_not_mutate_input():
+    data = {"bid": 1, "orderbook": {"bids": [[1, 1]] * 3, "asks": [[2, 1]] * 3}, "quotes": {}}
+    assert "orderbook" not in shape(data, 0) and "quotes" not in shape(data, 0)
+    assert len(shape(data, 2)["orderbook"]["bids"]) == 2
+    assert len(data["orderbook"]["bids"]) == 3
+    assert shape(data, None) is data
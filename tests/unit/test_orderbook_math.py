@@ -0,0 +1,46 @@
+from orderbook_math import executable_quotes, visible_depth, walk_book
+
+
+def test_visible_depth_empty_side():
+    assert visible_depth([], 5) == 0.0
+
+
+def test_visible_depth_only_counts_levels_within_slippage():
+    asks = [[100.0, 1.0], [100.04, 2.0], [100.2, 5.0]]
+    assert visible_depth(asks, 5) == 3.0  # 5bp = 0.05
+    assert visible_depth(asks, 50) == 8.0
+
+
+def test_visible_depth_respects_max_levels():
+    asks = [[100.0, 1.0]] * 10
+    assert visible_depth(asks, 5, max_levels=3) == 3.0
+
+
+def test_walk_book_empty_side():
+    assert walk_book([], 1.0) == (0.0, 0.0, 0.0)
+
+
+def test_walk_book_partial_when_depth_below_size():
+    vwap, worst, filled = walk_book([[100.0, 1.0], [101.0, 1.0]], 5.0)
+    assert filled == 2.0
+    assert worst == 101.0
+    assert vwap == 100.5
+
+
+def test_walk_book_stops_at_requested_size():
+    vwap, worst, filled = walk_book([[100.0, 1.0], [102.0, 3.0], [110.0, 9.0]], 2.0)
+    assert filled == 2.0
+    assert worst == 102.0
+    assert vwap == 101.0
+
+
+def test_executable_quotes_marks_unfillable_sizes():
+    book = {"bids": [[99.0, 1.0]], "asks": [[100.0, 1.0], [101.0, 1.0]]}
+    quotes = executable_quotes(book, [1.0, 3.0])
+    assert [q["fillable"] for q in quotes["buy"]] == [True, False]
+    assert quotes["sell"][0]["vwap"] == 99.0
+
+
+def test_executable_quotes_empty_book():
+    assert executable_quotes({}, [1.0]) == {"buy": [], "sell": []}
+    assert executable_quotes({"bids": [], "asks": []}, [1.0]) == {"buy": [], "sell": []}
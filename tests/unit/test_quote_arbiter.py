@@ -0,0 +1,34 @@
+from quote_arbiter import LOCAL_CLOCK, QuoteArbiter
+
+
+def test_same_clock_requires_newer_exchange_ts():
+    arbiter = QuoteArbiter()
+    assert arbiter.offer("BTC", "bbo", 100, 1000, clock="paradex")
+    assert not arbiter.offer("BTC", "rest", 100, 1001, clock="paradex")
+    assert not arbiter.offer("BTC", "rest", 90, 1002, clock="paradex")
+    assert arbiter.offer("BTC", "bbo", 101, 1003, clock="paradex")
+    assert arbiter.stats["rest/top"] == {"accepted": 0, "rejected": 2}
+
+
+def test_top_and_depth_arbitrated_separately():
+    arbiter = QuoteArbiter()
+    assert arbiter.offer("BTC", "bbo", 200, 1000, clock="paradex")
+    # 订单簿快照时间戳更旧：不能更新最优价，但深度照常接受
+    assert not arbiter.offer("BTC", "orderbook", 150, 1001, clock="paradex")
+    assert arbiter.offer("BTC", "orderbook", 150, 1001, kind="depth", clock="paradex")
+    assert arbiter.latest("BTC")["source"] == "bbo"
+    assert arbiter.latest("BTC", "depth")["source"] == "orderbook"
+
+
+def test_other_clock_takes_over_only_after_quiet_period():
+    arbiter = QuoteArbiter(takeover_ms=1000)
+    assert arbiter.offer("BTC", "ticker", 5_000_000, 1000, clock="edgex")
+    # 不同时钟的时间戳不可比：即使数值更大也要等当前来源安静超过 takeover_ms
+    assert not arbiter.offer("BTC", "aster", 9_000_000, 1500, clock="aster")
+    assert arbiter.offer("BTC", "aster", 1, 2001, clock="aster")
+
+
+def test_local_clock_accepts_in_arrival_order():
+    arbiter = QuoteArbiter()
+    assert arbiter.offer("BTC", "ticker", 10, 10, clock=LOCAL_CLOCK)
+    assert arbiter.offer("BTC", "ticker", 10, 10, clock=LOCAL_CLOCK)
@@ -0,0 +1,32 @@
+from replay_buffer import ReplayBuffer
+
+
+def fill(buffer, first, last):
+    for seq in range(first, last + 1):
+        buffer.add(seq, "order_update", f"line-{seq}")
+
+
+def test_since_returns_newer_events_and_skips_market_data():
+    buffer = ReplayBuffer(10)
+    buffer.add(1, "price_update", "p1")
+    buffer.add(2, "order_update", "o2")
+    buffer.add(3, "command_result", "c3")
+    buffer.add(4, "fill_update", "f4")
+    assert buffer.since(0) == (["o2", "f4"], True)
+    assert buffer.since(2) == (["f4"], True)
+
+
+def test_since_is_complete_only_after_evicted_seq():
+    buffer = ReplayBuffer(3)
+    fill(buffer, 1, 5)  # 1、2 被挤出
+    assert buffer.evicted_seq == 2
+    assert buffer.since(1) == (["line-3", "line-4", "line-5"], False)
+    assert buffer.since(2) == (["line-3", "line-4", "line-5"], True)
+    assert buffer.since(4) == (["line-5"], True)
+
+
+def test_disabled_buffer_reports_incomplete():
+    buffer = ReplayBuffer(0)
+    fill(buffer, 1, 3)
+    assert buffer.since(0) == ([], False)
+    assert buffer.since(3) == ([], True)
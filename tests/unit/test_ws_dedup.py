@@ -0,0 +1,23 @@
+from ws_dedup import FirstArrivalDeduplicator
+
+
+def test_forwards_first_copy_only():
+    dedup = FirstArrivalDeduplicator(2)
+    assert dedup.accept(1, ("BTC", 1))
+    assert not dedup.accept(0, ("BTC", 1))
+    assert dedup.snapshot()[1]["won"] == 1
+    assert dedup.snapshot()[0] == {"received": 1, "won": 0, "win_rate": 0.0}
+
+
+def test_none_key_is_never_deduplicated():
+    # 没有交易所时间戳的消息无法识别重复，必须全部转发（否则第一条之后行情冻结）
+    dedup = FirstArrivalDeduplicator(1)
+    assert all(dedup.accept(0, None) for _ in range(10))
+
+
+def test_window_eviction():
+    dedup = FirstArrivalDeduplicator(1, window=2)
+    for key in ("a", "b", "c"):
+        assert dedup.accept(0, key)
+    assert dedup.accept(0, "a")  # 已被挤出窗口
+    assert not dedup.accept(0, "c")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+冗余 WebSocket 连接去重
+同一频道开多条公共连接时，同一条消息（按交易所序号或时间戳识别）只转发最先到达的一份，
+并统计每条连接抢先到达的比例，用于评估冗余连接对尾延迟的改善
+"""
+
+from collections import OrderedDict
+
+
+class FirstArrivalDeduplicator:
+    """按消息键去重，记录各连接的接收数和领先数"""
+
+    def __init__(self, connections: int, window: int = 4096):
+        self.window = window  # 最近消息键的保留数量
+        self._seen = OrderedDict()  # 消息键 → 最先送达的连接编号
+        self.stats = {conn_id: {"received": 0, "won": 0} for conn_id in range(connections)}
+
+    def accept(self, conn_id: int, key) -> bool:
+        """连接 conn_id 收到消息 key，是第一份时返回 True（应转发）
+
+        key 为 None（消息没有可识别的序号/时间戳）时无法去重，总是转发
+        """
+        stats = self.stats[conn_id]
+        stats["received"] += 1
+
+        if key is None:
+            stats["won"] += 1
+            return True
+        if key in self._seen:
+            return False
+
+        self._seen[key] = conn_id
+        if len(self._seen) > self.window:
+            self._seen.popitem(last=False)
+        stats["won"] += 1
+        return True
+
+    def snapshot(self) -> dict:
+        """各连接的接收数、领先数和领先率"""
+        return {
+            conn_id: {
+                "received": stats["received"],
+                "won": stats["won"],
+                "win_rate": round(stats["won"] / stats["received"], 4) if stats["received"] else 0.0
+            }
+            for conn_id, stats in self.stats.items()
+        }